@@ -13,12 +13,15 @@ import os
 import platform
 import datetime
 import shutil
+import hashlib
 
 # The program libraries.
 import walton.application
 from configuration import Configuration
 from database import Database
+from instrumentation import Instrumentation
 from render import Render
+import startup
 # import walton.yearrange
 
 
@@ -28,6 +31,7 @@ class Application(walton.application.IApplication):
     :ivar Render render: The :py:class:`~render.Render` object for the Formula One results database.
     :ivar Database database: The :py:class:`~database.Database` object for the Formula One results database.
     :ivar Configuration configuration: The :py:class:`~configuration.Configuration` object for the Sports Results database.
+    :ivar Instrumentation instrumentation: The :py:class:`~instrumentation.Instrumentation` object that profiles the pages.
     :ivar string request: The url of the current page request.
     :ivar string parameters: The parameters of the current page request.
     :ivar bool showAge: True to add the show age request to each link.
@@ -61,9 +65,16 @@ class Application(walton.application.IApplication):
         # The Configuration object for the league table program.
         # This is the application settings and options.
         self.configuration = Configuration()
+        startup.profile.mark('configuration')
+
+        # The page profiles.  These are switched on by the configuration or the debug view.
+        self.instrumentation = Instrumentation(self.configuration.isProfile or self.debug, self.configuration.profileLogFilename)
 
         # The Database object for the league table program.
-        self.database = Database(self.configuration.databaseFilename, self)
+        # The server mode only reads the database.  The program arguments can replace the database file from the configuration.
+        databaseFilename = getattr(args, 'database', None) or self.configuration.databaseFilename
+        self.database = Database(databaseFilename, self, getattr(args, 'server', None) is not None)
+        startup.profile.mark('database')
 
         # The Render object for the league table program.
         # This is the object that renders the application results to html pages for display.
@@ -71,6 +82,7 @@ class Application(walton.application.IApplication):
 
         # Generate the style sheets.
         self.setStyleSheets()
+        startup.profile.mark('style sheets')
 
         # Show the initial page.
         self.current_uri = ''
@@ -78,16 +90,12 @@ class Application(walton.application.IApplication):
 
 
     def setStyleSheets(self):
-        ''' Set the style sheets on the render html object.'''
+        '''
+        Set the style sheets on the render html object.
+        The generated style sheets are kept in a folder for each configuration and reused by later launches.
+        '''
         folder = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'Styles')
-        sizeStyleSheet = self.generateSizeStyleSheet(os.path.join(folder, 'textsize.txt'), self.configuration.textSize, folder)
-        fontStyleSheet = self.generateFontStyleSheet(os.path.join(folder, 'font.txt'), self.configuration.fontName, folder)
-
-        # Generate a space stylesheet.
-        spaceStyleSheet = os.path.join(folder, f'table-space-{self.configuration.verticalSpace}{self.configuration.horizontalSpace}.css')
-        fileOutput = open(spaceStyleSheet, 'w')
-        fileOutput.write(f'td {{ padding: {self.configuration.verticalSpace}px {self.configuration.horizontalSpace}px {self.configuration.verticalSpace}px {self.configuration.horizontalSpace}px; }}\n')
-        fileOutput.close()
+        sizeStyleSheet, fontStyleSheet, spaceStyleSheet = self.getGeneratedStyleSheets(folder)
 
         # Remove the existing stylesheets.
         self.render.html.stylesheets = []
@@ -99,3 +107,46 @@ class Application(walton.application.IApplication):
         self.render.html.stylesheets.append('file:' + sizeStyleSheet)
         self.render.html.stylesheets.append('file:' + fontStyleSheet)
         self.render.html.stylesheets.append('file:' + spaceStyleSheet)
+
+
+
+    def getGeneratedStyleSheets(self, folder):
+        '''
+        Returns the filenames of the size, font and space style sheets for the current configuration.
+        The style sheets are only generated when there are none for the configuration in the cache folder.
+
+        :param string folder: Specifies the folder that contains the style sheet templates.
+        '''
+        sizeTemplate = os.path.join(folder, 'textsize.txt')
+        fontTemplate = os.path.join(folder, 'font.txt')
+
+        # The configuration hash includes the templates so that an edited template is generated again.
+        key = [self.configuration.textSize, self.configuration.fontName, self.configuration.verticalSpace, self.configuration.horizontalSpace]
+        for template in (sizeTemplate, fontTemplate):
+            status = os.stat(template)
+            key.extend((status.st_mtime_ns, status.st_size))
+        cacheFolder = os.path.join(folder, 'cache', hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16])
+        manifest = os.path.join(cacheFolder, 'stylesheets.txt')
+
+        # Reuse the style sheets from an earlier launch.
+        if os.path.isfile(manifest):
+            with open(manifest, 'r') as fileInput:
+                styleSheets = fileInput.read().splitlines()
+            if len(styleSheets) == 3 and all(os.path.isfile(styleSheet) for styleSheet in styleSheets):
+                return styleSheets
+
+        # Generate the style sheets.
+        os.makedirs(cacheFolder, exist_ok=True)
+        sizeStyleSheet = self.generateSizeStyleSheet(sizeTemplate, self.configuration.textSize, cacheFolder)
+        fontStyleSheet = self.generateFontStyleSheet(fontTemplate, self.configuration.fontName, cacheFolder)
+
+        # Generate a space stylesheet.
+        spaceStyleSheet = os.path.join(cacheFolder, f'table-space-{self.configuration.verticalSpace}{self.configuration.horizontalSpace}.css')
+        with open(spaceStyleSheet, 'w') as fileOutput:
+            fileOutput.write(f'td {{ padding: {self.configuration.verticalSpace}px {self.configuration.horizontalSpace}px {self.configuration.verticalSpace}px {self.configuration.horizontalSpace}px; }}\n')
+
+        # Write the manifest last so that an interrupted launch generates the style sheets again.
+        styleSheets = [sizeStyleSheet, fontStyleSheet, spaceStyleSheet]
+        with open(manifest, 'w') as fileOutput:
+            fileOutput.write('\n'.join(styleSheets) + '\n')
+        return styleSheets
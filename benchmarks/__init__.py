@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+'''
+Package to measure the performance of the table program without a display.
+Run as ``python3 -m benchmarks`` from the program folder.
+
+The :py:mod:`~benchmarks.synthetic` module writes a synthetic table database at a chosen scale.
+The :py:mod:`~benchmarks.render_timer` module times each of the :py:attr:`~render.Render.actions` and reports percentiles as JSON.
+'''
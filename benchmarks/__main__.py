@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to run the benchmarks of the table program.
+Run as ``python3 -m benchmarks`` from the program folder.
+The results are written as JSON so that the results of different commits can be compared.
+'''
+
+# System libraries.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Application libraries.
+from benchmarks.synthetic import SyntheticDatabase
+from benchmarks.render_timer import RenderTimer
+
+
+
+if __name__ == '__main__':
+    argParse = argparse.ArgumentParser(prog='benchmarks', description='Time the pages of the league table program on a synthetic database.')
+    argParse.add_argument('--seasons', help='The number of seasons in the synthetic database.', type=int, default=30)
+    argParse.add_argument('--teams', help='The number of teams in each season.', type=int, default=20)
+    argParse.add_argument('--pool', help='The number of teams in the synthetic database.  The default is twice the teams in each season.', type=int)
+    argParse.add_argument('--seed', help='The seed for the synthetic results.', type=int, default=1)
+    argParse.add_argument('--repeats', help='The number of times to time each request.', type=int, default=20)
+    argParse.add_argument('-d', '--database', help='Time this database rather than a synthetic database.  The file is opened read only.', metavar='FILE')
+    argParse.add_argument('-k', '--keep', help='Keep the synthetic database in this file.', metavar='FILE')
+    argParse.add_argument('-o', '--output', help='Write the results to this file rather than the standard output.', metavar='FILE')
+    args = argParse.parse_args()
+
+    # Write the synthetic database.
+    scale = None
+    folder = None
+    filename = args.database
+    if filename is None:
+        if args.keep is None:
+            folder = tempfile.TemporaryDirectory()
+            filename = os.path.join(folder.name, 'table.sqlite')
+        else:
+            filename = args.keep
+        synthetic = SyntheticDatabase(args.seasons, args.teams, args.pool, args.seed)
+        startTime = time.perf_counter()
+        numMatches = synthetic.write(filename)
+        scale = {'seasons': args.seasons, 'teams_per_season': args.teams, 'pool': synthetic.numTeams, 'seed': args.seed, 'matches': numMatches, 'generate_s': round(time.perf_counter() - startTime, 3)}
+
+    # The program libraries are only needed to time the pages.
+    from application import Application
+
+    # The server option opens the database read only.
+    startTime = time.perf_counter()
+    application = Application(argparse.Namespace(database=filename, server=None if args.database is None else 0))
+    startupTime = time.perf_counter() - startTime
+
+    timer = RenderTimer(application, args.repeats)
+    results = {
+        'environment'   : timer.getEnvironment(),
+        'synthetic'     : scale,
+        'startup_ms'    : round(1000 * startupTime, 3),
+        'actions'       : timer.run(),
+    }
+    application.database.close()
+    if folder is not None:
+        folder.cleanup()
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=4)
+        print()
+    else:
+        with open(args.output, 'w') as outputFile:
+            json.dump(results, outputFile, indent=4)
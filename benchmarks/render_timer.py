@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to time the pages of the table program for the benchmarks.
+This module implements the :py:class:`RenderTimer` class.
+'''
+
+# System libraries.
+import os
+import platform
+import subprocess
+import time
+
+
+
+class RenderTimer:
+    '''
+    Class to time each of the :py:attr:`~render.Render.actions` on a set of typical requests.
+    The actions are called directly so the :py:class:`~page_cache.PageCache` does not hide the rendering time.
+    The first call of each action is reported separately because it fills the in memory caches.
+
+    :ivar Application application: The :py:class:`~application.Application` that renders the pages.
+    :ivar int repeats: The number of times that each request is timed after the first call.
+    '''
+    # The actions that are timed.
+    ACTIONS = ('home', 'show_team', 'head', 'table_teams', 'table_last', 'table_subset', 'show_team_season')
+
+    # The percentiles in the results.
+    PERCENTILES = (50, 90, 99)
+
+
+
+    def __init__(self, application, repeats=20):
+        '''
+        Class constructor for the :py:class:`RenderTimer` class.
+
+        :param Application application: Specifies the :py:class:`~application.Application` that renders the pages.
+        :param int repeats: Optionally specify the number of times that each request is timed after the first call.
+        '''
+        self.application = application
+        self.repeats = repeats
+
+
+
+    def getRequests(self):
+        ''' Returns a dictionary of the list of request parameters to time for each action. '''
+        cndb = self.application.database.getConnection()
+        seasons = [row[0] for row in cndb.execute('SELECT ID FROM SEASONS ORDER BY FINISH_DATE DESC;')]
+        lastSeason = seasons[0]
+        oldSeason = seasons[-1]
+        middleSeason = seasons[len(seasons) // 2]
+        teams = [row[0] for row in cndb.execute('SELECT DISTINCT HOME_TEAM_ID FROM MATCHES WHERE SEASON_ID = ? ORDER BY HOME_TEAM_ID;', (lastSeason, ))]
+        date = cndb.execute('SELECT MAX(THE_DATE) FROM MATCHES WHERE SEASON_ID = ? AND HOME_TEAM_FOR IS NOT NULL;', (middleSeason, )).fetchone()[0]
+
+        return {
+            'home'              : [{'season': f'{lastSeason}'}, {'season': f'{middleSeason}'}, {'season': f'{middleSeason}', 'date': date[:10]}, {'season': f'{lastSeason}', 'level': '1'}],
+            'show_team'         : [{'id': f'{teams[0]}'}, {'id': f'{teams[-1]}'}],
+            'head'              : [{'team1': f'{teams[0]}', 'team2': f'{teams[1]}'}, {'team1': f'{teams[-1]}', 'team2': f'{teams[-2]}'}],
+            'table_teams'       : [{}, {'level': '1'}],
+            'table_last'        : [{'season': f'{lastSeason}'}, {'season': f'{oldSeason}'}],
+            'table_subset'      : [{}],
+            'show_team_season'  : [{'team': f'{teams[0]}', 'season': f'{lastSeason}'}, {'team': f'{teams[-1]}', 'season': f'{middleSeason}'}],
+        }
+
+
+
+    def run(self):
+        '''
+        Time each action and return the results as a dictionary that can be written as JSON.
+        The times are in milliseconds.
+        '''
+        render = self.application.render
+        results = {}
+        for action, requests in self.getRequests().items():
+            # The first call of each request fills the caches.
+            coldTimes = [self._timeRequest(render, action, parameters) for parameters in requests]
+            samples = []
+            for repeat in range(self.repeats):
+                for parameters in requests:
+                    samples.append(self._timeRequest(render, action, parameters))
+            samples.sort()
+            results[action] = {
+                'requests'  : len(requests),
+                'samples'   : len(samples),
+                'cold_ms'   : round(max(coldTimes), 3),
+                'mean_ms'   : round(sum(samples) / len(samples), 3) if len(samples) > 0 else None,
+                'min_ms'    : round(samples[0], 3) if len(samples) > 0 else None,
+                'max_ms'    : round(samples[-1], 3) if len(samples) > 0 else None,
+            }
+            for percentile in RenderTimer.PERCENTILES:
+                results[action][f'p{percentile}_ms'] = round(self._getPercentile(samples, percentile), 3) if len(samples) > 0 else None
+        return results
+
+
+
+    def getEnvironment(self):
+        ''' Returns a dictionary that describes the program version, the computer and the database for the results. '''
+        cndb = self.application.database.getConnection()
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))), capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit'    : commit,
+            'python'    : platform.python_version(),
+            'platform'  : platform.platform(),
+            'database'  : self.application.database.filename,
+            'seasons'   : cndb.execute('SELECT COUNT(*) FROM SEASONS;').fetchone()[0],
+            'teams'     : cndb.execute('SELECT COUNT(*) FROM TEAMS;').fetchone()[0],
+            'matches'   : cndb.execute('SELECT COUNT(*) FROM MATCHES;').fetchone()[0],
+            'repeats'   : self.repeats,
+        }
+
+
+
+    def _timeRequest(self, render, action, parameters):
+        ''' Returns the time in milliseconds to render a single request. '''
+        startTime = time.perf_counter()
+        render.actions[action](dict(parameters))
+        return 1000 * (time.perf_counter() - startTime)
+
+
+
+    def _getPercentile(self, samples, percentile):
+        ''' Returns the nearest rank percentile of the sorted samples. '''
+        rank = max(1, -(-percentile * len(samples) // 100))
+        return samples[rank - 1]
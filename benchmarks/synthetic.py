@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to write a synthetic table database for the benchmarks.
+This module implements the :py:class:`SyntheticDatabase` class.
+'''
+
+# System libraries.
+import datetime
+import os
+import random
+
+# Require the Sqlite3 library.
+try:
+    import sqlite3
+except:
+    print('pysqlite is not available ({})'.format(__name__));
+
+
+
+class SyntheticDatabase:
+    '''
+    Class to write a table database with the same tables as the real database and made up teams and results.
+    Each season is a double round robin between the teams in the season.
+    The bottom teams are replaced by teams from the pool each season so the teams have a history across the decades.
+    The last season is in progress today so it has fixtures as well as results.
+
+    :ivar int numSeasons: The number of seasons.
+    :ivar int teamsPerSeason: The number of teams in each season.
+    :ivar int numTeams: The number of teams in the pool.
+    :ivar int numRelegated: The number of teams replaced each season.
+    :ivar int seed: The seed for the random results.
+    '''
+    # The tables in the real database.
+    TABLES = (
+        'CREATE TABLE TEAMS (ID INTEGER PRIMARY KEY, LABEL TEXT, COMMENTS TEXT, SUB_GROUP INTEGER DEFAULT 0);',
+        'CREATE TABLE SEASONS (ID INTEGER PRIMARY KEY, LABEL TEXT, START_DATE TEXT, FINISH_DATE TEXT, COMMENTS TEXT, WIN_PTS INTEGER, DRAW_PTS INTEGER, NUM_MATCHES INTEGER, GOOD_POS INTEGER, BAD_POS INTEGER, POSITIVE_POS INTEGER);',
+        'CREATE TABLE MATCHES (ID INTEGER PRIMARY KEY, SEASON_ID INTEGER, THE_DATE TEXT, THE_DATE_GUESS INTEGER, HOME_TEAM_ID INTEGER, AWAY_TEAM_ID INTEGER, HOME_TEAM_FOR INTEGER, AWAY_TEAM_FOR INTEGER, REAL_HOME_TEAM_FOR INTEGER, REAL_AWAY_TEAM_FOR INTEGER, HOME_BONUS_PTS INTEGER DEFAULT 0, AWAY_BONUS_PTS INTEGER DEFAULT 0);',
+        'CREATE TABLE LINKS (ID INTEGER PRIMARY KEY, TYPE_ID INTEGER, KEY_ID INTEGER, LABEL TEXT, URL TEXT);',
+        'CREATE TABLE DATE_BLOCKS (ID INTEGER PRIMARY KEY, LABEL TEXT, START TEXT, FINISH TEXT);',
+    )
+
+
+
+    def __init__(self, numSeasons=30, teamsPerSeason=20, numTeams=None, seed=1):
+        '''
+        Class constructor for the :py:class:`SyntheticDatabase` class.
+
+        :param int numSeasons: Optionally specify the number of seasons.  Each season is a year so 10 seasons is a decade of history.
+        :param int teamsPerSeason: Optionally specify the number of teams in each season.
+        :param int numTeams: Optionally specify the number of teams in the pool.  The default is twice the teams in each season.
+        :param int seed: Optionally specify the seed for the random results.
+        '''
+        self.numSeasons = numSeasons
+        self.teamsPerSeason = teamsPerSeason
+        self.numTeams = 2 * teamsPerSeason if numTeams is None else max(numTeams, teamsPerSeason)
+        self.numRelegated = min(3, self.numTeams - teamsPerSeason)
+        self.seed = seed
+
+
+
+    def write(self, filename):
+        '''
+        Write the synthetic database to the specified file.
+        Any existing file is replaced.
+        Returns the number of matches written.
+
+        :param string filename: Specifies the database file.
+        '''
+        if os.path.exists(filename):
+            os.remove(filename)
+        rng = random.Random(self.seed)
+        today = datetime.date.today()
+
+        cndb = sqlite3.connect(filename)
+        for sql in SyntheticDatabase.TABLES:
+            cndb.execute(sql)
+
+        # The teams.  The first few teams are in the sub group.
+        cndb.executemany('INSERT INTO TEAMS (ID, LABEL, COMMENTS, SUB_GROUP) VALUES (?, ?, NULL, ?);', [(teamIndex, f'Team {teamIndex:04}', 1 if teamIndex <= 4 else 0) for teamIndex in range(1, self.numTeams + 1)])
+        # Each team has a strength for the results.
+        strengths = {teamIndex: rng.uniform(0.6, 1.8) for teamIndex in range(1, self.numTeams + 1)}
+
+        # The last season started 150 days ago so that it is in progress.
+        lastStart = today - datetime.timedelta(days=150)
+        teams = list(range(1, self.teamsPerSeason + 1))
+        numMatches = 0
+        for seasonIndex in range(1, self.numSeasons + 1):
+            startDate = datetime.date(lastStart.year - (self.numSeasons - seasonIndex), 8, 1) if seasonIndex < self.numSeasons else lastStart
+            finishDate = startDate + datetime.timedelta(days=280)
+            numRounds = 2 * (len(teams) - 1)
+            cndb.execute('INSERT INTO SEASONS (ID, LABEL, START_DATE, FINISH_DATE, COMMENTS, WIN_PTS, DRAW_PTS, NUM_MATCHES, GOOD_POS, BAD_POS, POSITIVE_POS) VALUES (?, ?, ?, ?, NULL, 3, 1, ?, 4, ?, 6);', (seasonIndex, f'Season {startDate.year}-{(startDate.year + 1) % 100:02}', f'{startDate}', f'{finishDate}', numRounds, len(teams) - self.numRelegated + 1))
+            if seasonIndex % 5 == 0:
+                cndb.execute('INSERT INTO LINKS (TYPE_ID, KEY_ID, LABEL, URL) VALUES (2, ?, ?, ?);', (seasonIndex, 'Wikipedia', f'https://example.com/season/{seasonIndex}'))
+
+            # The matches.
+            matches = []
+            for roundIndex, fixtures in enumerate(self._getRounds(teams)):
+                theDate = startDate + datetime.timedelta(days=7 * roundIndex)
+                isDateGuess = 1 if rng.random() < 0.02 else 0
+                for homeTeam, awayTeam in fixtures:
+                    if theDate > today:
+                        # The fixtures are entered as 0-0 like the edit matches dialog.
+                        homeFor = awayFor = 0
+                    else:
+                        homeFor = self._getGoals(rng, 1.4 * strengths[homeTeam] / strengths[awayTeam])
+                        awayFor = self._getGoals(rng, 1.1 * strengths[awayTeam] / strengths[homeTeam])
+                    matches.append((seasonIndex, f'{theDate}', isDateGuess, homeTeam, awayTeam, homeFor, awayFor, homeFor, awayFor))
+            cndb.executemany('INSERT INTO MATCHES (SEASON_ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0);', matches)
+            numMatches += len(matches)
+
+            # Replace the weakest teams with teams from the pool.
+            teams.sort(key=lambda teamIndex: strengths[teamIndex])
+            pool = [teamIndex for teamIndex in range(1, self.numTeams + 1) if teamIndex not in teams]
+            teams = teams[self.numRelegated:] + rng.sample(pool, self.numRelegated)
+
+        # A date block for each decade.
+        firstYear = lastStart.year - self.numSeasons + 1
+        for year in range(firstYear - firstYear % 10, lastStart.year + 1, 10):
+            cndb.execute('INSERT INTO DATE_BLOCKS (LABEL, START, FINISH) VALUES (?, ?, ?);', (f'{year}s', f'{year}-07-01', f'{year + 10}-06-30'))
+
+        cndb.commit()
+        cndb.close()
+        return numMatches
+
+
+
+    def _getRounds(self, teams):
+        ''' Returns the fixtures of a double round robin between the specified teams as a list of rounds. '''
+        teams = list(teams)
+        if len(teams) % 2 == 1:
+            # A team without a match each round.
+            teams.append(None)
+        rounds = []
+        for roundIndex in range(len(teams) - 1):
+            rounds.append([(teams[index], teams[-1 - index]) if roundIndex % 2 == 0 else (teams[-1 - index], teams[index]) for index in range(len(teams) // 2)])
+            teams = [teams[0], teams[-1]] + teams[1:-1]
+        rounds += [[(awayTeam, homeTeam) for homeTeam, awayTeam in fixtures] for fixtures in rounds]
+        return [[fixture for fixture in fixtures if None not in fixture] for fixtures in rounds]
+
+
+
+    def _getGoals(self, rng, rate):
+        ''' Returns a random number of goals with the specified mean. '''
+        goals = 0
+        total = rng.expovariate(1)
+        while total < rate:
+            goals += 1
+            total += rng.expovariate(1)
+        return goals
@@ -22,6 +22,8 @@ class Configuration(walton.configuration.IConfiguration):
 
     :ivar XmlDocument xmlDocument: The :py:class:`~walton.wxml.XmlDocument` object that persits the configuration options.
     :ivar string databaseFilename: The filename of the sports results database.
+    :ivar bool isProfile: True to profile every page.
+    :ivar string profileLogFilename: The rolling log file for the page profiles.
     '''
 
 
@@ -50,6 +52,15 @@ class Configuration(walton.configuration.IConfiguration):
         # The filename of the table database.
         self.databaseFilename = xmlDatabase.getAttributeValue('filename', os.getenv("HOME") + '/Documents/Personal/Sports/table.sqlite', True)
 
+        # The page profiling options.
+        xmlProfile = self.xmlDocument.root.getNode('profile')
+
+        # True to profile every page, not just when the debug view is active.
+        self.isProfile = xmlProfile.getAttributeValue('enabled', 'False', True) == 'True'
+
+        # The rolling log file for the page profiles.
+        self.profileLogFilename = xmlProfile.getAttributeValue('log', os.path.join(os.path.dirname(self.databaseFilename), 'table-profile.log'), True)
+
         # xmlCurrentSport = self.xmlDocument.root.getNode('current_sport')
         # The ID of the current active sport.
         # self.currentSportIndex = int(xmlCurrentSport.getAttributeValue('index', '1', True))
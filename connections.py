@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to share the connections to the table database.
+This module implements the :py:class:`ConnectionManager` class.
+'''
+
+# System libraries.
+import threading
+import contextlib
+
+# Require the Sqlite3 library.
+try:
+    import sqlite3
+except:
+    print('pysqlite is not available ({})'.format(__name__));
+
+# Application libraries.
+from instrumentation import InstrumentedConnection
+
+
+
+class ConnectionManager:
+    '''
+    Class to own the long lived connections to the table database.
+    Each thread borrows its own reader connection which stays open until :py:func:`close` is called.
+    All writes go through a single writer connection which is serialised by a lock.
+
+    :ivar string filename: The filename of the database file.
+    :ivar bool isReadOnly: True to open the connections read only.  The writer is not available in this mode.
+    :ivar bool isInstrumented: True to open :py:class:`~instrumentation.InstrumentedConnection` connections that measure the queries.
+    :ivar int connectCount: The number of times that sqlite3.connect() has been called.
+    :ivar int checkoutCount: The number of times that a reader connection has been borrowed.
+    :ivar int writerCheckoutCount: The number of times that the writer connection has been borrowed.
+    '''
+
+
+
+    def __init__(self, filename, isReadOnly=False, isInstrumented=False):
+        '''
+        Class constructor for the :py:class:`ConnectionManager` class.
+
+        :param string filename: Specifies the filename of the database file.
+        :param bool isReadOnly: Optionally specify true to open the connections read only.
+        :param bool isInstrumented: Optionally specify true to measure the queries on the connections.
+        '''
+        # The filename of the database file.
+        self.filename = filename
+        # True to open the connections read only.
+        self.isReadOnly = isReadOnly
+        # True to measure the queries on the connections.
+        self.isInstrumented = isInstrumented
+        # The number of times that sqlite3.connect() has been called.
+        self.connectCount = 0
+        # The number of times that a reader connection has been borrowed.
+        self.checkoutCount = 0
+        # The number of times that the writer connection has been borrowed.
+        self.writerCheckoutCount = 0
+
+        # The reader connection for each thread.
+        self._local = threading.local()
+        # All the reader connections so that they can be closed together.
+        self._readers = []
+        # The shared writer connection.
+        self._writer = None
+        # Lock to serialise the writer and protect the counters.
+        self._writerLock = threading.RLock()
+        self._lock = threading.Lock()
+
+
+
+    def _connect(self):
+        ''' Returns a new connection to the database file. '''
+        with self._lock:
+            self.connectCount += 1
+        factory = InstrumentedConnection if self.isInstrumented else sqlite3.Connection
+        if self.isReadOnly:
+            return sqlite3.connect(f'file:{self.filename}?mode=ro', uri=True, check_same_thread=False, factory=factory)
+        return sqlite3.connect(self.filename, check_same_thread=False, factory=factory)
+
+
+
+    def getReader(self):
+        '''
+        Returns the reader connection for the current thread.
+        The connection is opened on the first request from each thread.
+        Do not close the connection, it belongs to the manager.
+        '''
+        cndb = getattr(self._local, 'connection', None)
+        if cndb is None:
+            cndb = self._connect()
+            self._local.connection = cndb
+            with self._lock:
+                self._readers.append(cndb)
+        with self._lock:
+            self.checkoutCount += 1
+        return cndb
+
+
+
+    @contextlib.contextmanager
+    def writer(self):
+        '''
+        Borrow the writer connection for a single transaction.
+        Use as ``with connections.writer() as cndb:``.
+        The transaction is committed when the block finishes and rolled back if the block raises an exception.
+        '''
+        if self.isReadOnly:
+            raise sqlite3.OperationalError(f'The connection to {self.filename} is read only.')
+        with self._writerLock:
+            if self._writer is None:
+                self._writer = self._connect()
+            with self._lock:
+                self.writerCheckoutCount += 1
+            try:
+                yield self._writer
+            except:
+                self._writer.rollback()
+                raise
+            else:
+                self._writer.commit()
+
+
+
+    def getDataVersion(self):
+        '''
+        Returns a number that changes when another program commits a change to the database file.
+        This is the data version of the writer connection, which does not change when the writer itself commits.
+        The writer connection is opened read only for a read only database.
+        '''
+        with self._writerLock:
+            if self._writer is None:
+                self._writer = self._connect()
+            return self._writer.execute('PRAGMA data_version;').fetchone()[0]
+
+
+
+    def getStatistics(self):
+        ''' Returns a dictionary of the connection counters. '''
+        with self._lock:
+            return {
+                'connects'          : self.connectCount,
+                'checkouts'         : self.checkoutCount,
+                'writer_checkouts'  : self.writerCheckoutCount,
+                'readers'           : len(self._readers),
+            }
+
+
+
+    def close(self):
+        ''' Close all the connections held by the manager. '''
+        with self._writerLock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._lock:
+            for cndb in self._readers:
+                cndb.close()
+            self._readers = []
+        self._local = threading.local()
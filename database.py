@@ -7,19 +7,23 @@ This module implements the :py:class:`Database` class.
 
 import sys
 
-# Require the Sqlite3 library
-try:
-    import sqlite3
-except:
-    print('pysqlite is not available ({})'.format(__name__));
-
 import datetime
 import time
 
 # Application Libraries.
 import walton.database
-from team import Team
-from season import Season
+from connections import ConnectionManager
+from standings import StandingsEngine
+from form import FormGuide
+from headtohead import HeadToHeadService
+from projection import ProjectionEngine
+from simulation import SeasonSimulator
+from page_cache import PageCache
+from schema import SchemaManager
+from standings_table import StandingsTable
+from registry import Registry
+from timeline import SeasonTimeline
+from match_store import MatchStore
 
 
 
@@ -27,11 +31,21 @@ class Database(walton.database.IDatabase):
     '''
     :ivar string filename: The filename of the database file. (INHERITED)
     :ivar Sport currentSport: The current active :py:class:`Sport` object.
-    :ivar Dictionary teams: Dictionary of :py:class:`Team` objects.   This is the cache for the :py:func:`getTeam` function.
     :ivar Dictionary tournaments: Dictionary of :py:class:`Tournament` objects. This is the cache for the :py:func:`getTournament` function.
     :ivar Dictionary matchResults: Dictionary of match results types (The mean if result_index).
-    :ivar Dictionary seasons: Dictionary of :py:class:`~season.Season` objects.  This is the cache for the :py:func:`getSeason` function.
+    :ivar Registry registry: The :py:class:`~registry.Registry` that holds the teams and seasons.  This is the cache for the :py:func:`getTeam` and :py:func:`getSeason` functions.
+    :ivar SeasonTimeline timeline: The :py:class:`~timeline.SeasonTimeline` that orders the seasons by date.
     :ivar bool debug: True for additional debugging outputs.
+    :ivar ConnectionManager connections: The :py:class:`~connections.ConnectionManager` that owns the connections to the database file.
+    :ivar MatchStore matchStore: The :py:class:`~match_store.MatchStore` that holds the matches as memory mapped columns when numpy is available.
+    :ivar StandingsEngine standings: The :py:class:`~standings.StandingsEngine` that calculates the league tables in memory.
+    :ivar FormGuide form: The :py:class:`~form.FormGuide` that finds the last matches of the teams.
+    :ivar HeadToHeadService headToHead: The :py:class:`~headtohead.HeadToHeadService` that holds the results between every pair of teams in each season.
+    :ivar ProjectionEngine projections: The :py:class:`~projection.ProjectionEngine` that calculates the possible finishing positions.
+    :ivar SeasonSimulator simulator: The :py:class:`~simulation.SeasonSimulator` that calculates the probable finishing positions.
+    :ivar PageCache pageCache: The :py:class:`~page_cache.PageCache` that holds the recently rendered pages.
+    :ivar SchemaManager schema: The :py:class:`~schema.SchemaManager` that looks after the indexes.
+    :ivar StandingsTable standingsTable: The :py:class:`~standings_table.StandingsTable` that keeps the final league tables in the database.
 
     Class to represent the database for the sports results database.
     Originally this class handled the rendering as well.
@@ -40,9 +54,10 @@ class Database(walton.database.IDatabase):
 
 
 
-    def __init__(self, databaseFilename, application):
+    def __init__(self, databaseFilename, application, isReadOnly=False):
         '''
         :param string DatabaseFilename: Specify the filename of the sports database.
+        :param bool isReadOnly: Optionally specify True to open the database read only.
         :param string FlagDbFilename: Specify the filename of the countries database.
         :param string FlagsDirectory: Specify the directory that contains the flag images.
 
@@ -53,146 +68,197 @@ class Database(walton.database.IDatabase):
 
         self.application = application
 
-        # Dictionary of Team objects.  This is the cache for the GetTeam() function.
-        self.teams = {}
+        # The shared connections to the database file.
+        # The queries are measured when the application has instrumentation.
+        self.connections = ConnectionManager(self.filename, isReadOnly, getattr(application, 'instrumentation', None) is not None)
 
-        # Dictionary of Season objects.
-        self.seasons = {}
+        # Make sure the indexes for the frequent queries exist.
+        self.schema = SchemaManager(self)
+        if not isReadOnly:
+            self.schema.ensureIndexes()
 
+        # The final league tables stored in the database.
+        self.standingsTable = StandingsTable(self)
+        if not isReadOnly:
+            self.standingsTable.ensureTable()
 
+        # The teams and seasons.  This is the cache for the getTeam() and getSeason() functions.
+        self.registry = Registry(self)
 
+        # The seasons in date order.
+        self.timeline = SeasonTimeline(self)
 
-    def getTeam(self, teamIndex):
+        # The matches as columns.
+        self.matchStore = MatchStore(self)
+
+        # The in memory league tables.
+        self.standings = StandingsEngine(self)
+
+        # The recent form of the teams.
+        self.form = FormGuide(self.standings)
+
+        # The results between every pair of teams in each season.
+        self.headToHead = HeadToHeadService(self)
+
+        # The possible finishing positions.
+        self.projections = ProjectionEngine(self.standings)
+
+        # The probable finishing positions.
+        self.simulator = SeasonSimulator(self.standings)
+
+        # The recently rendered pages.
+        self.pageCache = PageCache()
+
+
+
+    def getConnection(self):
         '''
-        :param int teamIndex: Specify the ID of the team required.
-        :returns: The requested :py:class:`~team.Team` object from the database or cache.
+        Returns the reader connection for the current thread.
+        The connection is shared, do not close it.
+        '''
+        return self.connections.getReader()
 
-        Returns the specified team from the database.
-        In actual fact the the team is probably fetched from the cache.
+
+
+    def writer(self):
         '''
-        if teamIndex == None:
-            return None
+        Returns a context manager that borrows the writer connection for a single transaction.
+        Use as ``with self.database.writer() as cndb:``.
+        '''
+        return self.connections.writer()
 
-        # Only use int types as the key.
-        if type(teamIndex) != type(int):
-            teamIndex = int(teamIndex)
 
-        # Check if the team is already in the dictionary.
-        if teamIndex in self.teams:
-            return self.teams[teamIndex]
 
-        # Read from the database.
-        team = Team(self)
-        team.read(teamIndex)
+    def getConnectionStatistics(self):
+        ''' Returns a dictionary of the connect and checkout counts. '''
+        return self.connections.getStatistics()
 
-        # Store this team in the dictionary.
-        self.teams[teamIndex] = team
 
-        # Return the team.
-        return team
 
+    def close(self):
+        ''' Close the connections to the database file and stop the simulator processes. '''
+        self.simulator.close()
+        self.connections.close()
 
 
-    def getSeason(self, seasonIndex):
+
+    def invalidateSeason(self, seasonIndex=None, matches=None):
         '''
-        :param int seasonIndex: Specified the ID of the requested season.
-        :returns: The requested :py:class:`~season.Season` object.
+        Remove any cached results for the specified season.
+        Call this after the matches in the season have been changed.
 
-        Returns the specified season from the database.
+        :param int seasonIndex: Optionally specify the season that has changed.  Specify None for every season.
+        :param list matches: Optionally specify the IDs of the matches that have changed in the season.  The head to head results are then updated rather than removed.
         '''
-        # Only use int types as the key.
-        if type(seasonIndex) != type(int):
-            seasonIndex = int(seasonIndex)
+        self.matchStore.invalidate()
+        self.standings.invalidate(seasonIndex)
+        self.form.invalidate()
+        if seasonIndex is not None and matches is not None:
+            self.headToHead.updateMatches(seasonIndex, matches)
+        else:
+            self.headToHead.invalidate(seasonIndex)
+        self.projections.invalidate(seasonIndex)
+        self.simulator.invalidate(seasonIndex)
+        self.pageCache.invalidate(seasonIndex)
 
-        # Check if the season is already in the dictionary.
-        if seasonIndex in self.seasons:
-            return self.seasons[seasonIndex]
 
-        # Read from database.
-        season = Season(self)
-        season.read(seasonIndex)
 
-        # Store this season in the dictionary.
-        self.seasons[seasonIndex] = season
+    def applyMatchChanges(self, inserts, updates, deletes, isWhatIf=False):
+        '''
+        Write a batch of changes to the matches as a single transaction.
+        The stored league tables are updated in the same transaction and the cached results of the changed seasons are removed.
 
-        # Return the season.
-        return season
+        :param list inserts: Specifies the new matches as SEASON_ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS.
+        :param list updates: Specifies the changed matches as ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS.
+        :param list deletes: Specifies the IDs of the matches to remove.
+        :param bool isWhatIf: Optionally specify True to leave the real results of the changed matches alone.
+        '''
+        oldMatches = list(deletes) + [update[0] for update in updates]
+        with self.writer() as cndb:
+            # Remove the old values from the stored league tables.
+            changes = self._getMatchSeasons(cndb, oldMatches)
+            self.standingsTable.removeMatches(cndb, oldMatches)
 
+            cndb.executemany('DELETE FROM MATCHES WHERE ID = ?;', [(matchIndex, ) for matchIndex in deletes])
 
+            if isWhatIf:
+                sql = 'UPDATE MATCHES SET THE_DATE = ?, THE_DATE_GUESS = ?, HOME_TEAM_ID = ?, AWAY_TEAM_ID = ?, HOME_TEAM_FOR = ?, AWAY_TEAM_FOR = ?, HOME_BONUS_PTS = ?, AWAY_BONUS_PTS = ? WHERE ID = ?;'
+                params = [(*update[1:9], update[0]) for update in updates]
+            else:
+                sql = 'UPDATE MATCHES SET THE_DATE = ?, THE_DATE_GUESS = ?, HOME_TEAM_ID = ?, AWAY_TEAM_ID = ?, HOME_TEAM_FOR = ?, AWAY_TEAM_FOR = ?, REAL_HOME_TEAM_FOR = ?, REAL_AWAY_TEAM_FOR = ?, HOME_BONUS_PTS = ?, AWAY_BONUS_PTS = ? WHERE ID = ?;'
+                params = [(*update[1:7], update[5], update[6], update[7], update[8], update[0]) for update in updates]
+            cndb.executemany(sql, params)
 
-    def restore(self):
-        ''' Remove the what if results. '''
-        # Connect to the database.
-        cndb = sqlite3.connect(self.filename)
+            # The new matches are given the IDs after the current last ID.
+            lastIndex = cndb.execute('SELECT IFNULL(MAX(ID), 0) FROM MATCHES;').fetchone()[0]
+            sql = 'INSERT INTO MATCHES (SEASON_ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);'
+            cndb.executemany(sql, [(*insert[0:7], insert[5], insert[6], insert[7], insert[8]) for insert in inserts])
+            newMatches = [update[0] for update in updates] + [row[0] for row in cndb.execute('SELECT ID FROM MATCHES WHERE ID > ? ORDER BY ID;', (lastIndex, ))]
 
-        sql = "UPDATE MATCHES SET HOME_TEAM_FOR = REAL_HOME_TEAM_FOR, AWAY_TEAM_FOR = REAL_AWAY_TEAM_FOR WHERE REAL_HOME_TEAM_FOR IS NOT NULL AND REAL_AWAY_TEAM_FOR IS NOT NULL AND (HOME_TEAM_FOR != REAL_HOME_TEAM_FOR OR AWAY_TEAM_FOR != REAL_AWAY_TEAM_FOR);"
-        cndb.execute(sql)
-        cndb.commit()
+            # Add the new values to the stored league tables.
+            self.standingsTable.addMatches(cndb, newMatches)
+            changes += self._getMatchSeasons(cndb, newMatches)
+
+        # Find the matches that changed in each season.
+        seasonMatches = {}
+        for seasonIndex, matchIndex in changes:
+            seasonMatches.setdefault(seasonIndex, []).append(matchIndex)
+
+        # Remove the out of date results.
+        for seasonIndex, matches in seasonMatches.items():
+            self.invalidateSeason(seasonIndex, matches)
 
-        # Close the database.
-        cndb.close()
 
 
+    def _getMatchSeasons(self, cndb, matches):
+        ''' Returns a list of the SEASON_ID and ID of the specified matches. '''
+        if len(matches) == 0:
+            return []
+        sql = f"SELECT SEASON_ID, ID FROM MATCHES WHERE ID IN ({', '.join('?' * len(matches))});"
+        return cndb.execute(sql, tuple(matches)).fetchall()
 
-    def getListTeams(self, startDate, finishDate):
+
+
+    def getTeam(self, teamIndex):
         '''
-        Return an array of teams which played matches between the specified dates.
-        This only works once all the teams have played a home match.
+        :param int teamIndex: Specify the ID of the team required.
+        :returns: The requested :py:class:`~team.Team` object from the database or cache.
+
+        Returns the specified team from the database.
+        In actual fact the the team is probably fetched from the cache.
         '''
-        cndb = sqlite3.connect(self.filename)
+        if teamIndex == None:
+            return None
+
+        # Only use int types as the key.
+        if type(teamIndex) != type(int):
+            teamIndex = int(teamIndex)
 
-        sql = f"SELECT HOME_TEAM_ID FROM MATCHES WHERE THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}' GROUP BY HOME_TEAM_ID;"
-        cursor = cndb.execute(sql)
-        listTeams = []
-        for row in cursor:
-            listTeams.append(row[0])
+        # Fetch from the registry.
+        return self.registry.getTeam(teamIndex)
 
-        return listTeams
 
 
+    def getSeason(self, seasonIndex):
+        '''
+        :param int seasonIndex: Specified the ID of the requested season.
+        :returns: The requested :py:class:`~season.Season` object.
 
-    def getArrayTeamPts(self, teamIndex, startDate, finishDate, isIncludeBonusPoints=True):
-        ''' Return an array of the points scored by the specified team between the specified dates. '''
-        # Connect to the database.
-        cndb = sqlite3.connect(self.filename)
+        Returns the specified season from the database.
+        '''
+        # Only use int types as the key.
+        if type(seasonIndex) != type(int):
+            seasonIndex = int(seasonIndex)
 
-        sql = f"SELECT HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS FROM MATCHES WHERE (HOME_TEAM_ID = {teamIndex} OR AWAY_TEAM_ID = {teamIndex}) AND (THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}') ORDER BY THE_DATE;"
-        cursor = cndb.execute(sql)
-        listPts = []
-        totalPts = 0.0
-        for row in cursor:
-            if row[2] == row[3]:
-                # Draw.  Doesn't matter home or away or goal difference.
-                pts = 1
-            else:
-                if row[0] == teamIndex:
-                    # Home match.
-                    if row[2] > row[3]:
-                        pts = 3.0
-                    else:
-                        pts = 0.0
-                    pts += (row[2] - row[3]) / 1000
-                else:
-                    # Away match.
-                    if row[2] > row[3]:
-                        pts = 0.0
-                    else:
-                        pts = 3.0
-                    pts += (row[3] - row[2]) / 1000
-            if row[0] == teamIndex:
-                # Home match.
-                if row[4] != 0 and isIncludeBonusPoints:
-                    # Bonus points.
-                    pts += row[4]
-            else:
-                # Away match.
-                if row[5] != 0 and isIncludeBonusPoints:
-                    # Bonus points.
-                    pts += row[5]
-            totalPts += pts
-            listPts.append(totalPts)
+        # Fetch from the registry.
+        return self.registry.getSeason(seasonIndex)
 
-        # Close the database.
-        cndb.close()
 
-        return listPts
+
+    def restore(self):
+        ''' Remove the what if results. '''
+        sql = "UPDATE MATCHES SET HOME_TEAM_FOR = REAL_HOME_TEAM_FOR, AWAY_TEAM_FOR = REAL_AWAY_TEAM_FOR WHERE REAL_HOME_TEAM_FOR IS NOT NULL AND REAL_AWAY_TEAM_FOR IS NOT NULL AND (HOME_TEAM_FOR != REAL_HOME_TEAM_FOR OR AWAY_TEAM_FOR != REAL_AWAY_TEAM_FOR);"
+        with self.writer() as cndb:
+            cndb.execute(sql)
+            self.standingsTable.rebuild(cndb)
+        self.invalidateSeason()
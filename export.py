@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to export the pages of the table program as a static html site.
+This module implements the :py:class:`SiteExporter` class.
+
+The pages are rendered by a pool of processes, each with its own :py:class:`~application.Application` object.
+Each process streams its pages straight to their files so the pages are never passed back to the main process.
+A manifest in the output folder records a signature of the matches behind each page so that later exports only render the pages that have changed.
+'''
+
+# System libraries.
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+# Application libraries.
+from application import Application
+
+
+
+# The name of the manifest file in the output folder.
+MANIFEST_FILENAME = 'manifest.json'
+
+# The folder for the style sheets in the output folder.
+STYLES_FOLDER = 'styles'
+
+# Pattern to find the local links in a page.
+APP_LINK = re.compile(r'href="app:([a-z_]*)\??([^"]*)"')
+
+# The exporter in each worker process.
+_exporter = None
+
+
+
+class SiteExporter:
+    '''
+    Class to write every reachable page of the table program to static html files.
+    The reachable pages are the home and last results tables for each season, each team, each team in each season and each head to head pair.
+    The 'app:' links in the pages are rewritten to the exported files.
+
+    :ivar Application application: The :py:class:`~application.Application` object that describes the pages.
+    :ivar object args: The program arguments to create the :py:class:`~application.Application` in each worker process.
+    :ivar string folder: The output folder.
+    :ivar int numProcesses: The number of processes to render the pages.
+    :ivar int numRendered: The number of pages rendered by the last export.
+    :ivar int numSkipped: The number of pages that were unchanged in the last export.
+    '''
+
+
+
+    def __init__(self, application, args, folder, numProcesses=None):
+        '''
+        Class constructor for the :py:class:`SiteExporter` class.
+
+        :param Application application: Specifies the :py:class:`~application.Application` object that describes the pages.
+        :param object args: Specifies the program arguments to create the application in each worker process.
+        :param string folder: Specifies the output folder.
+        :param int numProcesses: Optionally specify the number of processes.  The default is the number of processors.
+        '''
+        self.application = application
+        self.args = args
+        self.folder = folder
+        self.numProcesses = numProcesses if numProcesses is not None else (os.cpu_count() or 1)
+        self.numRendered = 0
+        self.numSkipped = 0
+
+        # The exported filename for each request and set of parameters.
+        self._links = {}
+        # The exported filename for each page.
+        self._pages = {}
+        # The relative link for each style sheet link.
+        self._styles = {}
+
+
+
+    def getPages(self):
+        '''
+        Returns a dictionary of the exported filename for each (request, parameters) page.
+        The parameters are a string in the same form as the 'app:' links.
+        '''
+        cndb = self.application.database.getConnection()
+        seasons = [row[0] for row in cndb.execute('SELECT ID FROM SEASONS ORDER BY ID;')]
+        teams = [row[0] for row in cndb.execute('SELECT ID FROM TEAMS ORDER BY ID;')]
+        teamSeasons = cndb.execute('SELECT DISTINCT SEASON_ID, HOME_TEAM_ID FROM MATCHES UNION SELECT DISTINCT SEASON_ID, AWAY_TEAM_ID FROM MATCHES ORDER BY 1, 2;').fetchall()
+        pairs = cndb.execute('SELECT DISTINCT MIN(HOME_TEAM_ID, AWAY_TEAM_ID), MAX(HOME_TEAM_ID, AWAY_TEAM_ID) FROM MATCHES ORDER BY 1, 2;').fetchall()
+
+        pages = [('index', ''), ('home', ''), ('table_last', ''), ('table_teams', ''), ('table_subset', '')]
+        for seasonIndex in seasons:
+            pages.append(('home', f'season={seasonIndex}'))
+            pages.append(('table_last', f'season={seasonIndex}'))
+        for teamIndex in teams:
+            pages.append(('show_team', f'id={teamIndex}'))
+        for seasonIndex, teamIndex in teamSeasons:
+            pages.append(('show_team_season', f'team={teamIndex}&season={seasonIndex}'))
+        for team1Index, team2Index in pairs:
+            pages.append(('head', f'team1={team1Index}&team2={team2Index}'))
+
+        return {page: self.getFilename(*page) for page in pages if page[0] in self.application.render.actions}
+
+
+
+    def getFilename(self, request, parameters):
+        '''
+        Returns the exported filename for the specified page.
+
+        :param string request: Specifies the request.
+        :param string parameters: Specifies the parameters in the same form as the 'app:' links.
+        '''
+        if request == 'index' and parameters == '':
+            return 'index.html'
+        items = sorted(self.application.render.decodeParameters(parameters).items())
+        return request + ''.join(f'-{key}-{value}' for key, value in items) + '.html'
+
+
+
+    def getSignatures(self, pages):
+        '''
+        Returns a dictionary of the signature for each page.
+        A page in a season depends on the matches in that season.  Other pages depend on every match.
+
+        :param dict pages: Specifies the pages as returned by :py:func:`getPages`.
+        '''
+        cndb = self.application.database.getConnection()
+
+        # The teams, seasons and style sheets change every page.
+        common = hashlib.sha1()
+        for row in cndb.execute('SELECT * FROM TEAMS ORDER BY ID;'):
+            common.update(repr(row).encode())
+        for row in cndb.execute('SELECT * FROM SEASONS ORDER BY ID;'):
+            common.update(repr(row).encode())
+        common.update(repr(self.application.render.html.stylesheets).encode())
+
+        # The matches in each season.
+        seasons = {}
+        for row in cndb.execute('SELECT * FROM MATCHES ORDER BY SEASON_ID, ID;'):
+            if row[1] not in seasons:
+                seasons[row[1]] = hashlib.sha1(common.digest())
+            seasons[row[1]].update(repr(row).encode())
+        everything = hashlib.sha1(common.digest())
+        for seasonIndex in sorted(seasons):
+            everything.update(seasons[seasonIndex].digest())
+
+        signatures = {}
+        for (request, parameters), filename in pages.items():
+            decoded = self.application.render.decodeParameters(parameters)
+            if request in ('home', 'table_last', 'show_team_season') and 'season' in decoded and int(decoded['season']) in seasons:
+                signatures[filename] = seasons[int(decoded['season'])].hexdigest()
+            else:
+                signatures[filename] = everything.hexdigest()
+        return signatures
+
+
+
+    def export(self, isRebuild=False):
+        '''
+        Render the changed pages and write them to the output folder.
+
+        :param bool isRebuild: Optionally specify True to render every page.
+        '''
+        startTime = time.time()
+        os.makedirs(self.folder, exist_ok=True)
+
+        # Decide which pages have changed since the last export.
+        pages = self.getPages()
+        signatures = self.getSignatures(pages)
+        manifestFilename = os.path.join(self.folder, MANIFEST_FILENAME)
+        manifest = {}
+        if not isRebuild and os.path.isfile(manifestFilename):
+            with open(manifestFilename, 'r') as inputFile:
+                manifest = json.load(inputFile)
+        changed = [page for page, filename in pages.items() if manifest.get(filename) != signatures[filename] or not os.path.isfile(os.path.join(self.folder, filename))]
+        self.numSkipped = len(pages) - len(changed)
+
+        # Copy the style sheets.
+        styles = self._copyStyleSheets()
+        self._setPages(pages, styles)
+
+        # Render the changed pages.
+        global _exporter
+        if self.numProcesses > 1 and len(changed) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.numProcesses, initializer=_initialiseWorker, initargs=(self.args, self.folder, pages, styles)) as pool:
+                self.numRendered = sum(pool.map(_renderPage, changed, chunksize=max(1, len(changed) // (4 * self.numProcesses))))
+        else:
+            _exporter = self
+            self.numRendered = sum(map(_renderPage, changed))
+
+        # Remove the files of pages that no longer exist.
+        for filename in set(manifest) - set(signatures):
+            if os.path.isfile(os.path.join(self.folder, filename)):
+                os.remove(os.path.join(self.folder, filename))
+
+        with open(manifestFilename, 'w') as outputFile:
+            json.dump(signatures, outputFile, indent=0, sort_keys=True)
+
+        if self.application.debug:
+            print(f'Exported {self.numRendered} pages, {self.numSkipped} unchanged, in {time.time() - startTime:.1f}s.')
+
+
+
+    def _setPages(self, pages, styles):
+        ''' Set the exported pages and style sheets that the links are rewritten to. '''
+        self._pages = pages
+        self._styles = styles
+        self._links = {(request, frozenset(self.application.render.decodeParameters(parameters).items())): filename for (request, parameters), filename in pages.items()}
+
+
+
+    def _writePage(self, page, html):
+        ''' Stream the rendered html of the specified page to its file in the output folder with the links rewritten. '''
+        with open(os.path.join(self.folder, self._pages[page]), 'w') as outputFile:
+            html.writeTo(outputFile, self._rewriteLinks)
+
+
+
+    def _rewriteLinks(self, html):
+        ''' Returns the specified html with the 'app:' links and style sheets replaced by the exported files. '''
+        html = APP_LINK.sub(lambda match: f'href="{self._getLinkTarget(self._pages, match.group(1), match.group(2))}"', html)
+        for stylesheet, relative in self._styles.items():
+            html = html.replace(stylesheet, relative)
+        return html
+
+
+
+    def _getLinkTarget(self, pages, request, parameters):
+        '''
+        Returns the relative link to the exported page that best matches an 'app:' link.
+        Parameters that are not exported, for example dates, are dropped.
+        '''
+        decoded = self.application.render.decodeParameters(parameters)
+        if request == 'head' and 'team1' in decoded and 'team2' in decoded:
+            team1Index, team2Index = sorted((int(decoded['team1']), int(decoded['team2'])))
+            decoded['team1'] = str(team1Index)
+            decoded['team2'] = str(team2Index)
+        candidates = ['&'.join(f'{key}={value}' for key, value in decoded.items())]
+        decoded.pop('date', None)
+        candidates.append('&'.join(f'{key}={value}' for key, value in decoded.items()))
+        for candidate in candidates:
+            key = (request, frozenset(self.application.render.decodeParameters(candidate).items()))
+            if key in self._links:
+                return self._links[key]
+        if (request, '') in pages:
+            return pages[(request, '')]
+        return pages[('index', '')]
+
+
+
+    def _copyStyleSheets(self):
+        ''' Copy the style sheets to the output folder.  Returns a dictionary of the relative link for each style sheet link. '''
+        folder = os.path.join(self.folder, STYLES_FOLDER)
+        os.makedirs(folder, exist_ok=True)
+        styles = {}
+        for stylesheet in self.application.render.html.stylesheets:
+            filename = stylesheet[5:] if stylesheet.startswith('file:') else stylesheet
+            if os.path.isfile(filename):
+                shutil.copyfile(filename, os.path.join(folder, os.path.basename(filename)))
+                styles[stylesheet] = f'{STYLES_FOLDER}/{os.path.basename(filename)}'
+        return styles
+
+
+
+def _initialiseWorker(args, folder, pages, styles):
+    ''' Create the application object and the exporter in a worker process. '''
+    global _exporter
+    application = Application(args)
+    # The workers are already in parallel.
+    application.database.simulator.numProcesses = 1
+    _exporter = SiteExporter(application, args, folder, 1)
+    _exporter._setPages(pages, styles)
+
+
+
+def _renderPage(page):
+    '''
+    Render the specified page and write it to its file.  Returns 1 for the page written.
+    This is a module function so that it can run in a worker process.
+
+    :param tuple page: Specifies the request and parameters.
+    '''
+    request, parameters = page
+    render = _exporter.application.render
+    render.actions[request](render.decodeParameters(parameters))
+    _exporter._writePage(page, render.html)
+    return 1
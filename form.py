@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to calculate the recent form of the teams for the table program.
+This module implements the :py:class:`FormGuide` class.
+'''
+
+# System libraries.
+import array
+import bisect
+import collections
+import threading
+
+# Application libraries.
+from instrumentation import timed
+from standings import MatchColumns, SeasonSnapshots, StandingsEngine
+
+
+
+class FormGuide:
+    '''
+    Class to find the last matches of every team in a table in a single pass backwards through the matches.
+    The last results table and the win / draw / loss boxes in :py:func:`~render.Render.displayTable` both read from here.
+    The matches can be from previous seasons.
+    The most recently used forms are cached up to a fixed number of forms.
+
+    :ivar StandingsEngine standings: The :py:class:`~standings.StandingsEngine` that holds the matches.
+    :ivar int maxForms: The maximum number of forms in the cache.
+    '''
+
+
+
+    def __init__(self, standings, maxForms=64):
+        '''
+        Class constructor for the :py:class:`FormGuide` class.
+
+        :param StandingsEngine standings: Specifies the :py:class:`~standings.StandingsEngine` that holds the matches.
+        :param int maxForms: Optionally specify the maximum number of forms in the cache.
+        '''
+        # The engine that holds the matches.
+        self.standings = standings
+        # The maximum number of forms in the cache.
+        self.maxForms = maxForms
+
+        # The dates and positions of the matches with a date in date order.
+        self._order = None
+        # The last matches for each date, number of matches and set of teams with the most recently used last.
+        self._forms = collections.OrderedDict()
+        # Lock to protect the caches.
+        self._lock = threading.Lock()
+
+
+
+    def invalidate(self):
+        ''' Remove the last matches from the cache.  Any change in any season can change the form. '''
+        with self._lock:
+            self._order = None
+            self._forms = collections.OrderedDict()
+
+
+
+    @timed('form')
+    def getForm(self, theDate, numMatches, teams):
+        '''
+        Returns a dictionary of the last matches of each of the specified teams up to the specified date, the most recent first.
+        Each match is HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR with None for missing goals.
+
+        :param object theDate: Specifies the last date to include as a date or 'YYYY-MM-DD' string.
+        :param int numMatches: Specifies the maximum number of matches for each team.
+        :param iterable teams: Specifies the teams.
+        '''
+        teams = frozenset(teams)
+        key = (self.standings._toOrdinal(theDate), numMatches, teams)
+        with self._lock:
+            if key in self._forms:
+                self._forms.move_to_end(key)
+                return self._forms[key]
+
+        columns = self.standings.getColumns(StandingsEngine.ALL_SEASONS)
+        dates, positions = self._getOrder()
+
+        # Walk backwards from the date until every team has enough matches.
+        form = {teamIndex: [] for teamIndex in teams}
+        numWaiting = len(teams) if numMatches > 0 else 0
+        index = bisect.bisect_right(dates, key[0])
+        while numWaiting > 0 and index > 0:
+            index -= 1
+            position = positions[index]
+            homeTeam = columns.homeTeams[position]
+            awayTeam = columns.awayTeams[position]
+            for teamIndex in (homeTeam, awayTeam):
+                matches = form.get(teamIndex)
+                if matches is not None and len(matches) < numMatches:
+                    homeFor = columns.homeFor[position]
+                    awayFor = columns.awayFor[position]
+                    matches.append((homeTeam, awayTeam, None if homeFor < 0 else homeFor, None if awayFor < 0 else awayFor))
+                    if len(matches) == numMatches:
+                        numWaiting -= 1
+
+        with self._lock:
+            self._forms[key] = form
+            while len(self._forms) > self.maxForms:
+                self._forms.popitem(last=False)
+        return form
+
+
+
+    def getLastResultsTable(self, seasonIndex, theDate, numMatches):
+        '''
+        Returns a table of the last results for each team in the specified season up to the specified date.
+        The rows have the same layout as :py:func:`~standings.StandingsEngine.getTable` and are sorted by points and goal difference.
+
+        :param int seasonIndex: Specifies the season.
+        :param object theDate: Specifies the last date to include as a date or 'YYYY-MM-DD' string.
+        :param int numMatches: Specifies the number of matches to include for each team.
+        '''
+        form = self.getForm(theDate, numMatches, self.standings.getColumns(seasonIndex).homeTeams)
+        records = {}
+        for teamIndex in sorted(form):
+            record = records[teamIndex] = [0] * SeasonSnapshots.NUM_TOTALS
+            for homeTeam, awayTeam, homeFor, awayFor in form[teamIndex]:
+                if homeFor is None or awayFor is None:
+                    # The match has not been played.
+                    continue
+                if homeTeam == teamIndex:
+                    # Home match.
+                    record[0 if homeFor > awayFor else 1 if homeFor == awayFor else 2] += 1
+                    record[3] += homeFor
+                    record[4] += awayFor
+                else:
+                    # Away match.
+                    record[5 if awayFor > homeFor else 6 if homeFor == awayFor else 7] += 1
+                    record[8] += awayFor
+                    record[9] += homeFor
+        rows = self.standings._buildRows(records, False, seasonIndex)
+
+        # The last results table ignores the goals scored.
+        rows.sort(key=lambda row: (row[11], row[12]), reverse=True)
+        return rows
+
+
+
+    def _getOrder(self):
+        ''' Returns the dates and positions in the ALL_SEASONS columns of the matches with a date in date order. '''
+        with self._lock:
+            if self._order is not None:
+                return self._order
+
+        columns = self.standings.getColumns(StandingsEngine.ALL_SEASONS)
+        positions = sorted((position for position in range(len(columns)) if columns.dates[position] != MatchColumns.NO_DATE), key=lambda position: columns.dates[position])
+        order = (array.array('l', (columns.dates[position] for position in positions)), array.array('l', positions))
+
+        with self._lock:
+            self._order = order
+        return order
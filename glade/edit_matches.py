@@ -14,7 +14,6 @@ try:
 except:
     print('GTK Not Available ({})'.format(__name__))
 
-import sqlite3
 import datetime
 import time
 import os
@@ -439,16 +438,9 @@ class EditMatches:
         liststoreModes = self.builder.get_object('liststoreModes')
         activeMode = liststoreModes.get_value(modeIter, 0)
 
-        # Open the database.
-        cndb = sqlite3.connect(self.database.filename)
-
-        # Remove any matches marked for delete.
-        for matchIndex in self.matchesDelete:
-            sql = f"DELETE FROM MATCHES WHERE ID = {matchIndex};"
-            cursor = cndb.execute(sql)
-            cndb.commit()
-
-        # Loop through the liststore of matches.
+        # Collect the changes from the liststore.
+        inserts = []
+        updates = []
         iterMatches = liststoreMatches.get_iter_first()
         while iterMatches:
             matchIndex = liststoreMatches.get_value(iterMatches, 0)
@@ -456,11 +448,11 @@ class EditMatches:
             if isChange:
                 theDate = liststoreMatches.get_value(iterMatches, 2)
                 if theDate == 'None' or theDate[0:1] == '.':
-                    theDate = 'NULL'
+                    theDate = None
                 else:
                     dtDate = datetime.date(*time.strptime(theDate, "%d-%m-%Y")[:3])
                     # strftime does not work for years < 1900, so don't use it.
-                    theDate = "'{}-{:0=2}-{:0=2}'".format(dtDate.year, dtDate.month, dtDate.day)
+                    theDate = '{}-{:0=2}-{:0=2}'.format(dtDate.year, dtDate.month, dtDate.day)
                 isDateGuess = 1 if liststoreMatches.get_value(iterMatches, 3) else 0
                 homeTeamIndex = liststoreMatches.get_value(iterMatches, 4)
                 awayTeamIndex = liststoreMatches.get_value(iterMatches, 6)
@@ -470,26 +462,15 @@ class EditMatches:
                 awayBonusPts = liststoreMatches.get_value(iterMatches, 11)
 
                 if matchIndex == 0:
-                    sql = f"INSERT INTO MATCHES (SEASON_ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS) VALUES ({self.seasonIndex}, {theDate}, {isDateGuess}, {homeTeamIndex}, {awayTeamIndex}, {homeTeamFor}, {awayTeamFor}, {homeTeamFor}, {awayTeamFor}, {homeBonusPts}, {awayBonusPts});"
+                    inserts.append((self.seasonIndex, theDate, isDateGuess, homeTeamIndex, awayTeamIndex, homeTeamFor, awayTeamFor, homeBonusPts, awayBonusPts))
                 else:
-                    if activeMode == 1:
-                        # What if mode.
-                        sql = f"UPDATE MATCHES SET THE_DATE = {theDate}, THE_DATE_GUESS = {isDateGuess}, HOME_TEAM_ID = {homeTeamIndex}, AWAY_TEAM_ID = {awayTeamIndex}, HOME_TEAM_FOR = {homeTeamFor}, AWAY_TEAM_FOR = {awayTeamFor}, HOME_BONUS_PTS = {homeBonusPts}, AWAY_BONUS_PTS = {awayBonusPts} WHERE ID = {matchIndex};"
-                    else:
-                        # Real mode.
-                        sql = f"UPDATE MATCHES SET THE_DATE = {theDate}, THE_DATE_GUESS = {isDateGuess}, HOME_TEAM_ID = {homeTeamIndex}, AWAY_TEAM_ID = {awayTeamIndex}, HOME_TEAM_FOR = {homeTeamFor}, AWAY_TEAM_FOR = {awayTeamFor}, REAL_HOME_TEAM_FOR = {homeTeamFor}, REAL_AWAY_TEAM_FOR = {awayTeamFor}, HOME_BONUS_PTS = {homeBonusPts}, AWAY_BONUS_PTS = {awayBonusPts} WHERE ID = {matchIndex};"
-
-                # Execute the command.
-                # print(sql)
-                # cursor = cnDb.execute(sql, params)
-                cursor = cndb.execute(sql)
-                cndb.commit()
+                    updates.append((matchIndex, theDate, isDateGuess, homeTeamIndex, awayTeamIndex, homeTeamFor, awayTeamFor, homeBonusPts, awayBonusPts))
 
             # Move to next record.
             iterMatches = liststoreMatches.iter_next(iterMatches)
 
-        # Close the database.
-        cndb.close()
+        # Write all the changes as a single transaction.  The what if mode leaves the real results alone.
+        self.database.applyMatchChanges(inserts, updates, self.matchesDelete, activeMode == 1)
 
         # Mark the data as saved.
         self.isChanged = False
@@ -508,8 +489,8 @@ class EditMatches:
         liststoreTeams = self.builder.get_object('liststoreTeams')
         liststoreTeams.clear()
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Fetch the list of teams.
         sql = 'SELECT ID, LABEL FROM TEAMS ORDER BY LABEL;'
@@ -535,9 +516,6 @@ class EditMatches:
         #newRow = liststoreTeams.append()
         #liststoreTeams.set(newRow, 0, -2, 1, 'New...')
 
-        # Close the database.
-        cndb.close()
-
 
 
     def populateMatches(self, sql):
@@ -552,8 +530,8 @@ class EditMatches:
         comboboxMode = self.builder.get_object('comboboxMode')
         comboboxMode.set_active(0)
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # If the year has changed then load another group of players.
         self.populateTeamCombos(0)
@@ -588,9 +566,6 @@ class EditMatches:
             liststoreMatches.set(newRow, 0, row[0], 1, 0, 2, theDate, 3, isDateGuess, 4, row[3], 5, homeTeamName, 6, row[4], 7, awayTeamName, 8, row[5], 9, row[6], 10, row[7], 11, row[8])
         cursor.close()
 
-        # Close the database.
-        cndb.close()
-
         # The database is up to date with the dialog contents.
         self.isChanged = False
 
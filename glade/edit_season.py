@@ -407,6 +407,7 @@ class EditSeason:
 
         # Write changes to database.
         self.season.write()
+        self.database.invalidateSeason(self.season.index)
 
 
     def populateDialog(self):
@@ -60,7 +60,10 @@ import walton.glade.fullscreen
 #import walton.glade.edit_country
 #import glade.preferences
 #import glade.edit_team
-import glade.edit_matches
+import glade.page_worker
+from prefetch import Prefetcher
+import startup
+# The dialog modules are imported when the dialog is first shown.
 #import glade.edit_sport
 #import glade.edit_tournament
 #import glade.edit_location
@@ -87,7 +90,11 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
     :ivar int selectedLevel: The currently selected level.  Use 'None' for the default level.  The first user option is level 0.
     :ivar Database database: The database for the 'Sports Results' database.
     :ivar Render render: The render object for the 'Sports Results' database.
+    :ivar PageWorker pageWorker: The :py:class:`~glade.page_worker.PageWorker` that renders the pages away from the main loop.
+    :ivar Prefetcher prefetcher: The :py:class:`~prefetch.Prefetcher` that renders the likely next pages into the page cache.
     '''
+    # The requests that are rendered on the main loop because they change the configuration and the style sheets.
+    MAIN_LOOP_REQUESTS = ('preferences', )
 
 
 
@@ -228,6 +235,12 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         # self.render.html.stylesheets.append('file://' + os.path.dirname(os.path.realpath(__file__)) + '/' +'textsize_{}.css'.format(self.configuration.textSize))
         self.render = self.application.render
 
+        # The worker thread to render the pages away from the main loop.
+        self.pageWorker = glade.page_worker.PageWorker(self.application, self.pageFinished)
+
+        # The thread to render the likely next pages after each page.
+        self.prefetcher = Prefetcher(self.application)
+
         self.render.showHome({})
         self.displayCurrentPage()
         #self.window.set_title(self.database.currentSport.name + ' - Sports Results DB')
@@ -252,8 +265,25 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
     def run(self):
         ''' Run the GTK main loop. '''
         self.window.show_all()
+        GLib.idle_add(self._reportStartup)
         Gtk.main()
 
+        # Do not wait for a page that is still being rendered.
+        self.pageWorker.shutdown()
+        self.prefetcher.shutdown()
+        if self.application.debug:
+            print(f'Prefetch {self.prefetcher.getStatistics()}.')
+
+
+
+    def _reportStartup(self):
+        ''' Report the start up profile once the window and the first page have been shown. '''
+        startup.profile.mark('first page shown')
+        startup.profile.report()
+
+        # Return false so that idle_add does not call here again.
+        return False
+
 
 
     def _fileHome(self, widget):
@@ -313,6 +343,7 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
 
     def _editAddSeason(self, widget):
         ''' Signal handler for the 'Edit' → 'Add Season' menu item. '''
+        import glade.edit_season
         dialog = glade.edit_season.EditSeason(self.window)
         if dialog.editSeason(self.database, None):
             # Get the last easonIndex
@@ -421,6 +452,10 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         else:
             print('DEBUG is off.')
 
+        # Profile the pages while the debug view is active or when the configuration asks for every page.
+        self.application.instrumentation.isEnabled = self.application.debug or self.application.configuration.isProfile
+        self.render.profile = None
+
         if self.application.debug:
             # Add the debug stylesheet.
             self.render.html.stylesheets.append('file://' + os.path.dirname(os.path.realpath(__file__)) + os.sep + 'debug.css')
@@ -696,6 +731,7 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         '''
         Load the current page as specified by :py:attr:`self.request` and :py:attr:`self.parameters` attributes.
         Add the options from the main window toolbar to the parameters and fetch the page from the render object.
+        The render pages are built on the :py:class:`~glade.page_worker.PageWorker` thread, which calls :py:func:`pageFinished` when the page is ready.
         This will call :py:func:`displayCurrentPage` if the content changes.
         Display chain is :py:func:`followLocalLink` → :py:func:`openCurrentPage` → :py:func:`displayCurrentPage`.
         '''
@@ -729,12 +765,23 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
 
         isNewContent = True
 
+        # The page request comes before the likely pages of the previous page.
+        self.prefetcher.cancel()
+
         # This is like a switch statement (that Python does not support).
-        if self.request in self.render.actions:
+        if self.request in self.render.actions and self.request not in MainWindow.MAIN_LOOP_REQUESTS:
+            # Render the page on the worker thread.  This supersedes any page still being rendered.
+            # The wait cursor stays until the page arrives in pageFinished().
+            self.pageWorker.request(self.request, parameters, self.render.html.stylesheets)
+            return False
+        elif self.request in self.render.actions:
             isNewContent = True
-            self.render.actions[self.request](parameters)
+            self.pageWorker.cancel()
+            self.render.showPage(self.request, parameters)
         elif self.request in self.actions:
             isNewContent = True
+            self.pageWorker.cancel()
+            self.render.profile = None
             self.actions[self.request](parameters)
         else:
             # Error don't do anything.
@@ -745,14 +792,47 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
             self.displayCurrentPage()
 
         # Remove the wait cursor.
+        self.resetCursor()
+
+        # Return false so that idle_add does not call here again.
+        return False
+
+
+
+    def pageFinished(self, result):
+        '''
+        Display a page rendered by the :py:class:`~glade.page_worker.PageWorker`.
+        This is called on the main loop and only for the current request.
+        Display chain is :py:func:`openCurrentPage` → :py:func:`pageFinished` → :py:func:`displayCurrentPage`.
+
+        :param PageResult result: Specifies the :py:class:`~glade.page_worker.PageResult` of the page.
+        '''
+        if result.error is None:
+            # The page replaces the html object and the toolbar state of the main render object.
+            self.render.html = result.html
+            for name, value in result.state.items():
+                setattr(self.render, name, value)
+            self.render.profile = result.profile
+            self.displayCurrentPage()
+
+            # Render the likely next pages while the user reads this one.
+            self.prefetcher.schedule(result.request, result.parameters, result.state)
+        else:
+            print(f"Request '{result.request}' failed.")
+            print(result.error)
+
+        # Remove the wait cursor.
+        self.resetCursor()
+
+
+
+    def resetCursor(self):
+        ''' Remove the wait cursor from the window. '''
         if self.window.get_window() != None:
             self.window.get_window().set_cursor(None)
         if self.webview.get_window() != None:
             self.webview.get_window().set_cursor(None)
 
-        # Return false so that idle_add does not call here again.
-        return False
-
 
 
     def displayCurrentPage(self):
@@ -846,7 +926,14 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
             menuEditCopy.set_sensitive(False)
 
         # Display the html content on the webview control.
-        self.webview.load_html(self.render.html.toHtml(), 'file:///')
+        content = self.render.html.toHtml()
+        if self.application.debug and self.render.profile is not None:
+            # Add the profile of the page as a collapsible panel at the end of the page.
+            index = content.rfind('</body>')
+            if index < 0:
+                index = len(content)
+            content = content[:index] + self.render.profile.toHtml() + content[index:]
+        self.webview.load_html(content, 'file:///')
 
         # Events / signals back on.
         self.noEvents -= 1
@@ -860,9 +947,11 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         teamIndex = parameters['team'] if 'team' in parameters else None
         seasonIndex = "1"
 
-        sql = f"SELECT ID, THE_DATE, 0 AS THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE (HOME_TEAM_ID = {teamIndex} OR AWAY_TEAM_ID = {teamIndex}) AND SEASON_ID = {seasonIndex} ORDER BY THE_DATE DESC;"
+        sql = f"SELECT ID, THE_DATE, 0 AS THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE HOME_TEAM_ID = {teamIndex} AND SEASON_ID = {seasonIndex} UNION ALL "
+        sql += f"SELECT ID, THE_DATE, 0 AS THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE AWAY_TEAM_ID = {teamIndex} AND SEASON_ID = {seasonIndex} ORDER BY THE_DATE DESC;"
 
         # Edit these matches.
+        import glade.edit_matches
         dialog = glade.edit_matches.EditMatches(self.window)
         if dialog.editMatches(self.database, sql, seasonIndex):
             self.followLocalLink(f'team?team={teamIndex}', True)
@@ -879,10 +968,11 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         theDate = parameters['date'] if 'date' in parameters else None
 
         if theDate is None:
-            sql = f"SELECT ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS FROM MATCHES WHERE SEASON_ID = {seasonIndex} ORDER BY THE_DATE DESC LIMIT 20"
+            sql = f"SELECT ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS FROM MATCHES WHERE SEASON_ID = {seasonIndex} ORDER BY THE_DATE DESC, ID LIMIT 20"
         else:
             sql = f"SELECT ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS FROM MATCHES WHERE SEASON_ID = {seasonIndex} AND THE_DATE = '{theDate}'"
 
+        import glade.edit_matches
         dialog = glade.edit_matches.EditMatches(self.window)
         if dialog.editMatches(self.database, sql, seasonIndex):
             # print('Edit has finished')
@@ -907,6 +997,7 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         '''
         seasonIndex = int(parameters['season']) if 'season' in parameters else None
 
+        import glade.edit_season
         dialog = glade.edit_season.EditSeason(self.window)
         if dialog.editSeason(self.database, seasonIndex):
             self.render.showSeason({'season': seasonIndex})
@@ -925,6 +1016,7 @@ class MainWindow(walton.glade.webkit.IWebKit2, walton.glade.fullscreen.IFullscre
         tournamentSeasonIndex = int(parameters['index']) if 'index' in parameters else None
 
         if tournamentSeasonIndex != None:
+            import glade.edit_matches
             dialog = glade.edit_matches.EditMatches(self.window)
             dialog.editMatches(self.database, tournamentSeasonIndex)
 
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to render the pages of the main window away from the GTK main loop.
+This module implements the :py:class:`PageWorker` class.
+'''
+
+# Import Gtk3 libraries.
+try:
+    from gi.repository import GLib
+except:
+    print('GTK Not Available ({})'.format(__name__))
+
+# System libraries.
+import concurrent.futures
+import sqlite3
+import threading
+import traceback
+
+# Application libraries.
+from htmlbuilder import HtmlBuilder
+from render import Render
+
+
+
+class PageResult:
+    '''
+    Class to hold a page rendered by the :py:class:`PageWorker`.
+
+    :ivar int generation: The generation of the request that rendered the page.
+    :ivar string request: The request of the page.
+    :ivar dict parameters: The parameters of the page.
+    :ivar HtmlBuilder html: The html object of the page.  This belongs to the main loop once the page is delivered.
+    :ivar dict state: The :py:attr:`~render.Render.PAGE_STATE` attributes of the page.
+    :ivar PageProfile profile: The :py:class:`~instrumentation.PageProfile` of the page or None.
+    :ivar string error: The traceback if the page failed or None.
+    '''
+
+
+
+    def __init__(self, generation, request, parameters):
+        ''' Class constructor for the :py:class:`PageResult` class. '''
+        self.generation = generation
+        self.request = request
+        self.parameters = parameters
+        self.html = None
+        self.state = {}
+        self.profile = None
+        self.error = None
+
+
+
+class PageWorker:
+    '''
+    Class to render the :py:attr:`~render.Render.actions` pages on a worker thread.
+    The worker has its own :py:class:`~render.Render` object and its own read only connection, like the threads of the server.
+    The finished page is handed back to the GTK main loop with GLib.idle_add().
+
+    Each request supersedes the previous request.
+    A superseded request that has not started is cancelled, a superseded query is interrupted and any other superseded page is dropped when it finishes.
+
+    :ivar Application application: The application that owns the database.
+    :ivar function onFinished: The function to call on the main loop with each :py:class:`PageResult` that is not superseded.
+    :ivar int generation: The generation of the current request.
+    '''
+    # The number of sqlite virtual machine instructions between the checks for a superseded request.
+    PROGRESS_INSTRUCTIONS = 10000
+
+
+
+    def __init__(self, application, onFinished):
+        '''
+        Class constructor for the :py:class:`PageWorker` class.
+
+        :param Application application: Specifies the application that owns the database.
+        :param function onFinished: Specifies the function to call on the main loop with each finished :py:class:`PageResult`.
+        '''
+        self.application = application
+        self.onFinished = onFinished
+        self.generation = 0
+
+        # A single thread so that the pages are rendered in order.
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='page')
+        self._future = None
+        # The render object and connection of the worker thread.
+        self._local = threading.local()
+        # Lock to protect the generation and the future.
+        self._lock = threading.Lock()
+
+
+
+    def request(self, request, parameters, stylesheets):
+        '''
+        Start rendering the specified page.  Any earlier request is superseded.
+        Returns the generation of the request.
+
+        :param string request: Specifies the request.
+        :param dict parameters: Specifies the request parameters.
+        :param list stylesheets: Specifies the style sheets for the page.
+        '''
+        with self._lock:
+            self.generation += 1
+            if self._future is not None:
+                self._future.cancel()
+            self._future = self._executor.submit(self._render, self.generation, request, parameters, list(stylesheets))
+            return self.generation
+
+
+
+    def cancel(self):
+        ''' Supersede the current request without a new request. '''
+        with self._lock:
+            self.generation += 1
+            if self._future is not None:
+                self._future.cancel()
+                self._future = None
+
+
+
+    def isBusy(self):
+        ''' Returns True if a request is waiting for its page. '''
+        with self._lock:
+            return self._future is not None and not self._future.done()
+
+
+
+    def shutdown(self):
+        ''' Cancel the current request and stop the worker thread.  Does not wait for a running page. '''
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+
+    def _isSuperseded(self, generation):
+        ''' Returns True if the specified generation is no longer the current request. '''
+        return generation != self.generation
+
+
+
+    def _getRender(self):
+        ''' Returns the render object for the worker thread. '''
+        render = getattr(self._local, 'render', None)
+        if render is None:
+            render = Render(self.application)
+            self._local.render = render
+        return render
+
+
+
+    def _render(self, generation, request, parameters, stylesheets):
+        ''' Render the specified page on the worker thread and hand the result to the main loop. '''
+        if self._isSuperseded(generation):
+            return
+
+        # Interrupt the queries of the worker connection once the request is superseded.
+        cndb = self.application.database.getConnection()
+        cndb.set_progress_handler(lambda: 1 if self._isSuperseded(generation) else 0, PageWorker.PROGRESS_INSTRUCTIONS)
+
+        result = PageResult(generation, request, parameters)
+        render = self._getRender()
+
+        # Render into a new html object because the previous html object belongs to the main loop.
+        render.html = HtmlBuilder()
+        render.html.stylesheets = stylesheets
+        try:
+            render.showPage(request, parameters)
+        except sqlite3.OperationalError:
+            if self._isSuperseded(generation):
+                return
+            result.error = traceback.format_exc()
+        except Exception:
+            result.error = traceback.format_exc()
+        finally:
+            cndb.set_progress_handler(None, 0)
+
+        if self._isSuperseded(generation):
+            return
+        result.html = render.html
+        result.state = {name: getattr(render, name) for name in Render.PAGE_STATE}
+        result.profile = render.profile
+        GLib.idle_add(self._deliver, result)
+
+
+
+    def _deliver(self, result):
+        ''' Pass the specified result to :py:attr:`onFinished` on the main loop unless it has been superseded. '''
+        if not self._isSuperseded(result.generation):
+            with self._lock:
+                self._future = None
+            self.onFinished(result)
+
+        # Return false so that idle_add does not call here again.
+        return False
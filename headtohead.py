@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to hold the results between every pair of teams in a season for the table program.
+This module implements the :py:class:`HeadToHeadService` class.
+'''
+
+# System libraries.
+import datetime
+import threading
+
+# Application libraries.
+from instrumentation import timed
+from standings import MatchColumns, SeasonSnapshots
+
+
+
+class HeadToHeadMatrix:
+    '''
+    Class to hold the matches of a season in a dense teams × teams array of cells.
+    Each cell holds the matches with the row team at home to the column team as (ID, date ordinal, home goals, away goals).
+    Missing dates are stored as :py:attr:`~standings.MatchColumns.NO_DATE` and missing goals as None.
+
+    :ivar int seasonIndex: The season of the matches.
+    :ivar list teams: The indexes of the teams in the season in ascending order.
+    '''
+
+
+    def __init__(self, seasonIndex, rows):
+        '''
+        Class constructor for the :py:class:`HeadToHeadMatrix` class.
+
+        :param int seasonIndex: Specifies the season.
+        :param list rows: Specifies the ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR and AWAY_TEAM_FOR of each match.
+        '''
+        self.seasonIndex = seasonIndex
+        self.teams = sorted(set(row[2] for row in rows) | set(row[3] for row in rows))
+        self._positions = {teamIndex: position for position, teamIndex in enumerate(self.teams)}
+        self._cells = [[] for cell in range(len(self.teams) * len(self.teams))]
+        # The cell of each match.
+        self._matches = {}
+        for row in rows:
+            self.setMatch(row)
+
+
+
+    def isMember(self, teamIndex):
+        ''' Returns True if the specified team has a match in the season. '''
+        return teamIndex in self._positions
+
+
+
+    def getMatches(self, homeTeamIndex, awayTeamIndex, finishDate=None):
+        '''
+        Returns the list of matches with the first team at home to the second team in ID order.
+        Each match is (ID, date ordinal, home goals, away goals).
+
+        :param int homeTeamIndex: Specifies the home team.
+        :param int awayTeamIndex: Specifies the away team.
+        :param int finishDate: Optionally specify the last date as a day ordinal.  Matches without a date are excluded when a date is specified.
+        '''
+        if homeTeamIndex not in self._positions or awayTeamIndex not in self._positions:
+            return []
+        matches = self._cells[self._positions[homeTeamIndex] * len(self.teams) + self._positions[awayTeamIndex]]
+        if finishDate is None:
+            return matches
+        return [match for match in matches if MatchColumns.NO_DATE < match[1] <= finishDate]
+
+
+
+    def setMatch(self, row):
+        '''
+        Add or replace a single match in the matrix.
+        Returns False if a team is not in the matrix, then the matrix must be rebuilt.
+
+        :param tuple row: Specifies the ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR and AWAY_TEAM_FOR of the match.  THE_DATE can be a day ordinal.
+        '''
+        if row[2] not in self._positions or row[3] not in self._positions:
+            return False
+        self.removeMatch(row[0])
+        cell = self._cells[self._positions[row[2]] * len(self.teams) + self._positions[row[3]]]
+        if isinstance(row[1], int):
+            theDate = row[1]
+        else:
+            theDate = MatchColumns.NO_DATE if row[1] is None else datetime.date.fromisoformat(row[1][:10]).toordinal()
+        cell.append((row[0], theDate, row[4], row[5]))
+        cell.sort()
+        self._matches[row[0]] = cell
+        return True
+
+
+
+    def removeMatch(self, matchIndex):
+        '''
+        Remove a single match from the matrix.
+
+        :param int matchIndex: Specifies the ID of the match.
+        '''
+        cell = self._matches.pop(matchIndex, None)
+        if cell is not None:
+            cell[:] = [match for match in cell if match[0] != matchIndex]
+
+
+
+class HeadToHeadService:
+    '''
+    Class to cache a :py:class:`HeadToHeadMatrix` for each season.
+    Each matrix is read with a single query and is updated match by match when the matches are edited.
+
+    :ivar Database database: The :py:class:`~database.Database` to read the matches from.
+    '''
+
+
+
+    def __init__(self, database):
+        '''
+        Class constructor for the :py:class:`HeadToHeadService` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` to read the matches from.
+        '''
+        self.database = database
+
+        # The matrix for each season.
+        self._matrices = {}
+        # Lock to protect the cache.
+        self._lock = threading.Lock()
+
+
+
+    @timed('head to head')
+    def getMatrix(self, seasonIndex):
+        '''
+        Returns the :py:class:`HeadToHeadMatrix` for the specified season.
+
+        :param int seasonIndex: Specifies the season.
+        '''
+        with self._lock:
+            if seasonIndex in self._matrices:
+                return self._matrices[seasonIndex]
+
+        if self.database.matchStore.isEnabled:
+            # The season slice of the match store is in ID order with the dates as day ordinals.
+            columns = self.database.matchStore.getColumns(seasonIndex)
+            rows = [(matchIndex, theDate, homeTeam, awayTeam, None if homeFor < 0 else homeFor, None if awayFor < 0 else awayFor) for matchIndex, theDate, homeTeam, awayTeam, homeFor, awayFor in zip(columns.ids, columns.dates, columns.homeTeams, columns.awayTeams, columns.homeFor, columns.awayFor)]
+        else:
+            cndb = self.database.getConnection()
+            sql = "SELECT ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND HOME_TEAM_ID IS NOT NULL AND AWAY_TEAM_ID IS NOT NULL ORDER BY ID;"
+            rows = cndb.execute(sql, (seasonIndex, )).fetchall()
+        matrix = HeadToHeadMatrix(seasonIndex, rows)
+
+        with self._lock:
+            self._matrices[seasonIndex] = matrix
+        return matrix
+
+
+
+    def invalidate(self, seasonIndex=None):
+        '''
+        Remove the matrix for the specified season from the cache.
+
+        :param int seasonIndex: Optionally specify the season that has changed.  Specify None to remove every season.
+        '''
+        with self._lock:
+            if seasonIndex is None:
+                self._matrices = {}
+            else:
+                self._matrices.pop(seasonIndex, None)
+
+
+
+    def updateMatches(self, seasonIndex, matches):
+        '''
+        Update the cached matrix of the season with the current values of the specified matches.
+        Matches that no longer exist are removed.
+        The matrix is removed from the cache if a match has a team that is not in the matrix.
+
+        :param int seasonIndex: Specifies the season.
+        :param list matches: Specifies the IDs of the matches that have changed.
+        '''
+        with self._lock:
+            matrix = self._matrices.get(seasonIndex)
+        if matrix is None or len(matches) == 0:
+            return
+
+        cndb = self.database.getConnection()
+        sql = f"SELECT ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE ID IN ({', '.join('?' * len(matches))});"
+        rows = {row[0]: row for row in cndb.execute(sql, tuple(matches))}
+        with self._lock:
+            for matchIndex in matches:
+                row = rows.get(matchIndex)
+                if row is None or row[6] != seasonIndex:
+                    matrix.removeMatch(matchIndex)
+                elif not matrix.setMatch(row):
+                    self._matrices.pop(seasonIndex, None)
+                    return
+
+
+
+    @timed('head to head')
+    def getSummaryTable(self, team1Index, team2Index, finishDate):
+        '''
+        Returns the table of the matches between two teams in every season up to the specified date.
+        The rows have the same layout as :py:func:`~standings.StandingsEngine.getTable`.
+
+        :param int team1Index: Specifies the first team.
+        :param int team2Index: Specifies the second team.
+        :param object finishDate: Specifies the last date to include as a date or 'YYYY-MM-DD' string.
+        '''
+        standings = self.database.standings
+        finishDate = standings._toOrdinal(finishDate)
+        cndb = self.database.getConnection()
+        records = {}
+        for row in cndb.execute('SELECT ID FROM SEASONS ORDER BY ID;').fetchall():
+            matrix = self.getMatrix(row[0])
+            for homeTeam, awayTeam in ((team1Index, team2Index), (team2Index, team1Index)):
+                for matchIndex, theDate, homeFor, awayFor in matrix.getMatches(homeTeam, awayTeam, finishDate):
+                    homeRecord = records.setdefault(homeTeam, [0] * SeasonSnapshots.NUM_TOTALS)
+                    awayRecord = records.setdefault(awayTeam, [0] * SeasonSnapshots.NUM_TOTALS)
+                    if homeFor is None or awayFor is None:
+                        # The match has not been played.
+                        continue
+                    homeRecord[0 if homeFor > awayFor else 1 if homeFor == awayFor else 2] += 1
+                    homeRecord[3] += homeFor
+                    homeRecord[4] += awayFor
+                    awayRecord[5 if awayFor > homeFor else 6 if homeFor == awayFor else 7] += 1
+                    awayRecord[8] += awayFor
+                    awayRecord[9] += homeFor
+        rows = standings._buildRows(records, False, None)
+        rows.sort(key=lambda row: (row[11], row[12], row[13]), reverse=True)
+        return rows
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to build the html pages of the table program.
+This module implements the :py:class:`HtmlBuilder` class.
+
+The static fragments below are shared strings so that the render loops can add them without formatting a new string for each cell.
+'''
+
+# System libraries.
+import copy
+import io
+
+# Application libraries.
+import walton.html
+
+
+
+# The cell fragments of the league tables.
+TD_END = '</td>'
+TD_RIGHT = '<td style="text-align: right;">'
+TD_WIN = '<td class="win" style="text-align: right;">'
+TD_DRAW = '<td class="draw" style="text-align: right;">'
+TD_LOST = '<td class="lost" style="text-align: right;">'
+TD_SECONDARY = '<td class="secondary" style="text-align: right;">'
+TD_PTS = '<td class="pts" style="text-align: right;">'
+
+
+
+class HtmlBuilder(walton.html.Html):
+    '''
+    Class to collect the body of a page as a list of chunks and join them once.
+    The :py:class:`~walton.html.Html` base class still writes the head, the style sheets and the title around the body.
+    The page can be streamed to a file or socket in blocks so that the whole page is never held as a single string.
+
+    :ivar list stylesheets: The style sheets of the page, as the base class.
+    '''
+    # The approximate number of characters in each block written by :py:func:`writeTo`.
+    BLOCK_SIZE = 64 * 1024
+
+    # Marker for the body when the base class writes the head and tail.
+    _BODY_MARKER = '\x00body\x00'
+
+
+
+    def __init__(self):
+        ''' Class constructor for the :py:class:`HtmlBuilder` class. '''
+        walton.html.Html.__init__(self)
+        self._chunks = []
+
+
+
+    def copy(self, stylesheets=None):
+        '''
+        Returns a new :py:class:`HtmlBuilder` with the same page.
+        The new object has its own list of chunks and style sheets so that changes to either object do not change the other.
+
+        :param list stylesheets: Optionally specify the style sheets of the new object.  The default is the style sheets of this object.
+        '''
+        html = copy.copy(self)
+        html._chunks = list(self._chunks)
+        html.stylesheets = list(self.stylesheets if stylesheets is None else stylesheets)
+        return html
+
+
+
+    def clear(self):
+        ''' Remove the body of the page. '''
+        walton.html.Html.clear(self)
+        self._chunks = []
+
+
+
+    def add(self, text):
+        '''
+        Add the specified text to the body of the page.
+
+        :param string text: Specifies the text to add.
+        '''
+        self._chunks.append(text)
+
+
+
+    def addLine(self, text):
+        '''
+        Add the specified text and a new line to the body of the page.
+
+        :param string text: Specifies the text to add.
+        '''
+        self.add(text)
+        self.add('\n')
+
+
+
+    def addFragments(self, *fragments):
+        '''
+        Add several fragments to the body of the page.
+        Use this with the static fragments of this module rather than formatting a string for each cell.
+
+        :param string fragments: Specifies the fragments to add in order.
+        '''
+        self._chunks.extend(fragments)
+
+
+
+    def getBody(self):
+        ''' Returns the body of the page.  The chunks are joined once and kept as a single chunk. '''
+        if len(self._chunks) != 1:
+            self._chunks = [''.join(self._chunks)]
+        return self._chunks[0]
+
+
+
+    def getSize(self):
+        ''' Returns the number of characters in the page without building the page. '''
+        head, tail = self._getHeadTail()
+        return len(head) + sum(len(chunk) for chunk in self._chunks) + len(tail)
+
+
+
+    def toHtml(self):
+        ''' Returns the page as a single string. '''
+        head, tail = self._getHeadTail()
+        return head + self.getBody() + tail
+
+
+
+    def toBytes(self, transform=None, encoding='utf-8'):
+        '''
+        Returns the page as encoded bytes.
+        The page is encoded in blocks so the page is not also held as a single string.
+
+        :param function transform: Optionally specify a function to apply to the text of each block, for example to rewrite the links.  A block always finishes at the end of a line.
+        :param string encoding: Optionally specify the encoding.
+        '''
+        blocks = []
+        for block in self._getBlocks(transform):
+            blocks.append(block.encode(encoding))
+        return b''.join(blocks)
+
+
+
+    def writeTo(self, stream, transform=None, encoding='utf-8'):
+        '''
+        Write the page to the specified file or socket in blocks.
+        Returns the number of characters written.
+
+        :param object stream: Specifies the stream.  Text streams are written with strings, other streams with encoded bytes.
+        :param function transform: Optionally specify a function to apply to the text of each block, for example to rewrite the links.  A block always finishes at the end of a line.
+        :param string encoding: Optionally specify the encoding for binary streams.
+        '''
+        isText = isinstance(stream, io.TextIOBase)
+        size = 0
+        for block in self._getBlocks(transform):
+            stream.write(block if isText else block.encode(encoding))
+            size += len(block)
+        return size
+
+
+
+    def _getHeadTail(self):
+        '''
+        Returns the text that the base class writes before and after the body.
+        The text comes from a separate :py:class:`~walton.html.Html` object so that this object is never changed and can be shared between threads.
+        '''
+        page = walton.html.Html()
+        page.stylesheets = list(self.stylesheets)
+        if hasattr(self, 'title'):
+            page.title = self.title
+        page.add(HtmlBuilder._BODY_MARKER)
+        head, _, tail = page.toHtml().partition(HtmlBuilder._BODY_MARKER)
+        return head, tail
+
+
+
+    def _getBlocks(self, transform):
+        ''' Returns a generator of the page in blocks of about :py:attr:`BLOCK_SIZE` characters that finish at the end of a line. '''
+        head, tail = self._getHeadTail()
+        pending = [head]
+        pendingSize = len(head)
+        carry = ''
+        for chunk in self._chunks + [tail]:
+            pending.append(chunk)
+            pendingSize += len(chunk)
+            if pendingSize < HtmlBuilder.BLOCK_SIZE:
+                continue
+            text = carry + ''.join(pending)
+            pending = []
+            pendingSize = 0
+            # Only break the page at the end of a line so that a link is never split between blocks.
+            index = text.rfind('\n') + 1
+            if index == 0:
+                carry = text
+                continue
+            carry = text[index:]
+            yield text[:index] if transform is None else transform(text[:index])
+        text = carry + ''.join(pending)
+        if text != '':
+            yield text if transform is None else transform(text)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to import fixtures and results into the table database without a display.
+This module implements the :py:class:`MatchImporter` class.
+
+The matches are read from CSV files with a header row or from JSON lines files with one object for each match.
+The fields are season, date, date_guess, home, away, home_score, away_score, home_bonus and away_bonus.
+Only home and away are required.  The teams are the labels from the TEAMS table.
+'''
+
+# System libraries.
+import csv
+import datetime
+import itertools
+import json
+import time
+
+# Application libraries.
+from schema import SchemaManager
+
+
+
+class MatchImporter:
+    '''
+    Class to stream matches from a file into the MATCHES table in large batched transactions.
+    Only one batch of matches is held in memory at a time.
+    In bulk mode the indexes are dropped during the load and built again afterwards, and the writer connection does not wait for the disk.
+
+    :ivar Database database: The :py:class:`~database.Database` to write the matches into.
+    :ivar int batchSize: The number of matches in each transaction.
+    :ivar int numRows: The number of rows read by the last import.
+    :ivar int numImported: The number of matches written by the last import.
+    :ivar int numRejected: The number of rows that could not be imported by the last import.
+    :ivar dict unknownTeams: The number of rows with each unknown team name in the last import.
+    :ivar float elapsedTime: The time taken by the last import in seconds.
+    '''
+    # The date formats accepted for the date field.
+    DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+
+
+
+    def __init__(self, database, batchSize=50000):
+        '''
+        Class constructor for the :py:class:`MatchImporter` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` to write the matches into.
+        :param int batchSize: Optionally specify the number of matches in each transaction.
+        '''
+        self.database = database
+        self.batchSize = batchSize
+        self.numRows = 0
+        self.numImported = 0
+        self.numRejected = 0
+        self.unknownTeams = {}
+        self.elapsedTime = 0
+
+        # The index of team labels to TEAMS ids.
+        self._teams = None
+        # The index of season labels and ids to SEASONS ids.
+        self._seasons = None
+        # The settings of the writer connection before a bulk load.
+        self._journalMode = None
+        self._synchronous = None
+
+
+
+    def getRowsPerSecond(self):
+        ''' Returns the number of rows read per second by the last import. '''
+        if self.elapsedTime <= 0:
+            return 0
+        return self.numRows / self.elapsedTime
+
+
+
+    def importFile(self, filename, seasonIndex=None, isBulk=False):
+        '''
+        Import the matches in the specified file.
+        The stored league tables are rebuilt and the cached results are removed afterwards.
+
+        :param string filename: Specifies the CSV or JSON lines file.  Files ending .json, .jsonl or .ndjson are read as JSON lines.
+        :param int seasonIndex: Optionally specify the season for rows without a season field.
+        :param bool isBulk: Optionally specify True to tune the database for a large load.  A crash during a bulk load can damage the database.
+        '''
+        self.numRows = 0
+        self.numImported = 0
+        self.numRejected = 0
+        self.unknownTeams = {}
+        startTime = time.time()
+        self._loadIndexes()
+        # Only the seasons with new matches are rebuilt afterwards so the other seasons must be current.
+        self.database.standingsTable.ensureCurrent()
+
+        if isBulk:
+            self._startBulkLoad()
+        seasons = set()
+        try:
+            with open(filename, 'r', encoding='utf-8', newline='') as inputFile:
+                if filename.lower().endswith(('.json', '.jsonl', '.ndjson')):
+                    records = (json.loads(line) for line in inputFile if line.strip() != '')
+                else:
+                    records = csv.DictReader(inputFile)
+                matches = (self._toMatch(record, seasonIndex) for record in records)
+                matches = (match for match in matches if match is not None)
+                while True:
+                    batch = list(itertools.islice(matches, self.batchSize))
+                    if len(batch) == 0:
+                        break
+                    self._writeBatch(batch)
+                    seasons.update(match[0] for match in batch)
+        finally:
+            if isBulk:
+                self._finishBulkLoad()
+
+        # Rebuild the stored league tables of the seasons that have new matches.
+        with self.database.writer() as cndb:
+            for season in sorted(seasons):
+                self.database.standingsTable.rebuild(cndb, season)
+            if self.database.standingsTable.isAvailable:
+                self.database.standingsTable.setCurrent(cndb)
+        self.database.invalidateSeason()
+        self.elapsedTime = time.time() - startTime
+
+
+
+    def _loadIndexes(self):
+        ''' Read the team and season names into memory. '''
+        cndb = self.database.getConnection()
+        self._teams = {}
+        for teamIndex, label in cndb.execute('SELECT ID, LABEL FROM TEAMS ORDER BY ID;'):
+            if label is not None:
+                self._teams.setdefault(label.strip().casefold(), teamIndex)
+        self._seasons = {}
+        for seasonIndex, label in cndb.execute('SELECT ID, LABEL FROM SEASONS ORDER BY ID;'):
+            self._seasons[str(seasonIndex)] = seasonIndex
+            if label is not None:
+                self._seasons.setdefault(label.strip().casefold(), seasonIndex)
+
+
+
+    def _toMatch(self, record, seasonIndex):
+        '''
+        Returns the values for the MATCHES table from a row of the input file or None if the row can not be imported.
+        The values are SEASON_ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS.
+        '''
+        self.numRows += 1
+        try:
+            season = record.get('season')
+            if season is not None and str(season).strip() != '':
+                seasonIndex = self._seasons.get(str(season).strip().casefold())
+            homeTeamIndex = self._getTeamIndex(record.get('home'))
+            awayTeamIndex = self._getTeamIndex(record.get('away'))
+            if seasonIndex is None or homeTeamIndex is None or awayTeamIndex is None:
+                self.numRejected += 1
+                return None
+            return (seasonIndex, self._toDate(record.get('date')), 1 if self._toNumber(record.get('date_guess')) else 0, homeTeamIndex, awayTeamIndex, self._toNumber(record.get('home_score')), self._toNumber(record.get('away_score')), self._toNumber(record.get('home_bonus')) or 0, self._toNumber(record.get('away_bonus')) or 0)
+        except (ValueError, TypeError, AttributeError):
+            self.numRejected += 1
+            return None
+
+
+
+    def _getTeamIndex(self, name):
+        ''' Returns the TEAMS id of the specified team name or None if the team is unknown. '''
+        if name is None:
+            return None
+        name = str(name).strip()
+        teamIndex = self._teams.get(name.casefold())
+        if teamIndex is None:
+            self.unknownTeams[name] = self.unknownTeams.get(name, 0) + 1
+        return teamIndex
+
+
+
+    def _toDate(self, value):
+        ''' Returns the 'YYYY-MM-DD' string of the specified date or None for a missing date. '''
+        if value is None or str(value).strip() == '':
+            return None
+        value = str(value).strip()[:10]
+        for dateFormat in MatchImporter.DATE_FORMATS:
+            try:
+                theDate = datetime.datetime.strptime(value, dateFormat).date()
+            except ValueError:
+                continue
+            # strftime does not work for years < 1900, so don't use it.
+            return '{}-{:0=2}-{:0=2}'.format(theDate.year, theDate.month, theDate.day)
+        raise ValueError(f'Unknown date format {value}.')
+
+
+
+    def _toNumber(self, value):
+        ''' Returns the integer value of a field or None for a missing value. '''
+        if value is None or str(value).strip() == '':
+            return None
+        return int(value)
+
+
+
+    def _writeBatch(self, batch):
+        ''' Write a batch of matches as a single transaction. '''
+        sql = 'INSERT INTO MATCHES (SEASON_ID, THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);'
+        with self.database.writer() as cndb:
+            cndb.executemany(sql, [(*match[0:7], match[5], match[6], match[7], match[8]) for match in batch])
+        self.numImported += len(batch)
+
+
+
+    def _startBulkLoad(self):
+        ''' Drop the MATCHES indexes and stop the writer connection waiting for the disk. '''
+        with self.database.writer() as cndb:
+            self._journalMode = cndb.execute('PRAGMA journal_mode;').fetchone()[0]
+            self._synchronous = cndb.execute('PRAGMA synchronous;').fetchone()[0]
+            cndb.execute('PRAGMA synchronous = OFF;')
+            if self._journalMode.lower() != 'wal':
+                cndb.execute('PRAGMA journal_mode = MEMORY;')
+            cndb.execute('PRAGMA cache_size = -65536;')
+            for name in SchemaManager.INDEXES:
+                cndb.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+
+    def _finishBulkLoad(self):
+        ''' Restore the writer connection and build the MATCHES indexes. '''
+        with self.database.writer() as cndb:
+            cndb.execute(f'PRAGMA synchronous = {self._synchronous};')
+            if self._journalMode.lower() != 'wal':
+                cndb.execute(f'PRAGMA journal_mode = {self._journalMode};')
+            cndb.execute('PRAGMA cache_size = -2000;')
+        self.database.schema.ensureIndexes()
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to measure where the time goes when a page is rendered by the table program.
+This module implements the :py:class:`Instrumentation` class.
+
+Each query through an :py:class:`InstrumentedConnection` and each function decorated with :py:func:`timed` is added to the :py:class:`PageProfile` of the page being rendered on the current thread.
+Nothing is recorded when no page is being profiled on the thread.
+'''
+
+# System libraries.
+import collections
+import contextlib
+import functools
+import html
+import logging
+import logging.handlers
+import threading
+import time
+
+# Require the Sqlite3 library.
+try:
+    import sqlite3
+except:
+    print('pysqlite is not available ({})'.format(__name__));
+
+
+
+# The profile of the page being rendered on each thread.
+_current = threading.local()
+
+
+
+def _getProfile():
+    ''' Returns the :py:class:`PageProfile` of the page being rendered on the current thread or None. '''
+    return getattr(_current, 'profile', None)
+
+
+
+@contextlib.contextmanager
+def phase(name):
+    '''
+    Context manager to add the time in the block to the named phase of the current page.
+    The time in nested phases and queries is only added to the innermost phase.
+
+    :param string name: Specifies the name of the phase.
+    '''
+    profile = _getProfile()
+    if profile is None:
+        yield
+        return
+    profile.startPhase(name)
+    try:
+        yield
+    finally:
+        profile.finishPhase()
+
+
+
+def timed(name):
+    '''
+    Decorator to add the time in a function to the named phase of the current page.
+
+    :param string name: Specifies the name of the phase.
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _getProfile()
+            if profile is None:
+                return function(*args, **kwargs)
+            profile.startPhase(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.finishPhase()
+        return wrapper
+    return decorator
+
+
+
+class QueryRecord:
+    '''
+    Class to hold the measurements of a single query.
+
+    :ivar string sql: The SQL text of the query.
+    :ivar object params: The parameters of the query.
+    :ivar int numRows: The number of rows fetched from the query.
+    :ivar float seconds: The time to execute the query and fetch the rows.
+    '''
+
+
+
+    def __init__(self, sql, params):
+        ''' Class constructor for the :py:class:`QueryRecord` class. '''
+        self.sql = sql
+        self.params = params
+        self.numRows = 0
+        self.seconds = 0
+
+
+
+class PageProfile:
+    '''
+    Class to hold the measurements of a single page.
+    The time of each phase excludes the time in the nested phases and queries so the phases, the database time and the render time add up to the total time.
+
+    :ivar string request: The request of the page.
+    :ivar dict parameters: The parameters of the page.
+    :ivar list queries: The :py:class:`QueryRecord` of each query.
+    :ivar dict phases: The time in seconds of each phase.
+    :ivar float databaseSeconds: The time in the queries.
+    :ivar float totalSeconds: The time to produce the page.
+    :ivar int htmlBytes: The size of the page.
+    :ivar bool isCached: True if the page came from the :py:class:`~page_cache.PageCache`.
+    '''
+
+
+
+    def __init__(self, request, parameters):
+        ''' Class constructor for the :py:class:`PageProfile` class. '''
+        self.request = request
+        self.parameters = dict(parameters)
+        self.queries = []
+        self.phases = collections.OrderedDict()
+        self.databaseSeconds = 0
+        self.totalSeconds = 0
+        self.htmlBytes = 0
+        self.isCached = False
+
+        # The start time and the time in the children of each open phase.  The first item is the page.
+        self._stack = [['render', time.perf_counter(), 0]]
+
+
+
+    def startPhase(self, name):
+        ''' Start a phase inside the current phase. '''
+        self._stack.append([name, time.perf_counter(), 0])
+
+
+
+    def finishPhase(self):
+        ''' Finish the current phase. '''
+        name, startTime, childSeconds = self._stack.pop()
+        seconds = time.perf_counter() - startTime
+        self.phases[name] = self.phases.get(name, 0) + seconds - childSeconds
+        self._stack[-1][2] += seconds
+
+
+
+    def addQueryTime(self, record, seconds):
+        ''' Add time to a query.  The time is removed from the current phase. '''
+        record.seconds += seconds
+        self.databaseSeconds += seconds
+        self._stack[-1][2] += seconds
+
+
+
+    def finish(self, htmlBytes):
+        ''' Finish the page.  The time not in a phase or a query is the render time. '''
+        while len(self._stack) > 1:
+            self.finishPhase()
+        name, startTime, childSeconds = self._stack[0]
+        self.totalSeconds = time.perf_counter() - startTime
+        self.phases[name] = self.phases.get(name, 0) + self.totalSeconds - childSeconds
+        self.phases.move_to_end(name)
+        self.htmlBytes = htmlBytes
+
+
+
+    def toLogLine(self):
+        ''' Returns a single line summary of the page for the log file. '''
+        phases = ' '.join(f'{name}={1000 * seconds:.1f}ms' for name, seconds in self.phases.items())
+        return f'{self.request} {self.parameters} cached={self.isCached} queries={len(self.queries)} db={1000 * self.databaseSeconds:.1f}ms total={1000 * self.totalSeconds:.1f}ms bytes={self.htmlBytes} {phases}'
+
+
+
+    def toHtml(self, maxQueries=50):
+        '''
+        Returns a collapsible html panel of the measurements.
+
+        :param int maxQueries: Optionally specify the number of the slowest queries to list.
+        '''
+        lines = ['<details class="debug" style="font-size: small;">']
+        lines.append(f'<summary>{self.request} {1000 * self.totalSeconds:.1f}ms, {len(self.queries)} queries {1000 * self.databaseSeconds:.1f}ms, {self.htmlBytes} bytes{" (cached)" if self.isCached else ""}</summary>')
+        lines.append('<table>')
+        for name, seconds in self.phases.items():
+            lines.append(f'<tr><td>{html.escape(name)}</td><td style="text-align: right;">{1000 * seconds:.2f}ms</td></tr>')
+        lines.append(f'<tr><td>database</td><td style="text-align: right;">{1000 * self.databaseSeconds:.2f}ms</td></tr>')
+        lines.append('</table>')
+        lines.append('<table>')
+        for record in sorted(self.queries, key=lambda record: record.seconds, reverse=True)[:maxQueries]:
+            lines.append(f'<tr><td style="text-align: right;">{1000 * record.seconds:.2f}ms</td><td style="text-align: right;">{record.numRows}</td><td>{html.escape(record.sql)} {html.escape(repr(record.params))}</td></tr>')
+        lines.append('</table>')
+        lines.append('</details>')
+        return '\n'.join(lines)
+
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    ''' Class to count the rows and time of a query for the :py:class:`PageProfile` of the current page. '''
+    # The query record.  None when the query is not being measured.
+    record = None
+    # The profile of the query record.
+    profile = None
+
+
+
+    def __next__(self):
+        if self.record is None:
+            return super().__next__()
+        startTime = time.perf_counter()
+        try:
+            row = super().__next__()
+        finally:
+            self.profile.addQueryTime(self.record, time.perf_counter() - startTime)
+        self.record.numRows += 1
+        return row
+
+
+
+    def fetchone(self):
+        if self.record is None:
+            return super().fetchone()
+        startTime = time.perf_counter()
+        row = super().fetchone()
+        self.profile.addQueryTime(self.record, time.perf_counter() - startTime)
+        if row is not None:
+            self.record.numRows += 1
+        return row
+
+
+
+    def fetchmany(self, *args):
+        if self.record is None:
+            return super().fetchmany(*args)
+        startTime = time.perf_counter()
+        rows = super().fetchmany(*args)
+        self.profile.addQueryTime(self.record, time.perf_counter() - startTime)
+        self.record.numRows += len(rows)
+        return rows
+
+
+
+    def fetchall(self):
+        if self.record is None:
+            return super().fetchall()
+        startTime = time.perf_counter()
+        rows = super().fetchall()
+        self.profile.addQueryTime(self.record, time.perf_counter() - startTime)
+        self.record.numRows += len(rows)
+        return rows
+
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    '''
+    Class to measure the queries on a connection for the :py:class:`PageProfile` of the current page.
+    Pass as the factory to sqlite3.connect().
+    '''
+
+
+
+    def execute(self, sql, params=()):
+        profile = _getProfile()
+        if profile is None:
+            return super().execute(sql, params)
+        cursor = self.cursor(InstrumentedCursor)
+        cursor.profile = profile
+        cursor.record = QueryRecord(sql, params)
+        profile.queries.append(cursor.record)
+        startTime = time.perf_counter()
+        try:
+            cursor.execute(sql, params)
+        finally:
+            profile.addQueryTime(cursor.record, time.perf_counter() - startTime)
+        return cursor
+
+
+
+    def executemany(self, sql, params):
+        profile = _getProfile()
+        if profile is None:
+            return super().executemany(sql, params)
+        record = QueryRecord(sql, '(many)')
+        profile.queries.append(record)
+        startTime = time.perf_counter()
+        try:
+            return super().executemany(sql, params)
+        finally:
+            profile.addQueryTime(record, time.perf_counter() - startTime)
+
+
+
+class Instrumentation:
+    '''
+    Class to profile the pages rendered by the table program.
+    The profiles of the recent pages are kept in memory and a summary of each page is written to a rolling log file.
+
+    :ivar bool isEnabled: True to profile the pages.
+    :ivar string logFilename: The log file or None for no log file.
+    :ivar collections.deque recent: The :py:class:`PageProfile` of the recent pages.
+    '''
+    # The size of each log file before it is rolled over.
+    LOG_BYTES = 1024 * 1024
+
+    # The number of old log files to keep.
+    LOG_BACKUPS = 3
+
+
+
+    def __init__(self, isEnabled=False, logFilename=None, numRecent=50):
+        '''
+        Class constructor for the :py:class:`Instrumentation` class.
+
+        :param bool isEnabled: Optionally specify True to profile the pages.
+        :param string logFilename: Optionally specify the rolling log file.
+        :param int numRecent: Optionally specify the number of recent profiles to keep in memory.
+        '''
+        self.isEnabled = isEnabled
+        self.logFilename = logFilename
+        self.recent = collections.deque(maxlen=numRecent)
+
+        # The logger is opened on the first page.
+        self._logger = None
+        # Lock to protect the recent profiles and the logger.
+        self._lock = threading.Lock()
+
+
+
+    def startPage(self, request, parameters):
+        '''
+        Start profiling a page on the current thread.
+        Returns the :py:class:`PageProfile` or None when the instrumentation is not enabled.
+
+        :param string request: Specifies the request of the page.
+        :param dict parameters: Specifies the parameters of the page.
+        '''
+        if not self.isEnabled:
+            _current.profile = None
+            return None
+        _current.profile = PageProfile(request, parameters)
+        return _current.profile
+
+
+
+    def finishPage(self, htmlBytes):
+        '''
+        Finish profiling the page on the current thread.
+        Returns the :py:class:`PageProfile` or None when no page was being profiled.
+
+        :param int htmlBytes: Specifies the size of the page.
+        '''
+        profile = _getProfile()
+        _current.profile = None
+        if profile is None:
+            return None
+        profile.finish(htmlBytes)
+
+        with self._lock:
+            self.recent.append(profile)
+            logger = self._getLogger()
+            if logger is not None:
+                logger.info(profile.toLogLine())
+        return profile
+
+
+
+    def _getLogger(self):
+        ''' Returns the logger for the rolling log file or None for no log file. '''
+        if self._logger is None and self.logFilename is not None:
+            try:
+                handler = logging.handlers.RotatingFileHandler(self.logFilename, maxBytes=Instrumentation.LOG_BYTES, backupCount=Instrumentation.LOG_BACKUPS)
+            except OSError as error:
+                print(f'Profile log {self.logFilename} is not available ({error}).')
+                self.logFilename = None
+                return None
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger = logging.getLogger(f'{__name__}.{id(self)}')
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.addHandler(handler)
+        return self._logger
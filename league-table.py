@@ -10,6 +10,9 @@ import sys
 import os
 import argparse
 
+# Import the start up profile before the other application libraries to time their imports.
+import startup
+
 # Import application libraries.
 import walton.install
 import walton.ansi
@@ -22,8 +25,21 @@ if __name__ == '__main__':
     argParse = argparse.ArgumentParser(prog='league-table', description='League tables in various sports.')
     argParse.add_argument('-i', '--install', help='Install the modelling program and desktop link.', action='store_true')
     argParse.add_argument('-u', '--uninstall', help='Uninstall the modelling program.', action='store_true')
+    argParse.add_argument('-e', '--export', help='Export the pages as static html to the specified folder without a display.', metavar='FOLDER')
+    argParse.add_argument('-r', '--rebuild', help='Export every page, not just the pages that have changed.', action='store_true')
+    argParse.add_argument('-s', '--server', help='Serve the pages over http on the specified port without a display.', metavar='PORT', type=int)
+    argParse.add_argument('-d', '--database', help='Use the specified database file rather than the file in the configuration.', metavar='FILE')
+    argParse.add_argument('--host', help='The address for the server to listen on.  The default is every address.', default='')
+    argParse.add_argument('--import', help='Import the matches from the specified CSV or JSON lines file without a display.', metavar='FILE', dest='importFile')
+    argParse.add_argument('--season', help='The season for imported matches without a season field.', type=int)
+    argParse.add_argument('--bulk', help='Tune the database for a large import.  Build the indexes after the load.', action='store_true')
+    argParse.add_argument('-c', '--check', help='Check the stored league tables against the matches and rebuild any that are different.', action='store_true')
+    argParse.add_argument('--profile-startup', help='Report the time of the imports and each step until the first page is shown.', action='store_true', dest='profileStartup')
     args = argParse.parse_args()
 
+    if args.profileStartup:
+        startup.profile.enable()
+
     if args.install:
         # Install the program.
 
@@ -61,21 +77,39 @@ if __name__ == '__main__':
 
 # Import more system libraries.
 import platform
-import subprocess
 
 # import urllib
 
 # Application libraries.
 from application import Application
+startup.profile.mark('application imports')
 
 
 
 def isGraphicsAvailable():
-    ''' Returns true if the graphical display is available. '''
-    with subprocess.Popen(["xset", "-q"], stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
-        process.communicate()
-        return process.returncode == 0
-    return False
+    '''
+    Returns true if the graphical display is available.
+    This looks for the socket of the Wayland or local X display rather than running a program.
+    A remote X display is assumed to be available.
+    '''
+    # A Wayland display.
+    waylandDisplay = os.environ.get('WAYLAND_DISPLAY')
+    if waylandDisplay:
+        if os.path.isabs(waylandDisplay):
+            return os.path.exists(waylandDisplay)
+        runtimeFolder = os.environ.get('XDG_RUNTIME_DIR')
+        if runtimeFolder and os.path.exists(os.path.join(runtimeFolder, waylandDisplay)):
+            return True
+
+    # An X display.  The display is [host]:number[.screen].
+    display = os.environ.get('DISPLAY')
+    if not display:
+        return False
+    host, _, number = display.rpartition(':')
+    if host not in ('', 'unix'):
+        return True
+    number = number.partition('.')[0]
+    return os.path.exists(f'/tmp/.X11-unix/X{number}')
 
 
 
@@ -85,11 +119,52 @@ if __name__ == '__main__':
 
     # Create an application object to be shared by rendering engines.
     application = Application(args)
-
-    if isGraphicsAvailable():
+    startup.profile.mark('application')
+    if application.debug:
+        for sql, plan in application.database.schema.getFullScans():
+            print(f'{walton.ansi.LIGHT_YELLOW}Full scan{walton.ansi.RESET_ALL} {plan} {sql}')
+
+    if args.importFile is not None:
+        # Load the matches from a file.
+        from importer import MatchImporter
+        importer = MatchImporter(application.database)
+        importer.importFile(args.importFile, args.season, args.bulk)
+        for name, count in sorted(importer.unknownTeams.items()):
+            print(f'{walton.ansi.LIGHT_YELLOW}Unknown team{walton.ansi.RESET_ALL} {name} in {count} rows.')
+        print(f'Imported {importer.numImported} of {importer.numRows} rows from {walton.ansi.LIGHT_YELLOW}{args.importFile}{walton.ansi.RESET_ALL} in {importer.elapsedTime:.1f}s ({importer.getRowsPerSecond():.0f} rows/s).  {importer.numRejected} rows were rejected.')
+    elif args.check:
+        # Compare the stored league tables with tables calculated from the matches.
+        differences = application.database.standingsTable.check()
+        for seasonIndex, teamIndex, expected, stored in differences:
+            print(f'{walton.ansi.LIGHT_YELLOW}Season {seasonIndex} team {teamIndex}{walton.ansi.RESET_ALL} expected {expected} stored {stored}.')
+        if len(differences) > 0:
+            with application.database.writer() as cndb:
+                for seasonIndex in sorted(set(difference[0] for difference in differences)):
+                    application.database.standingsTable.rebuild(cndb, seasonIndex)
+                application.database.standingsTable.setCurrent(cndb)
+            application.database.invalidateSeason()
+        print(f'Found {len(differences)} differences in the stored league tables.')
+    elif args.export is not None:
+        # Write the pages to static html files.
+        from export import SiteExporter
+        exporter = SiteExporter(application, args, args.export)
+        exporter.export(args.rebuild)
+        print(f'Exported {exporter.numRendered} pages to {walton.ansi.LIGHT_YELLOW}{args.export}{walton.ansi.RESET_ALL}.  {exporter.numSkipped} pages were unchanged.')
+    elif args.server is not None:
+        # Serve the pages over http.
+        from server import PageServer
+        server = PageServer(application, args.host, args.server)
+        startup.profile.mark('server')
+        startup.profile.report()
+        server.run()
+        print(f'Served {server.requestCount} requests.')
+    elif isGraphicsAvailable():
         # Run via a GTK main window.
+        # The GTK and WebKit2 libraries are only imported when there is a display.
         import glade.main_window
+        startup.profile.mark('gui imports')
         mainWindow = glade.main_window.MainWindow(application, args)
+        startup.profile.mark('main window')
         # application.post_render_page = mainWindow.DisplayCurrentPage
         # application.actions = mainWindow.actions
         # Main GTK loop.
@@ -102,6 +177,17 @@ if __name__ == '__main__':
     else:
         print('Error - Graphics are not available.')
 
+    # Report the start up if the first page was never shown.
+    startup.profile.report()
+
+    # Close the shared connections to the database.
+    if application.debug:
+        print(f'Database connections {application.database.getConnectionStatistics()}.')
+        print(f'Page cache {application.database.pageCache.getStatistics()}.')
+        print(f'Registry {application.database.registry.getStatistics()}.')
+        print(f'Match store {application.database.matchStore.getStatistics()}.')
+    application.database.close()
+
 
     print(f'Goodbye from the {walton.ansi.LIGHT_YELLOW}League Table{walton.ansi.RESET_ALL} database.')
 
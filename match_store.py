@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to hold the MATCHES table as columns in a memory mapped file for the table program.
+This module implements the :py:class:`MatchStore` class.
+'''
+
+# System libraries.
+import datetime
+import json
+import os
+import sys
+import threading
+
+# Optionally use the numpy library.
+try:
+    import numpy
+except:
+    numpy = None
+    print('numpy is not available, using the slower python match columns ({})'.format(__name__))
+
+# Application libraries.
+from standings import MatchColumns
+
+
+
+class MatchStore:
+    '''
+    Class to hold every match with both teams as numpy columns.
+    The columns are written to a file next to the database file and memory mapped, so a later launch or another process reuses them without reading the MATCHES table.
+    The file is built again when the database file has changed since it was written, after :py:func:`invalidate` and when :py:func:`checkVersion` finds a change from another program.
+    The matches are sorted by season and ID so that a season is a slice of every column.
+    Missing dates are stored as :py:attr:`~standings.MatchColumns.NO_DATE` and missing goals as -1.
+
+    The store is only enabled when numpy is available.  Without numpy the callers read the MATCHES table as before.
+
+    :ivar Database database: The :py:class:`~database.Database` that owns the connections.
+    :ivar bool isEnabled: True when the store can be used.
+    :ivar string filename: The filename of the columns file.
+    :ivar bool isPersisted: True when the columns are memory mapped from the file rather than held in memory.
+    :ivar int buildCount: The number of times the columns have been built from the MATCHES table.
+    :ivar int loadCount: The number of times the columns have been mapped from an existing file.
+    '''
+    # The name and type of each column.  The types are native so that memoryview can index the columns.
+    COLUMNS = (
+        ('ids',         'i'),
+        ('seasons',     'i'),
+        ('dates',       'i'),
+        ('homeTeams',   'i'),
+        ('awayTeams',   'i'),
+        ('homeFor',     'h'),
+        ('awayFor',     'h'),
+        ('realHomeFor', 'h'),
+        ('realAwayFor', 'h'),
+        ('homeBonus',   'h'),
+        ('awayBonus',   'h'),
+    )
+
+    # The version of the file layout.
+    VERSION = 1
+
+    # The size of the header at the start of the file.
+    HEADER_SIZE = 4096
+
+    # The alignment of each column in the file.
+    ALIGNMENT = 64
+
+
+
+    def __init__(self, database, isEnabled=True):
+        '''
+        Class constructor for the :py:class:`MatchStore` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` that owns the connections.
+        :param bool isEnabled: Optionally specify False to never use the store.
+        '''
+        self.database = database
+        self.isEnabled = isEnabled and numpy is not None
+        self.filename = f'{database.filename}.columns'
+        self.isPersisted = False
+        self.buildCount = 0
+        self.loadCount = 0
+
+        # The columns as numpy arrays or None when they need to be built.
+        self._arrays = None
+        # The first and last position of each season in the columns.
+        self._seasonRanges = {}
+        # The data version when the columns were built.
+        self._dataVersion = None
+        # Lock to protect the columns.
+        self._lock = threading.Lock()
+
+
+
+    def invalidate(self):
+        ''' Build the columns again on the next request.  Call this after the matches have been changed. '''
+        with self._lock:
+            self._arrays = None
+            self._seasonRanges = {}
+
+
+
+    def checkVersion(self):
+        '''
+        Build the columns again on the next request if another program has changed the database since the last check.
+        The changes written by this program are not included, these invalidate the changed seasons themselves.
+        This is a single pragma so call it before each page.
+        Returns True if the database has changed.
+        '''
+        if not self.isEnabled:
+            return False
+        dataVersion = self.database.connections.getDataVersion()
+        with self._lock:
+            lastVersion = self._dataVersion
+            self._dataVersion = dataVersion
+        if lastVersion is None or lastVersion == dataVersion:
+            return False
+        self.invalidate()
+        return True
+
+
+
+    def getColumns(self, seasonIndex=None):
+        '''
+        Returns a :py:class:`~standings.MatchColumns` of the specified season.
+        The columns are memoryview slices of the store so nothing is copied and the values are python integers.
+        The columns also have the ids, realHomeFor and realAwayFor of each match.
+        The columns can not be appended to.
+
+        :param int seasonIndex: Optionally specify the season.  Specify None for the matches from every season.
+        '''
+        arrays, seasonRanges = self._getArrays()
+        if seasonIndex is None:
+            start, finish = 0, len(arrays['ids'])
+        else:
+            start, finish = seasonRanges.get(seasonIndex, (0, 0))
+        columns = MatchColumns()
+        for name, typeCode in MatchStore.COLUMNS:
+            setattr(columns, name, memoryview(arrays[name][start:finish]))
+        return columns
+
+
+
+    def getResultTypes(self, teamIndex, startDate, finishDate, minScore, maxScore):
+        '''
+        Returns a dictionary of the number of matches with each goal difference for the specified team between the specified dates.
+        The goal differences outside the range are counted at the ends of the range.
+
+        :param int teamIndex: Specifies the team.
+        :param object startDate: Specifies the first date to include as a date or 'YYYY-MM-DD' string.
+        :param object finishDate: Specifies the last date to include as a date or 'YYYY-MM-DD' string.
+        :param int minScore: Specifies the lowest goal difference.
+        :param int maxScore: Specifies the highest goal difference.
+        '''
+        arrays, seasonRanges = self._getArrays()
+        dates = arrays['dates']
+        isInRange = (dates >= self.toOrdinal(startDate)) & (dates <= self.toOrdinal(finishDate))
+        homeFor = arrays['homeFor'].astype(numpy.int64)
+        awayFor = arrays['awayFor'].astype(numpy.int64)
+        differences = numpy.concatenate(((homeFor - awayFor)[isInRange & (arrays['homeTeams'] == teamIndex)], (awayFor - homeFor)[isInRange & (arrays['awayTeams'] == teamIndex)]))
+        counts = numpy.bincount(numpy.clip(differences, minScore, maxScore) - minScore, minlength=maxScore - minScore + 1)
+        return {minScore + offset: int(count) for offset, count in enumerate(counts)}
+
+
+
+    def getStatistics(self):
+        ''' Returns a dictionary of the store counters. '''
+        with self._lock:
+            return {
+                'enabled'   : self.isEnabled,
+                'matches'   : 0 if self._arrays is None else len(self._arrays['ids']),
+                'persisted' : self.isPersisted,
+                'builds'    : self.buildCount,
+                'loads'     : self.loadCount,
+            }
+
+
+
+    def toOrdinal(self, theDate):
+        ''' Returns the day ordinal of the specified date or 'YYYY-MM-DD' string. '''
+        if isinstance(theDate, datetime.date):
+            return theDate.toordinal()
+        return datetime.date.fromisoformat(str(theDate)[:10]).toordinal()
+
+
+
+    def _getArrays(self):
+        ''' Returns the columns and the season ranges.  The columns are mapped from the file or built if they are out of date. '''
+        with self._lock:
+            if self._arrays is not None:
+                return self._arrays, self._seasonRanges
+
+        # The data version from before the build so that the first check does not build again.  A change during the build is found by the next check.
+        dataVersion = self.database.connections.getDataVersion()
+        with self._lock:
+            if self._arrays is None:
+                fingerprint = self._getFingerprint()
+                arrays = self._loadFile(fingerprint)
+                if arrays is None:
+                    arrays = self._build(fingerprint)
+                self._arrays = arrays
+                self._seasonRanges = self._findSeasons(arrays['seasons'])
+                if self._dataVersion is None:
+                    self._dataVersion = dataVersion
+            return self._arrays, self._seasonRanges
+
+
+
+    def _getFingerprint(self):
+        '''
+        Returns a list that changes when the database file changes.
+        This is the time and size of the database file and the size and header of the write ahead log, which has new salts each time the log restarts.
+        '''
+        fingerprint = []
+        try:
+            status = os.stat(self.database.filename)
+            fingerprint.extend((status.st_mtime_ns, status.st_size))
+        except OSError:
+            fingerprint.extend((None, None))
+        try:
+            with open(f'{self.database.filename}-wal', 'rb') as fileInput:
+                header = fileInput.read(32)
+                fileInput.seek(0, os.SEEK_END)
+                fingerprint.extend((fileInput.tell(), header.hex()))
+        except OSError:
+            fingerprint.extend((None, None))
+        return fingerprint
+
+
+
+    def _loadFile(self, fingerprint):
+        ''' Returns the columns mapped from the file or None if the file is missing or out of date. '''
+        try:
+            with open(self.filename, 'rb') as fileInput:
+                header = json.loads(fileInput.read(MatchStore.HEADER_SIZE))
+        except (OSError, ValueError):
+            return None
+        if header.get('version') != MatchStore.VERSION or header.get('byteorder') != sys.byteorder or header.get('fingerprint') != fingerprint:
+            return None
+
+        mapped = numpy.memmap(self.filename, dtype=numpy.uint8, mode='r')
+        numRows = header['rows']
+        arrays = {}
+        for name, typeCode, offset in header['columns']:
+            arrays[name] = mapped[offset:offset + numRows * numpy.dtype(typeCode).itemsize].view(typeCode)
+        self.isPersisted = True
+        self.loadCount += 1
+        return arrays
+
+
+
+    def _build(self, fingerprint):
+        ''' Returns the columns read from the MATCHES table.  The columns are written to the file and mapped if possible. '''
+        cndb = self.database.getConnection()
+        sql = "SELECT ID, SEASON_ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, IFNULL(HOME_TEAM_FOR, -1), IFNULL(AWAY_TEAM_FOR, -1), IFNULL(REAL_HOME_TEAM_FOR, -1), IFNULL(REAL_AWAY_TEAM_FOR, -1), IFNULL(HOME_BONUS_PTS, 0), IFNULL(AWAY_BONUS_PTS, 0) FROM MATCHES WHERE SEASON_ID IS NOT NULL AND HOME_TEAM_ID IS NOT NULL AND AWAY_TEAM_ID IS NOT NULL ORDER BY SEASON_ID, ID;"
+        rows = cndb.execute(sql).fetchall()
+        self.buildCount += 1
+
+        # The dates repeat so each distinct date is only converted once.
+        ordinals = {None: MatchColumns.NO_DATE}
+        values = list(zip(*rows)) if len(rows) > 0 else [()] * len(MatchStore.COLUMNS)
+        arrays = {}
+        for (name, typeCode), column in zip(MatchStore.COLUMNS, values):
+            if name == 'dates':
+                for theDate in set(column):
+                    if theDate not in ordinals:
+                        ordinals[theDate] = datetime.date.fromisoformat(theDate[:10]).toordinal()
+                column = [ordinals[theDate] for theDate in column]
+            arrays[name] = numpy.array(column, dtype=typeCode)
+
+        # Write the file and map it.  Without a writable folder the columns stay in memory.
+        try:
+            self._writeFile(arrays, fingerprint)
+        except OSError:
+            self.isPersisted = False
+            return arrays
+        return self._loadFile(fingerprint) or arrays
+
+
+
+    def _writeFile(self, arrays, fingerprint):
+        ''' Write the columns to the file.  The file is replaced in a single step so that other processes never map part of a file. '''
+        numRows = len(arrays['ids'])
+        columns = []
+        offset = MatchStore.HEADER_SIZE
+        for name, typeCode in MatchStore.COLUMNS:
+            columns.append((name, typeCode, offset))
+            offset += numRows * numpy.dtype(typeCode).itemsize
+            offset += -offset % MatchStore.ALIGNMENT
+        header = json.dumps({'version': MatchStore.VERSION, 'byteorder': sys.byteorder, 'fingerprint': fingerprint, 'rows': numRows, 'columns': columns}).encode('utf-8')
+        if len(header) > MatchStore.HEADER_SIZE:
+            raise OSError('The header of the match columns is too large.')
+
+        temporaryFilename = f'{self.filename}.{os.getpid()}.{threading.get_ident()}'
+        try:
+            with open(temporaryFilename, 'wb') as fileOutput:
+                fileOutput.write(header.ljust(MatchStore.HEADER_SIZE))
+                for name, typeCode, offset in columns:
+                    fileOutput.seek(offset)
+                    fileOutput.write(arrays[name].tobytes())
+            os.replace(temporaryFilename, self.filename)
+        except OSError:
+            if os.path.exists(temporaryFilename):
+                os.remove(temporaryFilename)
+            raise
+
+
+
+    def _findSeasons(self, seasons):
+        ''' Returns a dictionary of the first and last position of each season in the sorted season column. '''
+        seasonIndexes, starts = numpy.unique(seasons, return_index=True)
+        finishes = numpy.append(starts[1:], len(seasons))
+        return {int(seasonIndex): (int(start), int(finish)) for seasonIndex, start, finish in zip(seasonIndexes, starts, finishes)}
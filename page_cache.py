@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to cache the rendered pages for the table program.
+This module implements the :py:class:`PageCache` class.
+'''
+
+# System libraries.
+import collections
+import threading
+
+
+
+class CachedPage:
+    '''
+    Class to hold a rendered page and the toolbar state that went with it.
+
+    :ivar object html: The :py:class:`~walton.html.Html` object of the page.
+    :ivar dict state: The toolbar attributes of the :py:class:`~render.Render` object after the page was rendered.
+    :ivar int seasonIndex: The season that the page depends on or None if the page depends on every season.
+    :ivar string request: The request that rendered the page.
+    :ivar int size: The approximate size of the page in bytes.
+    :ivar bool isPrefetched: True if the page was rendered speculatively and has not been requested yet.
+    '''
+
+
+
+    def __init__(self, html, state, seasonIndex, request, size, isPrefetched=False):
+        ''' Class constructor for the :py:class:`CachedPage` class. '''
+        self.html = html
+        self.state = state
+        self.seasonIndex = seasonIndex
+        self.request = request
+        self.size = size
+        self.isPrefetched = isPrefetched
+
+
+
+class PageCache:
+    '''
+    Class to hold the most recently used rendered pages within a memory budget.
+    The pages are keyed by the request, the parameters and the display configuration.
+    Pages are removed when the matches in their season change.
+
+    :ivar int maxBytes: The memory budget for the pages.
+    :ivar int totalBytes: The approximate size of the pages in the cache.
+    :ivar int hitCount: The number of requests that were found in the cache.
+    :ivar int missCount: The number of requests that were not in the cache.
+    :ivar int evictionCount: The number of pages removed to stay within the memory budget.
+    :ivar int prefetchCount: The number of pages added speculatively by the :py:class:`~prefetch.Prefetcher`.
+    :ivar int prefetchHitCount: The number of speculative pages that were requested.
+    :ivar int prefetchWasteCount: The number of speculative pages removed before they were requested.
+    '''
+
+
+
+    def __init__(self, maxBytes=32 * 1024 * 1024):
+        '''
+        Class constructor for the :py:class:`PageCache` class.
+
+        :param int maxBytes: Optionally specify the memory budget for the pages.
+        '''
+        # The memory budget for the pages.
+        self.maxBytes = maxBytes
+        # The approximate size of the pages in the cache.
+        self.totalBytes = 0
+        # The number of requests that were found in the cache.
+        self.hitCount = 0
+        # The number of requests that were not in the cache.
+        self.missCount = 0
+        # The number of pages removed to stay within the memory budget.
+        self.evictionCount = 0
+        # The number of pages added speculatively.
+        self.prefetchCount = 0
+        # The number of speculative pages that were requested.
+        self.prefetchHitCount = 0
+        # The number of speculative pages removed before they were requested.
+        self.prefetchWasteCount = 0
+
+        # The pages with the most recently used last.
+        self._pages = collections.OrderedDict()
+        # Lock to protect the pages.
+        self._lock = threading.Lock()
+
+
+
+    def get(self, key):
+        '''
+        Returns the :py:class:`CachedPage` for the specified key or None if the page is not in the cache.
+
+        :param tuple key: Specifies the key of the page.
+        '''
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.missCount += 1
+            else:
+                self.hitCount += 1
+                self._pages.move_to_end(key)
+                if page.isPrefetched:
+                    page.isPrefetched = False
+                    self.prefetchHitCount += 1
+            return page
+
+
+
+    def isCached(self, key):
+        '''
+        Returns True if the specified key is in the cache.
+        This does not count as a request or change the order of the pages.
+
+        :param tuple key: Specifies the key of the page.
+        '''
+        with self._lock:
+            return key in self._pages
+
+
+
+    def put(self, key, page):
+        '''
+        Add a page to the cache.
+        The least recently used pages are removed to stay within the memory budget.
+        Speculative pages are added as the least recently used page so that they never remove a page that has been requested.
+
+        :param tuple key: Specifies the key of the page.
+        :param CachedPage page: Specifies the page.
+        '''
+        if page.size > self.maxBytes:
+            return
+        with self._lock:
+            if key in self._pages:
+                self.totalBytes -= self._pages.pop(key).size
+            self._pages[key] = page
+            self.totalBytes += page.size
+            if page.isPrefetched:
+                self._pages.move_to_end(key, last=False)
+                self.prefetchCount += 1
+            while self.totalBytes > self.maxBytes:
+                oldKey, oldPage = self._pages.popitem(last=False)
+                self.totalBytes -= oldPage.size
+                self.evictionCount += 1
+                if oldPage.isPrefetched:
+                    self.prefetchWasteCount += 1
+
+
+
+    def invalidate(self, seasonIndex=None, request=None):
+        '''
+        Remove the pages that depend on the specified season or request.
+
+        :param int seasonIndex: Optionally specify the season that has changed.  Pages that depend on every season are also removed.  Specify None to remove every page.
+        :param string request: Optionally specify to only remove the pages of this request.
+        '''
+        with self._lock:
+            for key, page in list(self._pages.items()):
+                if request is not None and page.request != request:
+                    continue
+                if seasonIndex is None or page.seasonIndex is None or page.seasonIndex == seasonIndex:
+                    self.totalBytes -= page.size
+                    del self._pages[key]
+
+
+
+    def getStatistics(self):
+        ''' Returns a dictionary of the cache counters. '''
+        with self._lock:
+            return {
+                'pages'             : len(self._pages),
+                'bytes'             : self.totalBytes,
+                'hits'              : self.hitCount,
+                'misses'            : self.missCount,
+                'evictions'         : self.evictionCount,
+                'prefetched'        : self.prefetchCount,
+                'prefetch_hits'     : self.prefetchHitCount,
+                'prefetch_wasted'   : self.prefetchWasteCount,
+                'prefetch_hit_rate' : self.prefetchHitCount / self.prefetchCount if self.prefetchCount > 0 else None,
+            }
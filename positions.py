@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to calculate the league positions of every team over a period for the table program.
+This module implements the :py:class:`PositionMatrix` class.
+'''
+
+# System libraries.
+import bisect
+
+# Optionally use the numpy library.
+try:
+    import numpy
+except:
+    numpy = None
+    print('numpy is not available, using the slower python league positions ({})'.format(__name__))
+
+
+
+class PositionMatrix:
+    '''
+    Class to hold the cumulative points of every team after each of their matches and the league position that follows from them.
+    The positions are calculated after the same number of matches for every team.
+    Teams that have played fewer matches are compared with their last total.
+    The points are encoded as points + goal difference / 1000 so that the goal difference separates teams on the same points.
+
+    :ivar list teams: The indexes of the teams with a home match in the period in ascending order.  These are the teams in the league.
+    :ivar int numMatches: The largest number of matches played by any team in the period.
+    '''
+
+
+
+    def __init__(self, columns, startDate, finishDate, isBonusPoints=True):
+        '''
+        Class constructor for the :py:class:`PositionMatrix` class.
+
+        :param MatchColumns columns: Specifies the matches to use.
+        :param int startDate: Specifies the first date to include as a day ordinal.
+        :param int finishDate: Specifies the last date to include as a day ordinal.
+        :param bool isBonusPoints: Optionally specify False to ignore the bonus points.
+        '''
+        # Find the matches in the period in date order.
+        order = [index for index in range(len(columns)) if columns.dates[index] != columns.NO_DATE and startDate <= columns.dates[index] <= finishDate]
+        order.sort(key=lambda index: columns.dates[index])
+
+        # The encoded points as floats and the exact points * 1000 + goal difference as integers.
+        self._points = {}
+        self._keys = {}
+        homeTeams = set()
+        for index in order:
+            homeTeam = columns.homeTeams[index]
+            awayTeam = columns.awayTeams[index]
+            homeFor = columns.homeFor[index]
+            awayFor = columns.awayFor[index]
+            homeTeams.add(homeTeam)
+            for teamIndex, goalsFor, goalsAgainst, bonusPoints in ((homeTeam, homeFor, awayFor, columns.homeBonus[index]), (awayTeam, awayFor, homeFor, columns.awayBonus[index])):
+                if teamIndex not in self._points:
+                    self._points[teamIndex] = []
+                    self._keys[teamIndex] = []
+                if goalsFor == goalsAgainst:
+                    # Draw.  Doesn't matter home or away or goal difference.
+                    pts = 1
+                    key = 1000
+                else:
+                    pts = 3.0 if goalsFor > goalsAgainst else 0.0
+                    pts += (goalsFor - goalsAgainst) / 1000
+                    key = (3000 if goalsFor > goalsAgainst else 0) + goalsFor - goalsAgainst
+                if bonusPoints != 0 and isBonusPoints:
+                    pts += bonusPoints
+                    key += 1000 * bonusPoints
+                listPts = self._points[teamIndex]
+                listKeys = self._keys[teamIndex]
+                listPts.append((listPts[-1] if len(listPts) > 0 else 0.0) + pts)
+                listKeys.append((listKeys[-1] if len(listKeys) > 0 else 0) + key)
+
+        self.teams = sorted(homeTeams)
+        self.numMatches = max((len(listKeys) for listKeys in self._keys.values()), default=0)
+
+        # The league positions for each team.
+        self._positions = {}
+        if numpy is None:
+            # Sort each matchday once so that each position is a bisect.
+            self._sortedColumns = [sorted(self._getPaddedKeys(teamIndex)[matchIndex] for teamIndex in self.teams) for matchIndex in range(self.numMatches)]
+            for teamIndex in self.teams:
+                self._positions[teamIndex] = self._rankPython(teamIndex)
+        else:
+            # Rank every matchday of every team at once.
+            self._matrix = numpy.array([self._getPaddedKeys(teamIndex) for teamIndex in self.teams], dtype=numpy.int64).reshape(len(self.teams), self.numMatches)
+            greater = (self._matrix[None, :, :] > self._matrix[:, None, :]).sum(axis=1)
+            equal = (self._matrix[None, :, :] == self._matrix[:, None, :]).sum(axis=1) - 1
+            positions = 1 + greater + 0.5 * equal
+            for row, teamIndex in enumerate(self.teams):
+                self._positions[teamIndex] = positions[row, :len(self._keys[teamIndex])].tolist()
+
+
+
+    def getPoints(self, teamIndex):
+        '''
+        Returns the list of cumulative encoded points for the specified team after each of their matches.
+
+        :param int teamIndex: Specifies the team.
+        '''
+        return self._points.get(teamIndex, [])
+
+
+
+    def getPositions(self, teamIndex):
+        '''
+        Returns the list of league positions for the specified team after each of their matches.
+        Tied teams count half a position so a position can be a half.
+
+        :param int teamIndex: Specifies the team.
+        '''
+        if teamIndex not in self._positions:
+            # A team without a home match in the period is compared with every team in the league.
+            if numpy is None:
+                self._positions[teamIndex] = self._rankPython(teamIndex)
+            else:
+                row = numpy.array(self._getPaddedKeys(teamIndex), dtype=numpy.int64)
+                positions = 1 + (self._matrix > row).sum(axis=0) + 0.5 * (self._matrix == row).sum(axis=0)
+                self._positions[teamIndex] = positions[:len(self._keys.get(teamIndex, []))].tolist()
+        return self._positions[teamIndex]
+
+
+
+    def _getPaddedKeys(self, teamIndex):
+        ''' Returns the integer points for the team padded with the last total to the number of matches in the period. '''
+        listKeys = self._keys.get(teamIndex, [])
+        lastKey = listKeys[-1] if len(listKeys) > 0 else 0
+        return listKeys + [lastKey] * (self.numMatches - len(listKeys))
+
+
+
+    def _rankPython(self, teamIndex):
+        ''' Returns the league positions for the team without numpy. '''
+        isMember = 1 if teamIndex in self.teams else 0
+        positions = []
+        for matchIndex, key in enumerate(self._keys.get(teamIndex, [])):
+            sortedColumn = self._sortedColumns[matchIndex]
+            above = bisect.bisect_right(sortedColumn, key)
+            same = above - bisect.bisect_left(sortedColumn, key) - isMember
+            positions.append(1 + len(sortedColumn) - above + 0.5 * same)
+        return positions
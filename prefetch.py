@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to render the pages that are likely to be requested next for the table program.
+This module implements the :py:class:`Prefetcher` class.
+'''
+
+# System libraries.
+import concurrent.futures
+import datetime
+import os
+import threading
+import time
+import traceback
+
+# Require the Sqlite3 library.
+try:
+    import sqlite3
+except:
+    print('pysqlite is not available ({})'.format(__name__));
+
+# Application libraries.
+from htmlbuilder import HtmlBuilder
+from render import Render
+
+
+
+class Prefetcher:
+    '''
+    Class to render the likely next pages into the :py:class:`~page_cache.PageCache` after a page is shown.
+    The likely pages are the previous and next pages of the toolbar, usually the adjacent seasons, and the adjacent match dates of the season pages.
+    The pages are rendered on a single low priority thread with its own :py:class:`~render.Render` object.
+    A new page request cancels the prefetch, a running query is interrupted and the remaining pages are skipped.
+    The hit rate of the prefetched pages is in :py:func:`~page_cache.PageCache.getStatistics`.
+
+    :ivar Application application: The application that owns the database.
+    :ivar bool isEnabled: True to prefetch the pages.
+    :ivar int maxPages: The maximum number of pages to prefetch after each page.
+    :ivar int generation: The generation of the current prefetch.
+    :ivar int scheduleCount: The number of pages that scheduled a prefetch.
+    :ivar int renderCount: The number of pages rendered by the prefetch.
+    :ivar int skipCount: The number of likely pages that were already in the cache.
+    :ivar int cancelCount: The number of prefetches that were cancelled by a new request.
+    :ivar int failCount: The number of likely pages that failed to render.
+    '''
+    # The requests that show the league table on a date in a season.
+    DATE_REQUESTS = ('home', 'table_last')
+
+    # The parameters of the shown page that apply to the likely pages as well.
+    SHARED_PARAMETERS = ('level', )
+
+    # The seconds to wait before the prefetch starts so that the shown page is displayed first.
+    DELAY = 0.2
+
+    # The nice increment of the prefetch thread.
+    NICE = 10
+
+    # The number of sqlite virtual machine instructions between the checks for a cancelled prefetch.
+    PROGRESS_INSTRUCTIONS = 10000
+
+
+
+    def __init__(self, application, isEnabled=True, maxPages=4):
+        '''
+        Class constructor for the :py:class:`Prefetcher` class.
+
+        :param Application application: Specifies the application that owns the database.
+        :param bool isEnabled: Optionally specify False to never prefetch.
+        :param int maxPages: Optionally specify the maximum number of pages to prefetch after each page.
+        '''
+        self.application = application
+        self.isEnabled = isEnabled
+        self.maxPages = maxPages
+        self.generation = 0
+        self.scheduleCount = 0
+        self.renderCount = 0
+        self.skipCount = 0
+        self.cancelCount = 0
+        self.failCount = 0
+
+        # A single thread so that the prefetch never takes more than one core.
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch', initializer=self._lowerPriority)
+        # The render object of the prefetch thread.
+        self._render = None
+        # Lock to protect the generation and the counters.
+        self._lock = threading.Lock()
+
+
+
+    def schedule(self, request, parameters, state):
+        '''
+        Prefetch the likely next pages after the specified page.
+        Any earlier prefetch is cancelled.
+
+        :param string request: Specifies the request of the shown page.
+        :param dict parameters: Specifies the parameters of the shown page.
+        :param dict state: Specifies the :py:attr:`~render.Render.PAGE_STATE` attributes of the shown page.
+        '''
+        if not self.isEnabled:
+            return
+        with self._lock:
+            self.generation += 1
+            self.scheduleCount += 1
+            self._executor.submit(self._prefetch, self.generation, request, dict(parameters), dict(state))
+
+
+
+    def cancel(self):
+        ''' Cancel the current prefetch.  Call this before a page is requested. '''
+        with self._lock:
+            self.generation += 1
+
+
+
+    def shutdown(self):
+        ''' Cancel the current prefetch and stop the thread.  Does not wait for a running page. '''
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+
+    def getCandidates(self, request, parameters, state):
+        '''
+        Returns the likely next pages after the specified page as a list of request and parameters pairs, most likely first.
+
+        :param string request: Specifies the request of the shown page.
+        :param dict parameters: Specifies the parameters of the shown page.
+        :param dict state: Specifies the :py:attr:`~render.Render.PAGE_STATE` attributes of the shown page.
+        '''
+        links = [state.get('nextPage'), state.get('previousPage')]
+
+        # The adjacent match dates in the season.
+        if request in Prefetcher.DATE_REQUESTS:
+            seasonIndex = int(parameters['season']) if 'season' in parameters else self._getRender().lastSeasonIndex
+            theDate = parameters['date'] if 'date' in parameters else f'{datetime.date.today()}'
+            cndb = self.application.database.getConnection()
+            nextDate = cndb.execute('SELECT MIN(THE_DATE) FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE > ?;', (seasonIndex, theDate)).fetchone()[0]
+            previousDate = cndb.execute('SELECT MAX(THE_DATE) FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE < ?;', (seasonIndex, theDate)).fetchone()[0]
+            for matchDate in (nextDate, previousDate):
+                if matchDate is not None:
+                    links.append(f'{request}?season={seasonIndex}&date={matchDate}')
+
+        candidates = []
+        for link in links:
+            if link is None:
+                continue
+            candidateRequest, _, parametersString = link.partition('?')
+            candidateParameters = self._getRender().decodeParameters(parametersString)
+            for key in Prefetcher.SHARED_PARAMETERS:
+                if key in parameters and key not in candidateParameters:
+                    candidateParameters[key] = parameters[key]
+            if candidateRequest in Render.UNCACHED_REQUESTS or (candidateRequest, candidateParameters) in candidates:
+                continue
+            candidates.append((candidateRequest, candidateParameters))
+        return candidates[:self.maxPages]
+
+
+
+    def getStatistics(self):
+        ''' Returns a dictionary of the prefetch counters. '''
+        with self._lock:
+            return {
+                'scheduled' : self.scheduleCount,
+                'rendered'  : self.renderCount,
+                'skipped'   : self.skipCount,
+                'cancelled' : self.cancelCount,
+                'failed'    : self.failCount,
+            }
+
+
+
+    def _lowerPriority(self):
+        ''' Lower the scheduling priority of the prefetch thread.  Only available on Linux where each thread has its own nice value. '''
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), os.getpriority(os.PRIO_PROCESS, 0) + Prefetcher.NICE)
+        except (AttributeError, OSError):
+            pass
+
+
+
+    def _addFailure(self):
+        ''' Count a likely page that failed to render.  The traceback is only shown in debug mode. '''
+        with self._lock:
+            self.failCount += 1
+        if self.application.debug:
+            traceback.print_exc()
+
+
+
+    def _isCancelled(self, generation):
+        ''' Returns True if the specified prefetch has been cancelled. '''
+        return generation != self.generation
+
+
+
+    def _getRender(self):
+        ''' Returns the render object of the prefetch thread. '''
+        if self._render is None:
+            self._render = Render(self.application)
+            self._render.isPrefetch = True
+        return self._render
+
+
+
+    def _prefetch(self, generation, request, parameters, state):
+        ''' Render the likely next pages after the specified page on the prefetch thread. '''
+        # Let the shown page display first.
+        if self._isCancelled(generation):
+            return
+        time.sleep(Prefetcher.DELAY)
+        if self._isCancelled(generation):
+            with self._lock:
+                self.cancelCount += 1
+            return
+
+        # Interrupt the queries of the prefetch connection once the prefetch is cancelled.
+        cndb = self.application.database.getConnection()
+        cndb.set_progress_handler(lambda: 1 if self._isCancelled(generation) else 0, Prefetcher.PROGRESS_INSTRUCTIONS)
+        render = self._getRender()
+        try:
+            for candidateRequest, candidateParameters in self.getCandidates(request, parameters, state):
+                if self._isCancelled(generation):
+                    break
+                key = render.getCacheKey(candidateRequest, candidateParameters)
+                if key is None or self.application.database.pageCache.isCached(key):
+                    with self._lock:
+                        self.skipCount += 1
+                    continue
+
+                # Render without a profile, the page goes into the cache.
+                # A page that fails is left for the request to report.
+                render.html = HtmlBuilder()
+                try:
+                    render._showPage(candidateRequest, candidateParameters)
+                except sqlite3.OperationalError:
+                    if self._isCancelled(generation):
+                        break
+                    self._addFailure()
+                except Exception:
+                    self._addFailure()
+                else:
+                    with self._lock:
+                        self.renderCount += 1
+        except sqlite3.OperationalError:
+            # The likely dates were interrupted.
+            pass
+        finally:
+            cndb.set_progress_handler(None, 0)
+
+        if self._isCancelled(generation):
+            with self._lock:
+                self.cancelCount += 1
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to calculate the best and worst possible finishing positions for the table program.
+This module implements the :py:class:`ProjectionEngine` class.
+
+With 3 points for a win and 1 for a draw deciding whether a team can still finish above another is NP-complete,
+so each position is bracketed between a max-flow relaxation that every real outcome satisfies
+and a win / draw assignment that is a real outcome.
+The two usually agree and the displayed range always contains the true best and worst finish.
+'''
+
+# System libraries.
+import collections
+import itertools
+import threading
+
+# Application libraries.
+from instrumentation import timed
+
+
+
+# The maximum number of max-flow checks for each team and each direction.
+CHECK_BUDGET = 2000
+
+# The largest number of matches where every combination of results is tried.
+EXHAUSTIVE_MATCHES = 6
+
+
+
+class FinishRange:
+    '''
+    Class to hold the range of finishing positions for a team.
+
+    :ivar int bestLow: The best position that might be possible.  The true best position is not better than this.
+    :ivar int bestHigh: The best position that is known to be possible.
+    :ivar int worstLow: The worst position that is known to be possible.
+    :ivar int worstHigh: The worst position that might be possible.  The true worst position is not worse than this.
+    '''
+
+
+
+    def __init__(self, bestLow, bestHigh, worstLow, worstHigh):
+        ''' Class constructor for the :py:class:`FinishRange` class. '''
+        self.bestLow = bestLow
+        self.bestHigh = bestHigh
+        self.worstLow = worstLow
+        self.worstHigh = worstHigh
+
+
+
+    def isExact(self):
+        ''' Returns True if the best and worst positions are known exactly. '''
+        return self.bestLow == self.bestHigh and self.worstLow == self.worstHigh
+
+
+
+class ProjectionEngine:
+    '''
+    Class to calculate the possible finishing positions of every team in a season from the remaining fixtures.
+    Teams level on points are assumed to be separable either way unless neither team has a match left.
+    Bonus points in the remaining matches are not included.
+    The results are cached for each season and date until the season is invalidated.
+
+    :ivar StandingsEngine standings: The :py:class:`~standings.StandingsEngine` that holds the matches.
+    '''
+
+
+
+    def __init__(self, standings):
+        '''
+        Class constructor for the :py:class:`ProjectionEngine` class.
+
+        :param StandingsEngine standings: Specifies the :py:class:`~standings.StandingsEngine` that holds the matches.
+        '''
+        # The engine that holds the matches.
+        self.standings = standings
+
+        # The finish ranges for each season and date.
+        self._ranges = {}
+        # Lock to protect the cache.
+        self._lock = threading.Lock()
+
+
+
+    def invalidate(self, seasonIndex=None):
+        '''
+        Remove the finish ranges for the specified season from the cache.
+
+        :param int seasonIndex: Optionally specify the season that has changed.  Specify None to remove every season.
+        '''
+        with self._lock:
+            if seasonIndex is None:
+                self._ranges = {}
+            else:
+                for key in [key for key in self._ranges if key[0] == seasonIndex]:
+                    del self._ranges[key]
+
+
+
+    @timed('projections')
+    def getFinishRanges(self, seasonIndex, theDate=None):
+        '''
+        Returns a dictionary of :py:class:`FinishRange` objects for every team in the season at the specified date.
+
+        :param int seasonIndex: Specifies the season.
+        :param object theDate: Optionally specify the date of the table as a date or 'YYYY-MM-DD' string.  Specify None for the final table.
+        '''
+        cutoff = None if theDate is None else self.standings._toOrdinal(theDate)
+        key = (seasonIndex, cutoff)
+        with self._lock:
+            if key in self._ranges:
+                return self._ranges[key]
+
+        ranges = self._calculate(seasonIndex, cutoff)
+
+        with self._lock:
+            self._ranges[key] = ranges
+        return ranges
+
+
+
+    def _calculate(self, seasonIndex, cutoff):
+        ''' Returns the finish ranges for every team in the season. '''
+        columns = self.standings.getColumns(seasonIndex)
+        records = self.standings.getSnapshots(seasonIndex).getRecords(cutoff)
+
+        # The current points, goal difference and goals scored for each team.
+        standings = {}
+        for teamIndex in set(columns.homeTeams) | set(columns.awayTeams):
+            record = records.get(teamIndex)
+            if record is None:
+                standings[teamIndex] = (0, 0, 0)
+            else:
+                goalsFor = record[3] + record[8]
+                standings[teamIndex] = (3 * (record[0] + record[5]) + record[1] + record[6] + record[10], goalsFor - record[4] - record[9], goalsFor)
+
+        # The fixtures that are not in the table.
+        fixtures = []
+        for theDate, homeTeam, awayTeam, homeFor, awayFor in zip(columns.dates, columns.homeTeams, columns.awayTeams, columns.homeFor, columns.awayFor):
+            if homeFor < 0 or awayFor < 0:
+                fixtures.append((homeTeam, awayTeam))
+            elif cutoff is not None and (theDate == columns.NO_DATE or theDate > cutoff):
+                fixtures.append((homeTeam, awayTeam))
+        remaining = collections.Counter()
+        for homeTeam, awayTeam in fixtures:
+            remaining[homeTeam] += 1
+            remaining[awayTeam] += 1
+
+        ranges = {}
+        for teamIndex in standings:
+            bestLow, bestHigh = self._bestFinish(teamIndex, standings, fixtures, remaining)
+            worstLow, worstHigh = self._worstFinish(teamIndex, standings, fixtures, remaining)
+            ranges[teamIndex] = FinishRange(bestLow, bestHigh, worstLow, worstHigh)
+        return ranges
+
+
+
+    def _bestFinish(self, teamIndex, standings, fixtures, remaining):
+        '''
+        Returns the bounds on the best finishing position for the team.
+        The team wins all its remaining matches and the other matches are chosen to keep as few teams as possible above it.
+        '''
+        maxPoints = standings[teamIndex][0] + 3 * remaining[teamIndex]
+
+        # Find the teams that are already above and the teams that might finish above.
+        numAbove = 0
+        capacity = {}
+        for otherIndex, standing in standings.items():
+            if otherIndex == teamIndex:
+                continue
+            if standing[0] > maxPoints or (standing[0] == maxPoints and remaining[teamIndex] == 0 and remaining[otherIndex] == 0 and standing > standings[teamIndex]):
+                numAbove += 1
+            else:
+                capacity[otherIndex] = maxPoints - standing[0]
+
+        # Only the matches between these teams matter.  The team wins its own matches and the teams already above win theirs.
+        matches = [(homeTeam, awayTeam) for homeTeam, awayTeam in fixtures if homeTeam in capacity and awayTeam in capacity]
+        candidates = [otherIndex for otherIndex in capacity if 3 * sum(1 for match in matches if otherIndex in match) > capacity[otherIndex]]
+        candidates.sort(key=lambda otherIndex: capacity[otherIndex])
+
+        # Search for the smallest set of teams that must be allowed above.
+        bestLow = None
+        bestHigh = len(candidates)
+        numChecks = 0
+        for size in range(len(candidates) + 1):
+            isRefuted = True
+            for above in itertools.combinations(candidates, size):
+                if numChecks >= CHECK_BUDGET:
+                    isRefuted = False
+                    break
+                numChecks += 1
+                below = [match for match in matches if match[0] not in above and match[1] not in above]
+                if self._canHold(below, capacity):
+                    isRefuted = False
+                    if self._canHoldExactly(below, capacity):
+                        bestHigh = size
+                        break
+            if not isRefuted and bestLow is None:
+                bestLow = size
+            if bestHigh == size or numChecks >= CHECK_BUDGET:
+                break
+        if bestLow is None:
+            bestLow = bestHigh
+        return 1 + numAbove + bestLow, 1 + numAbove + bestHigh
+
+
+
+    def _worstFinish(self, teamIndex, standings, fixtures, remaining):
+        '''
+        Returns the bounds on the worst finishing position for the team.
+        The team loses all its remaining matches and the other matches are chosen to put as many teams as possible above it.
+        '''
+        points = standings[teamIndex][0]
+
+        # The opponents of the team win their matches against it.
+        gained = collections.Counter()
+        for homeTeam, awayTeam in fixtures:
+            if homeTeam == teamIndex:
+                gained[awayTeam] += 3
+            elif awayTeam == teamIndex:
+                gained[homeTeam] += 3
+
+        # Find the teams that are already above and the points that the other teams need.
+        numAbove = 0
+        need = {}
+        for otherIndex, standing in standings.items():
+            if otherIndex == teamIndex:
+                continue
+            otherPoints = standing[0] + gained[otherIndex]
+            if otherPoints > points:
+                numAbove += 1
+            elif otherPoints == points and (remaining[teamIndex] > 0 or remaining[otherIndex] > 0 or standing >= standings[teamIndex]):
+                numAbove += 1
+            elif otherPoints == points:
+                # Level with no matches left but behind on goals.
+                pass
+            else:
+                need[otherIndex] = points - otherPoints
+
+        matches = [(homeTeam, awayTeam) for homeTeam, awayTeam in fixtures if teamIndex not in (homeTeam, awayTeam)]
+        candidates = [otherIndex for otherIndex in need if 3 * sum(1 for match in matches if otherIndex in match) >= need[otherIndex]]
+        candidates.sort(key=lambda otherIndex: need[otherIndex])
+
+        # Search for the largest set of teams that can reach the team.
+        worstLow = 0
+        worstHigh = None
+        numChecks = 0
+        for size in range(len(candidates), -1, -1):
+            isRefuted = True
+            for above in itertools.combinations(candidates, size):
+                if numChecks >= CHECK_BUDGET:
+                    isRefuted = False
+                    break
+                numChecks += 1
+                # A team in the set wins its matches against teams outside the set.
+                shortfall = {}
+                for otherIndex in above:
+                    wins = sum(1 for match in matches if otherIndex in match and (match[0] not in above or match[1] not in above))
+                    if need[otherIndex] > 3 * wins:
+                        shortfall[otherIndex] = need[otherIndex] - 3 * wins
+                inside = [match for match in matches if match[0] in above and match[1] in above and (match[0] in shortfall or match[1] in shortfall)]
+                if self._canReach(inside, shortfall):
+                    isRefuted = False
+                    if self._canReachExactly(inside, shortfall):
+                        worstLow = size
+                        break
+            if not isRefuted and worstHigh is None:
+                worstHigh = size
+            if worstLow == size or numChecks >= CHECK_BUDGET:
+                break
+        if worstHigh is None:
+            worstHigh = worstLow
+        return 1 + numAbove + worstLow, 1 + numAbove + worstHigh
+
+
+
+    def _canHold(self, matches, capacity):
+        '''
+        Returns False if the matches certainly can not be played without a team going over its capacity.
+        Relaxation: each match gives 2 points split in any whole numbers.  Every real result gives at least as much.
+        '''
+        if len(matches) == 0:
+            return True
+        return _maxFlow(matches, 2, {teamIndex: capacity[teamIndex] for teamIndex in _teams(matches)}) == 2 * len(matches)
+
+
+
+    def _canHoldExactly(self, matches, capacity):
+        ''' Returns True if there is a real set of results that keeps every team within its capacity. '''
+        if len(matches) == 0:
+            return True
+
+        # Only wins, the winner gets 3 points.
+        if _maxFlow(matches, 1, {teamIndex: capacity[teamIndex] // 3 for teamIndex in _teams(matches)}) == len(matches):
+            return True
+
+        # Round the relaxation.  Split points are draws and 2-0 splits are wins.
+        flow = {}
+        _maxFlow(matches, 2, {teamIndex: capacity[teamIndex] for teamIndex in _teams(matches)}, flow)
+        points = collections.Counter()
+        for index, (homeTeam, awayTeam) in enumerate(matches):
+            homePoints = flow.get((index, 0), 0)
+            if homePoints == 1:
+                points[homeTeam] += 1
+                points[awayTeam] += 1
+            elif homePoints == 2:
+                points[homeTeam] += 3
+            else:
+                points[awayTeam] += 3
+        if all(points[teamIndex] <= capacity[teamIndex] for teamIndex in points):
+            return True
+
+        # Try every combination of results for a few matches.
+        if len(matches) <= EXHAUSTIVE_MATCHES:
+            for points in _allResults(matches):
+                if all(points[teamIndex] <= capacity[teamIndex] for teamIndex in points):
+                    return True
+        return False
+
+
+
+    def _canReach(self, matches, shortfall):
+        '''
+        Returns False if the matches certainly can not give every team the points it needs.
+        Relaxation: each match gives 3 points split in any whole numbers.  Every real result gives at most as much.
+        '''
+        total = sum(shortfall.values())
+        if total == 0:
+            return True
+        return _maxFlow(matches, 3, shortfall) == total
+
+
+
+    def _canReachExactly(self, matches, shortfall):
+        ''' Returns True if there is a real set of results that gives every team the points it needs. '''
+        if sum(shortfall.values()) == 0:
+            return True
+
+        # Only wins, the winner gets 3 points.
+        required = {teamIndex: -(-shortfall[teamIndex] // 3) for teamIndex in shortfall}
+        if _maxFlow(matches, 1, required) == sum(required.values()):
+            return True
+
+        # Round the relaxation.  3-0 splits are wins and other splits are draws.
+        flow = {}
+        _maxFlow(matches, 3, shortfall, flow)
+        points = collections.Counter()
+        for index, (homeTeam, awayTeam) in enumerate(matches):
+            homePoints = flow.get((index, 0), 0)
+            awayPoints = flow.get((index, 1), 0)
+            if homePoints == 3:
+                points[homeTeam] += 3
+            elif awayPoints == 3:
+                points[awayTeam] += 3
+            elif homePoints + awayPoints > 0:
+                points[homeTeam] += 1
+                points[awayTeam] += 1
+        if all(points[teamIndex] >= shortfall[teamIndex] for teamIndex in shortfall):
+            return True
+
+        # Try every combination of results for a few matches.
+        if len(matches) <= EXHAUSTIVE_MATCHES:
+            for points in _allResults(matches):
+                if all(points[teamIndex] >= shortfall[teamIndex] for teamIndex in shortfall):
+                    return True
+        return False
+
+
+
+def _allResults(matches):
+    ''' Generates the points for each team from every combination of results in the matches. '''
+    for results in itertools.product((0, 1, 2), repeat=len(matches)):
+        points = collections.Counter()
+        for (homeTeam, awayTeam), result in zip(matches, results):
+            if result == 0:
+                points[homeTeam] += 3
+            elif result == 1:
+                points[homeTeam] += 1
+                points[awayTeam] += 1
+            else:
+                points[awayTeam] += 3
+        yield points
+
+
+
+def _teams(matches):
+    ''' Returns the set of teams in the matches. '''
+    return set(team for match in matches for team in match)
+
+
+
+def _maxFlow(matches, pointsPerMatch, capacity, flow=None):
+    '''
+    Returns the maximum flow of points from the matches to the teams.
+    Each match can give up to pointsPerMatch to its teams and each team can take up to its capacity.
+    If a flow dictionary is given it receives the points given to the home (index, 0) and away (index, 1) team of each match.
+    '''
+    # Build the residual graph.  Node 0 is the source, then the matches, then the teams, then the sink.
+    teams = sorted(capacity)
+    teamNode = {teamIndex: 1 + len(matches) + position for position, teamIndex in enumerate(teams)}
+    sink = 1 + len(matches) + len(teams)
+    graph = [[] for _ in range(sink + 1)]
+
+    def addEdge(start, finish, edgeCapacity):
+        graph[start].append([finish, edgeCapacity, len(graph[finish])])
+        graph[finish].append([start, 0, len(graph[start]) - 1])
+        return graph[start][-1]
+
+    matchEdges = []
+    for index, (homeTeam, awayTeam) in enumerate(matches):
+        addEdge(0, 1 + index, pointsPerMatch)
+        homeEdge = addEdge(1 + index, teamNode[homeTeam], pointsPerMatch) if homeTeam in teamNode else None
+        awayEdge = addEdge(1 + index, teamNode[awayTeam], pointsPerMatch) if awayTeam in teamNode else None
+        matchEdges.append((homeEdge, awayEdge))
+    for teamIndex in teams:
+        addEdge(teamNode[teamIndex], sink, capacity[teamIndex])
+
+    # Dinic's algorithm.
+    total = 0
+    while True:
+        level = [-1] * (sink + 1)
+        level[0] = 0
+        queue = collections.deque([0])
+        while queue:
+            node = queue.popleft()
+            for edge in graph[node]:
+                if edge[1] > 0 and level[edge[0]] < 0:
+                    level[edge[0]] = level[node] + 1
+                    queue.append(edge[0])
+        if level[sink] < 0:
+            break
+        nextEdge = [0] * (sink + 1)
+
+        def push(node, amount):
+            if node == sink:
+                return amount
+            while nextEdge[node] < len(graph[node]):
+                edge = graph[node][nextEdge[node]]
+                if edge[1] > 0 and level[edge[0]] == level[node] + 1:
+                    pushed = push(edge[0], min(amount, edge[1]))
+                    if pushed > 0:
+                        edge[1] -= pushed
+                        graph[edge[0]][edge[2]][1] += pushed
+                        return pushed
+                nextEdge[node] += 1
+            return 0
+
+        while True:
+            pushed = push(0, pointsPerMatch)
+            if pushed == 0:
+                break
+            total += pushed
+
+    # Report the points given to each team.
+    if flow is not None:
+        for index, (homeEdge, awayEdge) in enumerate(matchEdges):
+            if homeEdge is not None:
+                flow[(index, 0)] = pointsPerMatch - homeEdge[1]
+            if awayEdge is not None:
+                flow[(index, 1)] = pointsPerMatch - awayEdge[1]
+    return total
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to hold the teams and seasons of the table program in memory.
+This module implements the :py:class:`Registry` class.
+'''
+
+# System libraries.
+import collections
+import threading
+
+# Application libraries.
+from team import Team
+from season import Season
+
+
+
+class Registry:
+    '''
+    Class to hold the :py:class:`~team.Team` and :py:class:`~season.Season` objects.
+    The TEAMS and SEASONS tables are loaded with one query each the first time a team or season is requested.
+    When another connection changes the database the rows are loaded again and only the objects whose row has changed are updated, so the objects that the pages hold stay valid.
+    With a size bound the teams are read in batches when they are needed and the least recently used teams are removed.
+
+    :ivar Database database: The :py:class:`~database.Database` that owns the connections.
+    :ivar int maxTeams: The maximum number of teams to hold or None for every team.
+    :ivar bool isLoaded: True once the tables have been loaded.
+    :ivar int loadCount: The number of times the tables have been loaded.
+    :ivar int readCount: The number of teams read individually because they were not held.
+    :ivar int evictionCount: The number of teams removed to stay within the size bound.
+    '''
+    # The number of teams in each query when the teams are read in batches.
+    BATCH_SIZE = 500
+
+
+
+    def __init__(self, database, maxTeams=None):
+        '''
+        Class constructor for the :py:class:`Registry` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` that owns the connections.
+        :param int maxTeams: Optionally specify the maximum number of teams to hold.  The default holds every team.
+        '''
+        self.database = database
+        self.maxTeams = maxTeams
+        self.isLoaded = False
+        self.loadCount = 0
+        self.readCount = 0
+        self.evictionCount = 0
+
+        # The teams with the most recently used last.
+        self._teams = collections.OrderedDict()
+        # The seasons.
+        self._seasons = {}
+        # The row of each team and season to find the rows that have changed.
+        self._teamRows = {}
+        self._seasonRows = {}
+        # True when every team is held.
+        self._isAllTeams = False
+        # The data version when the tables were last loaded.
+        self._dataVersion = None
+        # Lock to protect the teams and seasons.
+        self._lock = threading.RLock()
+
+
+
+    def getTeam(self, teamIndex):
+        '''
+        Returns the :py:class:`~team.Team` object for the specified team.
+
+        :param int teamIndex: Specifies the ID of the team.
+        '''
+        with self._lock:
+            self._ensureLoaded()
+            team = self._teams.get(teamIndex)
+            if team is not None:
+                if self.maxTeams is not None:
+                    self._teams.move_to_end(teamIndex)
+                return team
+
+            # Read the team on its own.  This reports a team that does not exist.
+            team = Team(self.database)
+            team.read(teamIndex)
+            self.readCount += 1
+            self._addTeam(teamIndex, team, None)
+            return team
+
+
+
+    def getSeason(self, seasonIndex):
+        '''
+        Returns the :py:class:`~season.Season` object for the specified season.
+
+        :param int seasonIndex: Specifies the ID of the season.
+        '''
+        with self._lock:
+            self._ensureLoaded()
+            season = self._seasons.get(seasonIndex)
+            if season is not None:
+                return season
+
+            # Read the season on its own.  This reports a season that does not exist.
+            season = Season(self.database)
+            season.read(seasonIndex)
+            self._seasons[seasonIndex] = season
+            return season
+
+
+
+    def preloadTeams(self, teamIndexes):
+        '''
+        Read the specified teams that are not held with a single query.
+        Use this before a page that shows a lot of teams when there is a size bound.
+
+        :param list teamIndexes: Specifies the IDs of the teams.
+        '''
+        with self._lock:
+            self._ensureLoaded()
+            if self._isAllTeams:
+                return
+            missing = [teamIndex for teamIndex in set(teamIndexes) if teamIndex not in self._teams]
+            if len(missing) == 0:
+                return
+            for row in self._readTeams(missing):
+                team = Team(self.database)
+                team.setRow(row)
+                self._addTeam(row[0], team, row)
+
+
+
+    def checkVersion(self):
+        '''
+        Load the tables again if another program has changed the database since the last check.
+        The changes written by this program update the registry themselves.
+        This is a single pragma so call it before each page.
+        Returns True if the tables were loaded again.
+        '''
+        if not self.isLoaded:
+            return False
+        dataVersion = self.database.connections.getDataVersion()
+        with self._lock:
+            lastVersion = self._dataVersion
+            self._dataVersion = dataVersion
+        if lastVersion is None or lastVersion == dataVersion:
+            return False
+        self.refresh()
+        return True
+
+
+
+    def refresh(self):
+        '''
+        Load the tables again.
+        Only the objects whose row has changed are updated.  Objects whose row has gone are removed.
+        '''
+        with self._lock:
+            self._load()
+
+
+
+    def getStatistics(self):
+        ''' Returns a dictionary of the registry counters. '''
+        with self._lock:
+            return {
+                'teams'     : len(self._teams),
+                'seasons'   : len(self._seasons),
+                'loads'     : self.loadCount,
+                'reads'     : self.readCount,
+                'evictions' : self.evictionCount,
+            }
+
+
+
+    def _ensureLoaded(self):
+        ''' Load the tables if they have not been loaded yet. '''
+        if not self.isLoaded:
+            # The data version from before the load so that the first check does not load again.
+            dataVersion = self.database.connections.getDataVersion()
+            self._load()
+            if self._dataVersion is None:
+                self._dataVersion = dataVersion
+
+
+
+    def _load(self):
+        ''' Load the SEASONS table and the TEAMS table unless the teams are over the size bound. '''
+        cndb = self.database.getConnection()
+        self.loadCount += 1
+
+        # The seasons.
+        rows = {row[0]: tuple(row) for row in cndb.execute(f'SELECT {Season.COLUMNS} FROM SEASONS;')}
+        isSeasonsChanged = False
+        for seasonIndex in [seasonIndex for seasonIndex in self._seasons if seasonIndex not in rows]:
+            del self._seasons[seasonIndex]
+            self._seasonRows.pop(seasonIndex, None)
+            isSeasonsChanged = True
+        for seasonIndex, row in rows.items():
+            if self._seasonRows.get(seasonIndex) == row and seasonIndex in self._seasons:
+                continue
+            isSeasonsChanged = True
+            season = self._seasons.get(seasonIndex)
+            if season is None:
+                season = Season(self.database)
+                self._seasons[seasonIndex] = season
+            season.setRow(row)
+            self._seasonRows[seasonIndex] = row
+        if isSeasonsChanged:
+            # The season order may have changed.
+            self.database.timeline.invalidate()
+
+        # The teams.  With a size bound only the teams that are held are loaded again.
+        if self.maxTeams is None or cndb.execute('SELECT COUNT(*) FROM TEAMS;').fetchone()[0] <= self.maxTeams:
+            rows = {row[0]: tuple(row) for row in cndb.execute(f'SELECT {Team.COLUMNS} FROM TEAMS;')}
+            self._isAllTeams = True
+        else:
+            rows = {row[0]: row for row in self._readTeams(list(self._teams))}
+            self._isAllTeams = False
+        for teamIndex in [teamIndex for teamIndex in self._teams if teamIndex not in rows]:
+            del self._teams[teamIndex]
+            self._teamRows.pop(teamIndex, None)
+        for teamIndex, row in rows.items():
+            if self._teamRows.get(teamIndex) == row and teamIndex in self._teams:
+                continue
+            team = self._teams.get(teamIndex)
+            if team is None:
+                team = Team(self.database)
+                self._teams[teamIndex] = team
+            team.setRow(row)
+            self._teamRows[teamIndex] = row
+
+        self.isLoaded = True
+
+
+
+    def _readTeams(self, teamIndexes):
+        ''' Returns the rows of the specified teams.  The teams are read in batches to stay within the sqlite parameter limit. '''
+        cndb = self.database.getConnection()
+        rows = []
+        for start in range(0, len(teamIndexes), Registry.BATCH_SIZE):
+            batch = tuple(teamIndexes[start:start + Registry.BATCH_SIZE])
+            sql = f"SELECT {Team.COLUMNS} FROM TEAMS WHERE ID IN ({', '.join('?' * len(batch))});"
+            rows.extend(tuple(row) for row in cndb.execute(sql, batch))
+        return rows
+
+
+
+    def _addTeam(self, teamIndex, team, row):
+        ''' Hold the specified team and remove the least recently used teams over the size bound. '''
+        self._teams[teamIndex] = team
+        if row is not None:
+            self._teamRows[teamIndex] = row
+        if self.maxTeams is None:
+            return
+        self._isAllTeams = False
+        while len(self._teams) > self.maxTeams:
+            oldIndex, oldTeam = self._teams.popitem(last=False)
+            self._teamRows.pop(oldIndex, None)
+            self.evictionCount += 1
@@ -7,21 +7,24 @@ These functions were originally in the database module.
 
 # System Libraries.
 import sys
-import sqlite3
 import datetime
 import time
 import math
 
 # Import my own libraries.
-import walton.html
 import walton.toolbar
 
+# Application libraries.
+import page_cache
+import instrumentation
+from htmlbuilder import HtmlBuilder, TD_END, TD_WIN, TD_DRAW, TD_LOST, TD_SECONDARY, TD_PTS
+
 
 
 class Render(walton.toolbar.IToolbar):
     '''
     :ivar Database database: The :py:class:`~database.Database` object to build pages from.
-    :ivar Html html: A :py:class:`~walton.html.Html` object to prepare the output for the browser.
+    :ivar HtmlBuilder html: A :py:class:`~htmlbuilder.HtmlBuilder` object to prepare the output for the browser.
     :ivar string editTarget: The url to edit the current page or None if no edit available.
     :ivar string next: The url to move to the next page or None for no next page.
     :ivar string previous: The url to the previous page or None for no previous page.
@@ -39,6 +42,18 @@ class Render(walton.toolbar.IToolbar):
     # True to show toolbars initially.
     TOOLBAR_INITIAL_SHOW = False
 
+    # The requests that should not be cached.
+    UNCACHED_REQUESTS = ('index', 'preferences')
+
+    # The parameters that change the database so the page should not be cached.
+    WRITE_PARAMETERS = ('include', 'exclude')
+
+    # The requests that only depend on the season in their parameters.  The home page is not one of these because the form of the teams comes from the earlier seasons.
+    SEASON_REQUESTS = ('show_team_season', )
+
+    # The attributes that describe the toolbar for the page.
+    PAGE_STATE = ('editTarget', 'nextPage', 'previousPage', 'showAge', 'tournamentSelect', 'yearsSelect', 'countrySelect', 'levels', 'clipboardText')
+
 
 
     def __init__(self, application):
@@ -72,9 +87,13 @@ class Render(walton.toolbar.IToolbar):
         # The text to copy to the clipboard for a copy request.
         self.clipboardText = None
         # A Html object to prepare the output for the browser.
-        self.html = walton.html.Html()
+        self.html = HtmlBuilder()
         # A default height for the distribution graph.
         self.maxDistributionCount = 10
+        # The profile of the last page or None when the instrumentation is not enabled.
+        self.profile = None
+        # True while the pages are rendered speculatively by the :py:class:`~prefetch.Prefetcher`.
+        self.isPrefetch = False
 
         # Define the actions this module can handle and the function to handle the action.
         self.actions = {
@@ -89,18 +108,12 @@ class Render(walton.toolbar.IToolbar):
             'show_team_season'  : self.showTeamSeason
         }
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
 
-        # Indentify the current last season.
-        sql = "SELECT ID FROM SEASONS ORDER BY FINISH_DATE DESC LIMIT 1;"
-        cursor = cndb.execute(sql)
-        row = cursor.fetchone()
-        cursor. close()
-        self.lastSeasonIndex = row[0]
 
-        # Close the database.
-        cndb.close()
+    @property
+    def lastSeasonIndex(self):
+        ''' The ID of the season with the latest finish date from the :py:class:`~timeline.SeasonTimeline`. '''
+        return self.database.timeline.getLastSeasonIndex()
 
 
 
@@ -126,25 +139,99 @@ class Render(walton.toolbar.IToolbar):
 
 
 
+    def showPage(self, request, parameters):
+        '''
+        Render the specified request on the html object.
+        This is :py:attr:`actions` with the :py:class:`~page_cache.PageCache` of the database in front.
+        Every request renders into a new html object and a page from the cache is shown as a copy, so the cached pages are never changed.
+        The :py:class:`~instrumentation.PageProfile` of the page is in :py:attr:`profile` when the instrumentation is enabled.
+
+        :param string request: Specifies the request.
+        :param dict parameters: Specifies the request parameters.
+        '''
+        profile = self.application.instrumentation.startPage(request, parameters)
+        isCached = False
+        try:
+            # Pick up the teams and seasons changed by another connection.
+            self.database.registry.checkVersion()
+            # Remove the cached results when another connection has changed the matches.
+            if self.database.matchStore.checkVersion():
+                self.database.invalidateSeason()
+            isCached = self._showPage(request, parameters)
+        finally:
+            if profile is not None:
+                profile.isCached = isCached
+                self.application.instrumentation.finishPage(self.html.getSize())
+        self.profile = profile
+
+
+
+    def getCacheKey(self, request, parameters):
+        '''
+        Returns the key of the specified request in the :py:class:`~page_cache.PageCache` or None if the page should not be cached.
+
+        :param string request: Specifies the request.
+        :param dict parameters: Specifies the request parameters.
+        '''
+        if request in Render.UNCACHED_REQUESTS or any(key in parameters for key in Render.WRITE_PARAMETERS):
+            return None
+
+        # Pages without a date show today.
+        configuration = self.application.configuration
+        return (request, tuple(sorted(parameters.items())), datetime.date.today(), configuration.textSize, configuration.colourScheme, configuration.fontName, configuration.verticalSpace, configuration.horizontalSpace)
+
+
+
+    def _showPage(self, request, parameters):
+        ''' Render the specified request on the html object through the page cache.  Returns True if the page came from the cache. '''
+        # Render into a new html object so that the cached pages are never changed.
+        stylesheets = self.html.stylesheets
+        self.html = HtmlBuilder()
+        self.html.stylesheets = list(stylesheets)
+
+        key = self.getCacheKey(request, parameters)
+        if key is None:
+            self.actions[request](parameters)
+            return False
+
+        # The prefetcher only renders pages that are not in the cache.
+        page = None if self.isPrefetch else self.database.pageCache.get(key)
+        if page is not None:
+            # Show a copy of the cached page so that later requests never render into the cached object.
+            self.html = page.html.copy(stylesheets)
+            for name, value in page.state.items():
+                setattr(self, name, value)
+            return True
+
+        self.actions[request](parameters)
+
+        seasonIndex = int(parameters['season']) if request in Render.SEASON_REQUESTS and 'season' in parameters else None
+        state = {name: getattr(self, name) for name in Render.PAGE_STATE}
+        self.database.pageCache.put(key, page_cache.CachedPage(self.html.copy(), state, seasonIndex, request, self.html.getSize(), self.isPrefetch))
+        return False
+
+
+
     def getDefaultBoxHeight(self):
         ''' Results the default height for a win draw loss box. '''
         return max(20, 9 + self.application.configuration.textSize)
 
 
 
-    def displayLastResults(self, cndb, teamIndex, theDate, lastResults):
-        ''' Show the last results for the specified team. '''
+    def displayLastResults(self, cndb, teamIndex, form, lastResults):
+        '''
+        Show the last results for the specified team.
+
+        :param dict form: Specifies the last matches of each team from :py:func:`~form.FormGuide.getForm`.
+        '''
         height = 18
         width = (height + 4) * lastResults
         self.html.add('<td>')
         self.html.add(f'<svg class="wdlbox" width="{width}" height="{height}" style="vertical-align: middle;">')
 
-        sql = f"SELECT HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE (HOME_TEAM_ID = {teamIndex} OR AWAY_TEAM_ID = {teamIndex}) AND THE_DATE <= '{theDate}' ORDER BY THE_DATE DESC LIMIT 5;";
-        # print(sql)
-        cursor = cndb.execute(sql)
         count = 0
         pts = 0
-        for row in cursor:
+        for row in form.get(teamIndex, []):
             pos = (lastResults - count - 1) * (height + 4)
             count += 1
             if row[2] == row[3]:
@@ -165,7 +252,6 @@ class Render(walton.toolbar.IToolbar):
                     pts += 3
                 else:
                     self.html.add(f'<rect class="wdlbox_lose" x="{pos}" y="0" width="{height}" height="{height}" style="stroke-width: 1; stroke: rgb(0, 0, 0);" />')
-        cursor.close()
         self.html.addLine('</svg></td>')
         self.html.add(f'<td class="secondary" style="text-align: right;">{pts}</td>')
 
@@ -294,10 +380,12 @@ class Render(walton.toolbar.IToolbar):
 
 
 
-    def displayTable(self, cndb, sql, season, isCombinedHomeAway, isAddColour, isShowRange, theDate, lastResults, isBySeason, extraInfo=0):
+    @instrumentation.timed('table')
+    def displayTable(self, cndb, rows, season, isCombinedHomeAway, isAddColour, isShowRange, theDate, lastResults, isBySeason, extraInfo=0):
         '''
         Display a table on the html object.
-        The fields from the sql should be
+        The rows are usually from :py:func:`~standings.StandingsEngine.getTable` or the fetchall() of a sql query.
+        The fields in each row should be
          0 Team Name
          1 Home Wins
          2 Home Draws
@@ -317,14 +405,12 @@ class Render(walton.toolbar.IToolbar):
         '''
         if isShowRange:
             isShowPossiblePoints = False
-            cursor = cndb.execute(sql)
             count = 0
             minPoints = 0
             maxPoints = 0
             safePoints = 0
             requiredPoints = 0
-            arrayPoints = []
-            for row in cursor:
+            for row in rows:
                 count += 1
                 played = row[1] + row[2] + row[3] + row[6] + row[7] + row[8]
                 if played < season.numMatches:
@@ -332,8 +418,6 @@ class Render(walton.toolbar.IToolbar):
                 teamMinPoints = row[11]
                 remainingMatches = season.numMatches - played
                 teamMaxPoints = teamMinPoints + remainingMatches * 3
-                goalDifference = row[12]
-                arrayPoints.append((teamMinPoints + (goalDifference - 2 * remainingMatches) / 1000.0, teamMaxPoints + (goalDifference + 2 * remainingMatches) / 1000.0))
                 if count == 1:
                     minPoints = teamMinPoints
                     maxPoints = teamMaxPoints
@@ -350,7 +434,9 @@ class Render(walton.toolbar.IToolbar):
                     requiredPoints = (int)(math.ceil(season.numMatches * row[11] / played))
                 if count == season.goodPos + 1:
                     requiredPoints = (int)(math.ceil((requiredPoints + (int)(math.ceil(season.numMatches * row[11] / played))) / 2))
-            cursor.close()
+
+            # The possible finishing positions from the remaining fixtures.
+            finishRanges = self.database.projections.getFinishRanges(season.index, theDate)
 
         self.html.addLine('<table>')
         if isCombinedHomeAway:
@@ -363,11 +449,15 @@ class Render(walton.toolbar.IToolbar):
             self.html.add('<td colspan="2">Possible Points</td>')
         if lastResults > 0:
             self.html.add(f'<td colspan="2">Last {lastResults} Matches</td>')
+
+            # The last matches of every team in the table.
+            form = self.database.form.getForm(theDate, lastResults, [row[0] for row in rows])
         self.html.addLine('</tr>')
-        # print(sql)
-        cursor = cndb.execute(sql)
+        if not isBySeason:
+            # Read the teams together rather than one at a time.
+            self.database.registry.preloadTeams([row[0] for row in rows])
         count = 0
-        for row in cursor:
+        for row in rows:
             if isAddColour and count < season.goodPos:
                 self.html.add('<tr class="win2">')
             elif isAddColour and count < season.positivePos:
@@ -388,31 +478,18 @@ class Render(walton.toolbar.IToolbar):
                 self.html.add(f'<td style="text-align: right;">{team.toHtml()}</td>')
 
             played = row[1] + row[2] + row[3] + row[6] + row[7] + row[8]
-            self.html.add(f'<td class="secondary" style="text-align: right;">{played}</td>')
+            self.html.addFragments(TD_SECONDARY, str(played), TD_END)
 
+            # The cells use the static fragments rather than formatting a string for each cell.
             if isCombinedHomeAway:
                 # Combined home and away.
-                self.html.add(f'<td class="win" style="text-align: right;">{row[1] + row[6]}</td>')
-                self.html.add(f'<td class="draw" style="text-align: right;">{row[2] + row[7]}</td>')
-                self.html.add(f'<td class="lost" style="text-align: right;">{row[3] + row[8]}</td>')
-                self.html.add(f'<td class="secondary" style="text-align: right;">{row[4] + row[9]}</td>')
-                self.html.add(f'<td class="secondary" style="text-align: right;">{row[5] + row[10]}</td>')
+                self.html.addFragments(TD_WIN, str(row[1] + row[6]), TD_END, TD_DRAW, str(row[2] + row[7]), TD_END, TD_LOST, str(row[3] + row[8]), TD_END, TD_SECONDARY, str(row[4] + row[9]), TD_END, TD_SECONDARY, str(row[5] + row[10]), TD_END)
             else:
                 # Separate home and away.
-                self.html.add(f'<td class="win" style="text-align: right;">{row[1]}</td>')
-                self.html.add(f'<td class="draw" style="text-align: right;">{row[2]}</td>')
-                self.html.add(f'<td class="lost" style="text-align: right;">{row[3]}</td>')
-                self.html.add(f'<td class="secondary" style="text-align: right;">{row[4]}</td>')
-                self.html.add(f'<td class="secondary" style="text-align: right;">{row[5]}</td>')
-
-                self.html.add(f'<td class="win" style="text-align: right;">{row[6]}</td>')
-                self.html.add(f'<td class="draw" style="text-align: right;">{row[7]}</td>')
-                self.html.add(f'<td class="lost" style="text-align: right;">{row[8]}</td>')
-                self.html.add(f'<td class="secondary" style="text-align: right;">{row[9]}</td>')
-                self.html.add(f'<td class="secondary" style="text-align: right;">{row[10]}</td>')
+                self.html.addFragments(TD_WIN, str(row[1]), TD_END, TD_DRAW, str(row[2]), TD_END, TD_LOST, str(row[3]), TD_END, TD_SECONDARY, str(row[4]), TD_END, TD_SECONDARY, str(row[5]), TD_END)
+                self.html.addFragments(TD_WIN, str(row[6]), TD_END, TD_DRAW, str(row[7]), TD_END, TD_LOST, str(row[8]), TD_END, TD_SECONDARY, str(row[9]), TD_END, TD_SECONDARY, str(row[10]), TD_END)
 
-            self.html.add(f'<td class="pts" style="text-align: right;">{row[11]}</td>')
-            self.html.add(f'<td class="secondary" style="text-align: right;">{row[12]:+}</td>')
+            self.html.addFragments(TD_PTS, str(row[11]), TD_END, TD_SECONDARY, f'{row[12]:+}', TD_END)
 
             self.html.add('<td>')
             self.drawWinDrawLossBox(200, 18, row[1] + row[6], row[2] + row[7], row[3] + row[8])
@@ -440,27 +517,19 @@ class Render(walton.toolbar.IToolbar):
                 self.html.add('</td>')
 
                 # Show possible final ranking.
-                self.html.add(f'<td class="rank" style="white-space: nowrap; text-align: center;" title="{team.name} maximum points are {teamMaxPoints}.">')
-                goalDifference = row[12]
-                teamMinPoints += goalDifference / 1000.0
-                teamMaxPoints += goalDifference / 1000.0
-                count1 = 0
-                count2 = 1
-                for points in arrayPoints:
-                    if teamMinPoints <= points[1]:
-                        count1 += 1
-                    if teamMaxPoints < points[0]:
-                        count2 += 1
-                    # print(f'{points[0]:.3f} {points[1]:.3f} {teamMaxPoints:.3f} {teamMinPoints:.3f} {count1:3} {count2:3}')
-                # print()
-                if count1 != count2:
-                    self.html.add(f' {count2}-{count1}')
+                finishRange = finishRanges[team.index]
+                if finishRange.isExact():
+                    self.html.add(f'<td class="rank" style="white-space: nowrap; text-align: center;" title="{team.name} maximum points are {teamMaxPoints}.">')
+                else:
+                    self.html.add(f'<td class="rank" style="white-space: nowrap; text-align: center;" title="{team.name} maximum points are {teamMaxPoints}.  Best finish {finishRange.bestLow} to {finishRange.bestHigh}, worst finish {finishRange.worstLow} to {finishRange.worstHigh}.">')
+                if finishRange.bestLow != finishRange.worstHigh:
+                    self.html.add(f' {finishRange.bestLow}-{finishRange.worstHigh}')
                 else:
-                    self.html.add(f' {count1}')
+                    self.html.add(f' {finishRange.bestLow}')
                 self.html.add('</td>')
 
             if lastResults > 0:
-                self.displayLastResults(cndb, team.index, theDate, lastResults)
+                self.displayLastResults(cndb, team.index, form, lastResults)
 
             self.html.addLine('</tr>')
         self.html.addLine('</table>')
@@ -608,8 +677,8 @@ class Render(walton.toolbar.IToolbar):
             #self.html.add('</p>')
         self.html.addLine('</p>')
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         self.html.add('<fieldset style="display: inline-block; vertical-align: top;"><legend>')
         if theDate is None:
@@ -618,34 +687,14 @@ class Render(walton.toolbar.IToolbar):
             self.html.add(f'Table to {self.database.formatDate(theDate)}')
         self.html.addLine('</legend>')
 
-        sql = "SELECT TEAM_ID, HOME_WINS, HOME_DRAWS, HOME_LOSES, HOME_FOR, HOME_AGAINST, AWAY_WINS, AWAY_DRAWS, AWAY_LOSES, AWAY_FOR, AWAY_AGAINST, 3 * (HOME_WINS + AWAY_WINS) + (HOME_DRAWS + AWAY_DRAWS) + BONUS_PTS AS PTS, HOME_FOR + AWAY_FOR - HOME_AGAINST - AWAY_AGAINST AS DIFF, HOME_FOR + AWAY_FOR AS FOR, BONUS_PTS FROM ("
-
-        # Summerise all the results.
-        sql += "SELECT TEAM_ID, SUM(HOME_WINS) AS HOME_WINS, SUM(HOME_DRAWS) AS HOME_DRAWS, SUM(HOME_LOSES) AS HOME_LOSES, SUM(HOME_FOR) AS HOME_FOR, SUM(HOME_AGAINST) AS HOME_AGAINST, SUM(AWAY_WINS) AS AWAY_WINS, SUM(AWAY_DRAWS) AS AWAY_DRAWS, SUM(AWAY_LOSES) AS AWAY_LOSES, SUM(AWAY_FOR) AS AWAY_FOR, SUM(AWAY_AGAINST) AS AWAY_AGAINST, SUM(BONUS_PTS) AS BONUS_PTS FROM ("
-
-        # Summerise all the home results.
-        sql += "SELECT HOME_TEAM_ID AS TEAM_ID, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS HOME_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS HOME_DRAWS, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS HOME_LOSES, SUM(HOME_TEAM_FOR) AS HOME_FOR, SUM(AWAY_TEAM_FOR) AS HOME_AGAINST, 0 AS AWAY_WINS, 0 AS AWAY_DRAWS, 0 AS AWAY_LOSES, 0 AS AWAY_FOR, 0 AS AWAY_AGAINST, SUM(HOME_BONUS_PTS) AS BONUS_PTS FROM MATCHES "
         if theDate is None:
-            # All season results
-            sql += f"WHERE SEASON_ID = {seasonIndex} GROUP BY HOME_TEAM_ID "
+            # The final table is stored in the database.
+            rows = self.database.standingsTable.getTable(seasonIndex, True)
         else:
-            # Up to the date.
-            sql += f"WHERE SEASON_ID = {seasonIndex} AND THE_DATE <= '{theDate}' GROUP BY HOME_TEAM_ID "
-        sql += "UNION "
-        # Summerise all the away results.
-        sql += "SELECT AWAY_TEAM_ID AS TEAM_ID, 0 AS AWAY_WINS, 0 AS AWAY_DRAWS, 0 AS AWAY_LOSES, 0 AS AWAY_FOR, 0 AS AWAY_AGAINST, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS AWAY_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS AWAY_DRAWS, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS AWAY_LOSES, SUM(AWAY_TEAM_FOR) AS AWAY_FOR, SUM(HOME_TEAM_FOR) AS AWAY_AGAINST, SUM(AWAY_BONUS_PTS) AS BONUS_PTS FROM MATCHES "
-        if theDate is None:
-            # All season results.
-            sql += f"WHERE SEASON_ID = {seasonIndex} GROUP BY AWAY_TEAM_ID  "
-        else:
-            # Update to the date.
-            sql += f"WHERE SEASON_ID = {seasonIndex} AND THE_DATE <= '{theDate}' GROUP BY AWAY_TEAM_ID  "
-        sql += ") GROUP BY TEAM_ID) "
-        sql += "ORDER BY PTS DESC, DIFF DESC, FOR DESC; "
-
-        # print(sql)
+            # Calculate the table in memory.
+            rows = self.database.standings.getTable(seasonIndex, None, theDate, True)
 
-        self.displayTable(cndb, sql, season, level == 1, True, True, season.finishDate if theDate is None else theDate, 5, False)
+        self.displayTable(cndb, rows, season, level == 1, True, True, season.finishDate if theDate is None else theDate, 5, False)
         self.html.addLine('</fieldset>')
 
         self.html.add('<fieldset style="display: inline-block; vertical-align: top;"><legend>')
@@ -657,11 +706,11 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('<table>')
         if theDate is None:
             # All Results.
-            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? ORDER BY THE_DATE DESC LIMIT 20;"
+            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? ORDER BY THE_DATE DESC, ID LIMIT 20;"
             params = (seasonIndex, )
         else:
             # Results up to date.
-            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC LIMIT 20;"
+            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC, ID LIMIT 20;"
             params = (seasonIndex, theDate)
 
         cursor = cndb.execute(sql, params)
@@ -704,7 +753,7 @@ class Render(walton.toolbar.IToolbar):
             self.html.addLine('</legend>')
             self.html.addLine('<table>')
             # Results after to date.
-            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE > ? ORDER BY THE_DATE LIMIT 20;"
+            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE > ? ORDER BY THE_DATE, ID LIMIT 20;"
             params = (seasonIndex, theDate)
 
             cursor = cndb.execute(sql, params)
@@ -730,9 +779,6 @@ class Render(walton.toolbar.IToolbar):
             self.html.addLine('</table>')
             self.html.addLine('</fieldset>')
 
-        # Close the database.
-        cndb.close()
-
         self.html.addLine('<fieldset><legend>Administration</legend>')
         self.html.addLine('<ul>')
         self.html.addLine('<li><a href="app:preferences">Preferences</a></li>')
@@ -979,8 +1025,8 @@ class Render(walton.toolbar.IToolbar):
         # Get the team object.
         team = self.database.getTeam(teamIndex)
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Initialise the display.
         self.html.clear()
@@ -1014,14 +1060,15 @@ class Render(walton.toolbar.IToolbar):
         # sql += "ORDER BY HOME_RESULTS.SEASON_ID DESC;"
         sql += "ORDER BY HOME_RESULTS.MAX_DATE DESC;"
 
-        self.displayTable(cndb, sql, None, False, False, False, None, 0, True, teamIndex)
+        self.displayTable(cndb, cndb.execute(sql).fetchall(), None, False, False, False, None, 0, True, teamIndex)
         self.html.addLine('</fieldset>')
         self.html.addLine('<br />')
 
         self.html.addLine('<fieldset style="display: inline-block; vertical-align: top;"><legend>Matches</legend>')
         self.html.addLine('<table>')
-        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE (HOME_TEAM_ID = ? OR AWAY_TEAM_ID = ?) AND THE_DATE >= ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;"
-        params = (teamIndex, teamIndex, startDate, finishDate)
+        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? UNION ALL "
+        sql += "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE AWAY_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;"
+        params = (teamIndex, startDate, finishDate, teamIndex, startDate, finishDate)
         cursor = cndb.execute(sql, params)
         seasonIndex = 1
         for row in cursor:
@@ -1073,8 +1120,9 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('<div style="display: inline-block; vertical-align: top;">')
 
         # Show a future matches.
-        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE (HOME_TEAM_ID = ? OR AWAY_TEAM_ID = ?) AND THE_DATE > ? ORDER BY THE_DATE LIMIT 5;"
-        params = (teamIndex, teamIndex, theDate)
+        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND THE_DATE > ? UNION ALL "
+        sql += "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE AWAY_TEAM_ID = ? AND THE_DATE > ? ORDER BY THE_DATE LIMIT 5;"
+        params = (teamIndex, theDate, teamIndex, theDate)
         cursor = cndb.execute(sql, params)
         seasonIndex = 1
         isFirst = True
@@ -1153,14 +1201,11 @@ class Render(walton.toolbar.IToolbar):
             sql += ") GROUP BY TEAM_ID) "
             sql += "ORDER BY PTS DESC, DIFF DESC, FOR DESC LIMIT 30; "
 
-            self.displayTable(cndb, sql, None, False, False, False, None, 0, False)
+            self.displayTable(cndb, cndb.execute(sql).fetchall(), None, False, False, False, None, 0, False)
             self.html.addLine('</fieldset>')
 
         self.html.addLine('</div>')
 
-        # Close the database.
-        cndb.close()
-
         # Set the page flags.
         self.nextPagePage = None
         self.previousPage = None
@@ -1172,8 +1217,8 @@ class Render(walton.toolbar.IToolbar):
         team2Index = int(parameters['team2'])
         theDate = parameters['date'] if 'date' in parameters else f'{datetime.date.today()}'
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         team1 = self.database.getTeam(team1Index)
         team2 = self.database.getTeam(team2Index)
@@ -1186,23 +1231,15 @@ class Render(walton.toolbar.IToolbar):
         self.html.add(f'<p><span class="h1">{team1.name} vs {team2.name}</span></p>')
 
         self.html.addLine('<fieldset><legend>Summary</legend>')
-        sql = "SELECT HOME_TEAM_ID, HOME_WINS, HOME_DRAWS, HOME_LOSES, HOME_FOR, HOME_AGAINST, AWAY_WINS, AWAY_DRAWS, AWAY_LOSES, AWAY_FOR, AWAY_AGAINST, 3 * (HOME_WINS + AWAY_WINS) + (HOME_DRAWS + AWAY_DRAWS) AS PTS, HOME_FOR + AWAY_FOR - HOME_AGAINST - AWAY_AGAINST AS DIFF, HOME_FOR + AWAY_FOR AS FOR, 0 AS BONUS_PTS FROM "
-        sql += "(SELECT HOME_TEAM_ID, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS HOME_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS HOME_DRAWS, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS HOME_LOSES, SUM(HOME_TEAM_FOR) AS HOME_FOR, SUM(AWAY_TEAM_FOR) AS HOME_AGAINST FROM MATCHES "
-        sql += f"WHERE ((HOME_TEAM_ID = {team1Index} AND AWAY_TEAM_ID = {team2Index}) OR (HOME_TEAM_ID = {team2Index} AND AWAY_TEAM_ID = {team1Index})) AND THE_DATE <= '{theDate}' "
-        sql += "GROUP BY HOME_TEAM_ID) AS HOME_RESULTS "
-        sql += "INNER JOIN "
-        sql += "(SELECT AWAY_TEAM_ID, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS AWAY_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS AWAY_DRAWS, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS AWAY_LOSES, SUM(AWAY_TEAM_FOR) AS AWAY_FOR, SUM(HOME_TEAM_FOR) AS AWAY_AGAINST FROM MATCHES "
-        sql += f"WHERE ((HOME_TEAM_ID = {team2Index} AND AWAY_TEAM_ID = {team1Index}) OR (HOME_TEAM_ID = {team1Index} AND AWAY_TEAM_ID = {team2Index})) AND THE_DATE <= '{theDate}' "
-        sql += "GROUP BY AWAY_TEAM_ID) AS AWAY_RESULTS "
-        sql += "ON HOME_RESULTS.HOME_TEAM_ID = AWAY_RESULTS.AWAY_TEAM_ID "
-        sql += "ORDER BY PTS DESC, DIFF DESC, FOR DESC; "
-        self.displayTable(cndb, sql, None, False, False, False, None, 0, False)
+        rows = self.database.headToHead.getSummaryTable(team1Index, team2Index, theDate)
+        self.displayTable(cndb, rows, None, False, False, False, None, 0, False)
         self.html.addLine('</fieldset>')
 
         self.html.addLine('<fieldset><legend>Matches</legend>')
         self.html.addLine('<table>')
-        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE ((HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ?) OR (HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ?)) AND THE_DATE <= ? ORDER BY THE_DATE DESC;"
-        params = (team1Index, team2Index, team2Index, team1Index, theDate)
+        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE <= ? UNION ALL "
+        sql += "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;"
+        params = (team1Index, team2Index, theDate, team2Index, team1Index, theDate)
         cursor = cndb.execute(sql, params)
         for row in cursor:
             theMatchDate = datetime.date(*time.strptime(row[0], "%Y-%m-%d")[:3])
@@ -1242,8 +1279,9 @@ class Render(walton.toolbar.IToolbar):
 
         # Show future matches.
         isFirst = True
-        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE ((HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ?) OR (HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ?)) AND THE_DATE > ? ORDER BY THE_DATE DESC;"
-        params = (team1Index, team2Index, team2Index, team1Index, theDate)
+        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE > ? UNION ALL "
+        sql += "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE > ? ORDER BY THE_DATE DESC;"
+        params = (team1Index, team2Index, theDate, team2Index, team1Index, theDate)
         cursor = cndb.execute(sql, params)
         for row in cursor:
             if isFirst:
@@ -1285,9 +1323,6 @@ class Render(walton.toolbar.IToolbar):
             self.html.addLine('</table>')
             self.html.addLine('</fieldset>')
 
-        # Close the database.
-        cndb.close()
-
         # Set the page flags.
         self.nextPagePage = None
         self.previousPage = None
@@ -1300,8 +1335,8 @@ class Render(walton.toolbar.IToolbar):
         # startDate = parameters['start_date'] if 'start_date' in parameters else None
         # finishDate = parameters['finish_date'] if 'finish_date' in parameters else None
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Initialise the display.
         self.html.clear()
@@ -1321,38 +1356,16 @@ class Render(walton.toolbar.IToolbar):
             self.html.add(f'Between {startDate} and {finishDate}')
         self.html.addLine('</legend>')
 
-        sql = "SELECT TEAM_ID, HOME_WINS, HOME_DRAWS, HOME_LOSES, HOME_FOR, HOME_AGAINST, AWAY_WINS, AWAY_DRAWS, AWAY_LOSES, AWAY_FOR, AWAY_AGAINST, 3 * (HOME_WINS + AWAY_WINS) + (HOME_DRAWS + AWAY_DRAWS) AS PTS, HOME_FOR + AWAY_FOR - HOME_AGAINST - AWAY_AGAINST AS DIFF, HOME_FOR + AWAY_FOR AS FOR, 0 AS BONUS_PTS FROM ("
-
-        # Summerise all the results.
-        sql += "SELECT HOME_TEAM_ID AS TEAM_ID, SUM(HOME_WINS) AS HOME_WINS, SUM(HOME_DRAWS) AS HOME_DRAWS, SUM(HOME_LOSES) AS HOME_LOSES, SUM(HOME_FOR) AS HOME_FOR, SUM(HOME_AGAINST) AS HOME_AGAINST, SUM(AWAY_WINS) AS AWAY_WINS, SUM(AWAY_DRAWS) AS AWAY_DRAWS, SUM(AWAY_LOSES) AS AWAY_LOSES, SUM(AWAY_FOR) AS AWAY_FOR, SUM(AWAY_AGAINST) AS AWAY_AGAINST FROM ("
-
-        # Summerise the home results.
-        sql += "SELECT HOME_TEAM_ID, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS HOME_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS HOME_DRAWS, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS HOME_LOSES, SUM(HOME_TEAM_FOR) AS HOME_FOR, SUM(AWAY_TEAM_FOR) AS HOME_AGAINST, 0 AS AWAY_WINS, 0 AS AWAY_DRAWS, 0 AS AWAY_LOSES, 0 AS AWAY_FOR, 0 AS AWAY_AGAINST FROM MATCHES "
-        if startDate is None or finishDate is None:
-            pass
-        else:
-            # Between dates.
-            sql += f"WHERE THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}' "
-        sql += "GROUP BY HOME_TEAM_ID "
-        sql += "UNION "
-        # Summeries the away results.
-        sql += "SELECT AWAY_TEAM_ID, 0, 0, 0, 0, 0, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS AWAY_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS AWAY_DRAWS, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS AWAY_LOSES, SUM(AWAY_TEAM_FOR) AS AWAY_FOR, SUM(HOME_TEAM_FOR) AS AWAY_AGAINST FROM MATCHES "
+        # Calculate the table in memory.
         if startDate is None or finishDate is None:
-            pass
+            rows = self.database.standings.getTable()
         else:
             # Between dates.
-            sql += f"WHERE THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}' "
-        sql += "GROUP BY AWAY_TEAM_ID) "
-        sql += "GROUP BY HOME_TEAM_ID) "
-        sql += "ORDER BY PTS DESC, DIFF DESC, FOR DESC; "
-        # print(sql)
+            rows = self.database.standings.getTable(None, startDate, finishDate)
 
-        self.displayTable(cndb, sql, None, level == 1, False, False, None, 0, False)
+        self.displayTable(cndb, rows, None, level == 1, False, False, None, 0, False)
         self.html.addLine('</fieldset>')
 
-        # Close the database.
-        cndb.close()
-
         # Set the page flags.
         self.nextPagePage = None
         self.previousPage = None
@@ -1409,65 +1422,11 @@ class Render(walton.toolbar.IToolbar):
             #self.html.add('</p>')
         self.html.addLine('</p>')
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
-
-        # Build a temporary table with the last results for each team.
-        cndb.execute("DROP TABLE IF EXISTS temp.LAST_RESULTS;")
-        cndb.execute("CREATE TEMP TABLE LAST_RESULTS (TEAM_ID INTEGER, HOME_WIN INTEGER, HOME_DRAW INTEGER, HOME_LOSE INTEGER, HOME_FOR INTEGER, HOME_AGN INTEGER, AWAY_WIN INTEGER, AWAY_DRAW INTEGER, AWAY_LOSE INTEGER, AWAY_FOR INTEGER, AWAY_AGN INTEGER);")
-
-        # Find the teams in the season.
-        sql = f"SELECT HOME_TEAM_ID FROM MATCHES WHERE SEASON_ID = {seasonIndex} GROUP BY HOME_TEAM_ID;"
-        cursor = cndb.execute(sql)
-        teams = []
-        for row in cursor:
-            teams.append(row[0])
-        cursor.close()
-
-        for teamIndex in teams:
-            homeWins = 0
-            homeDraw = 0
-            homeLost = 0
-            homeFor = 0
-            homeAgn = 0
-            awayWins = 0
-            awayDraw = 0
-            awayLost = 0
-            awayFor = 0
-            awayAgn = 0
-
-            sql = f"SELECT HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE (HOME_TEAM_ID = {teamIndex} OR AWAY_TEAM_ID = {teamIndex}) AND THE_DATE <= '{theDate}' ORDER BY THE_DATE DESC LIMIT 5;";
-            # print(sql)
-            cursor = cndb.execute(sql)
-            count = 0
-            pts = 0
-            for row in cursor:
-                if row[0] == teamIndex:
-                    # Home Match.
-                    homeFor += row[2]
-                    homeAgn += row[3]
-                    if row[2] == row[3]:
-                        homeDraw += 1
-                    elif row[2] > row[3]:
-                        homeWins += 1
-                    else:
-                        homeLost += 1
-                else:
-                    # Away Match.
-                    awayFor += row[3]
-                    awayAgn += row[2]
-                    if row[2] == row[3]:
-                        awayDraw += 1
-                    elif row[2] < row[3]:
-                        awayWins += 1
-                    else:
-                        awayLost += 1
-            cursor.close()
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
-            sql = f"INSERT INTO temp.LAST_RESULTS (TEAM_ID, HOME_WIN, HOME_DRAW, HOME_LOSE, HOME_FOR, HOME_AGN, AWAY_WIN, AWAY_DRAW, AWAY_LOSE, AWAY_FOR, AWAY_AGN) VALUES({teamIndex}, {homeWins}, {homeDraw}, {homeLost}, {homeFor}, {homeAgn}, {awayWins}, {awayDraw}, {awayLost}, {awayFor}, {awayAgn});"
-            # print(sql)
-            cndb.execute(sql)
-            cndb.commit()
+        # Calculate the table of the last results for each team in memory.
+        rows = self.database.form.getLastResultsTable(seasonIndex, theDate, lastResults)
 
         self.html.add('<fieldset style="display: inline-block; vertical-align: top;"><legend>')
         if theDate is None:
@@ -1476,30 +1435,7 @@ class Render(walton.toolbar.IToolbar):
             self.html.add(f'Table to {self.database.formatDate(theDate)}')
         self.html.addLine('</legend>')
 
-        sql = "SELECT TEAM_ID, HOME_WIN, HOME_DRAW, HOME_LOSE, HOME_FOR, HOME_AGN, AWAY_WIN, AWAY_DRAW, AWAY_LOSE, AWAY_FOR, AWAY_AGN, 3 * (HOME_WIN + AWAY_WIN) + (HOME_DRAW + AWAY_DRAW) AS PTS, HOME_FOR + AWAY_FOR - HOME_AGN - AWAY_AGN AS DIFF, 0 AS BONUS_PTS FROM temp.LAST_RESULTS ORDER BY PTS DESC, DIFF DESC;"
-
-        #sql = "SELECT HOME_TEAM_ID, HOME_WINS, HOME_DRAWS, HOME_LOSES, HOME_FOR, HOME_AGAINST, AWAY_WINS, AWAY_DRAWS, AWAY_LOSES, AWAY_FOR, AWAY_AGAINST, 3 * (HOME_WINS + AWAY_WINS) + (HOME_DRAWS + AWAY_DRAWS) AS PTS, HOME_FOR + AWAY_FOR - HOME_AGAINST - AWAY_AGAINST AS DIFF, HOME_FOR + AWAY_FOR AS FOR FROM "
-        #sql += "(SELECT HOME_TEAM_ID, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS HOME_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS HOME_DRAWS, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS HOME_LOSES, SUM(HOME_TEAM_FOR) AS HOME_FOR, SUM(AWAY_TEAM_FOR) AS HOME_AGAINST FROM MATCHES "
-        #if theDate is None:
-        #    # All Results
-        #    sql += f"WHERE SEASON_ID = {seasonIndex} GROUP BY HOME_TEAM_ID) AS HOME_RESULTS "
-        #else:
-        #    # Up to the date.
-        #    sql += f"WHERE SEASON_ID = {seasonIndex} AND THE_DATE <= '{theDate}' GROUP BY HOME_TEAM_ID) AS HOME_RESULTS "
-        #sql += "INNER JOIN "
-        #sql += "(SELECT AWAY_TEAM_ID, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS AWAY_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS AWAY_DRAWS, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS AWAY_LOSES, SUM(AWAY_TEAM_FOR) AS AWAY_FOR, SUM(HOME_TEAM_FOR) AS AWAY_AGAINST FROM MATCHES "
-        #if theDate is None:
-        #    # All Results.
-        #    sql += f"WHERE SEASON_ID = {seasonIndex} GROUP BY AWAY_TEAM_ID) AS AWAY_RESULTS "
-        #else:
-        #    # Update to the date.
-        #    sql += f"WHERE SEASON_ID = {seasonIndex} AND THE_DATE <= '{theDate}' GROUP BY AWAY_TEAM_ID) AS AWAY_RESULTS "
-        #sql += "ON HOME_RESULTS.HOME_TEAM_ID = AWAY_RESULTS.AWAY_TEAM_ID "
-        #sql += "ORDER BY PTS DESC, DIFF DESC, FOR DESC; "
-        # print(sql)
-        # sql .= "USING (TEAM_ID);"
-
-        self.displayTable(cndb, sql, season, level == 1, False, False, season.finishDate if theDate is None else theDate, 5, False)
+        self.displayTable(cndb, rows, season, level == 1, False, False, season.finishDate if theDate is None else theDate, 5, False)
         self.html.addLine('</fieldset>')
 
         self.html.add('<fieldset style="display: inline-block; vertical-align: top;"><legend>')
@@ -1511,11 +1447,11 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('<table>')
         if theDate is None:
             # All Results.
-            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? ORDER BY THE_DATE DESC LIMIT 20;"
+            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? ORDER BY THE_DATE DESC, ID LIMIT 20;"
             params = (seasonIndex, )
         else:
             # Results up to date.
-            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC LIMIT 20;"
+            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC, ID LIMIT 20;"
             params = (seasonIndex, theDate)
 
         cursor = cndb.execute(sql, params)
@@ -1558,7 +1494,7 @@ class Render(walton.toolbar.IToolbar):
             self.html.addLine('</legend>')
             self.html.addLine('<table>')
             # Results after to date.
-            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE > ? ORDER BY THE_DATE LIMIT 20;"
+            sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE > ? ORDER BY THE_DATE, ID LIMIT 20;"
             params = (seasonIndex, theDate)
 
             cursor = cndb.execute(sql, params)
@@ -1584,9 +1520,6 @@ class Render(walton.toolbar.IToolbar):
             self.html.addLine('</table>')
             self.html.addLine('</fieldset>')
 
-        # Close the database.
-        cndb.close()
-
         # Set the page flags.
         self.levels = None
         self.clipboardText = None
@@ -1599,8 +1532,8 @@ class Render(walton.toolbar.IToolbar):
         self.displayToolbar(Render.TOOLBAR_INITIAL_SHOW, None, None, None, False, False, False)
         self.html.add(f'<p><span class="h1">Subset of Teams</span></p>')
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Group the date selector and table.
         self.html.addLine('<div style="display: inline-block; vertical-align: top;">')
@@ -1617,40 +1550,30 @@ class Render(walton.toolbar.IToolbar):
             finishDate = datetime.date.today()
 
         if 'exclude' in parameters:
-            sql = f"UPDATE TEAMS SET SUB_GROUP = 0 WHERE ID = {parameters['exclude']}"
-            cndb.execute(sql)
-            cndb.commit()
+            sql = "UPDATE TEAMS SET SUB_GROUP = 0 WHERE ID = ?;"
+            with self.database.writer() as cndbWriter:
+                cndbWriter.execute(sql, (int(parameters['exclude']), ))
         if 'include' in parameters:
-            sql = f"UPDATE TEAMS SET SUB_GROUP = 1 WHERE ID = {parameters['include']}"
-            cndb.execute(sql)
-            cndb.commit()
+            sql = "UPDATE TEAMS SET SUB_GROUP = 1 WHERE ID = ?;"
+            with self.database.writer() as cndbWriter:
+                cndbWriter.execute(sql, (int(parameters['include']), ))
+        if 'exclude' in parameters or 'include' in parameters:
+            self.database.pageCache.invalidate(request='table_subset')
 
         self.html.add('<fieldset style="display: inline-block; vertical-align: top;"><legend>')
         self.html.add(f'Table between {startDate} and {finishDate}')
         self.html.addLine('</legend>')
 
-        sql = "SELECT TEAM_ID, HOME_WINS, HOME_DRAWS, HOME_LOSES, HOME_FOR, HOME_AGAINST, AWAY_WINS, AWAY_DRAWS, AWAY_LOSES, AWAY_FOR, AWAY_AGAINST, 3 * (HOME_WINS + AWAY_WINS) + (HOME_DRAWS + AWAY_DRAWS) AS PTS, HOME_FOR + AWAY_FOR - HOME_AGAINST - AWAY_AGAINST AS DIFF, HOME_FOR + AWAY_FOR AS FOR, 0 AS BONUS_PTS FROM ("
-
-        # Summerise all the results.
-        sql += "SELECT TEAM_ID, SUM(HOME_WINS) AS HOME_WINS, SUM(HOME_DRAWS) AS HOME_DRAWS, SUM(HOME_LOSES) AS HOME_LOSES, SUM(HOME_FOR) AS HOME_FOR, SUM(HOME_AGAINST) AS HOME_AGAINST, SUM(AWAY_WINS) AS AWAY_WINS, SUM(AWAY_DRAWS) AS AWAY_DRAWS, SUM(AWAY_LOSES) AS AWAY_LOSES, SUM(AWAY_FOR) AS AWAY_FOR, SUM(AWAY_AGAINST) AS AWAY_AGAINST FROM ("
-
-        # Summerise all the home results.
-        sql += "SELECT HOME_TEAM_ID AS TEAM_ID, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS HOME_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS HOME_DRAWS, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS HOME_LOSES, SUM(HOME_TEAM_FOR) AS HOME_FOR, SUM(AWAY_TEAM_FOR) AS HOME_AGAINST, 0 AS AWAY_WINS, 0 AS AWAY_DRAWS, 0 AS AWAY_LOSES, 0 AS AWAY_FOR, 0 AS AWAY_AGAINST FROM MATCHES INNER JOIN TEAMS AS HOME_TEAM ON MATCHES.HOME_TEAM_ID = HOME_TEAM.ID  INNER JOIN TEAMS AS AWAY_TEAM ON MATCHES.AWAY_TEAM_ID = AWAY_TEAM.ID "
-
-        sql += f"WHERE THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}' AND HOME_TEAM.SUB_GROUP = 1 AND AWAY_TEAM.SUB_GROUP = 1 GROUP BY HOME_TEAM_ID "
-
-        sql += "UNION "
-        # Summerise all the away results.
-        sql += "SELECT AWAY_TEAM_ID AS TEAM_ID, 0 AS AWAY_WINS, 0 AS AWAY_DRAWS, 0 AS AWAY_LOSES, 0 AS AWAY_FOR, 0 AS AWAY_AGAINST, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR) AS AWAY_WINS, SUM(HOME_TEAM_FOR = AWAY_TEAM_FOR) AS AWAY_DRAWS, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR) AS AWAY_LOSES, SUM(AWAY_TEAM_FOR) AS AWAY_FOR, SUM(HOME_TEAM_FOR) AS AWAY_AGAINST FROM MATCHES INNER JOIN TEAMS AS HOME_TEAM ON MATCHES.HOME_TEAM_ID = HOME_TEAM.ID  INNER JOIN TEAMS AS AWAY_TEAM ON MATCHES.AWAY_TEAM_ID = AWAY_TEAM.ID "
-
-        sql += f"WHERE THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}' AND HOME_TEAM.SUB_GROUP = 1 AND AWAY_TEAM.SUB_GROUP = 1 GROUP BY AWAY_TEAM_ID "
-
-        sql += ") GROUP BY TEAM_ID) "
-        sql += "ORDER BY PTS DESC, DIFF DESC, FOR DESC; "
+        # Identify the teams in the subset.
+        sql = "SELECT ID FROM TEAMS WHERE SUB_GROUP = 1;"
+        cursor = cndb.execute(sql)
+        subsetTeams = set(row[0] for row in cursor)
+        cursor.close()
 
-        # print(sql)
+        # Calculate the table in memory from the matches between the teams in the subset.
+        rows = self.database.standings.getTable(None, startDate, finishDate, False, subsetTeams)
 
-        self.displayTable(cndb, sql, None, False, False, False, None, 0, False)
+        self.displayTable(cndb, rows, None, False, False, False, None, 0, False)
         self.html.addLine('</fieldset>')
 
         self.html.addLine('</div>')
@@ -1667,14 +1590,16 @@ class Render(walton.toolbar.IToolbar):
             includedTeams.append([row[0], row[1]])
 
         # Fetch their points.
+        positionMatrix = self.database.standings.getPositionMatrix(startDate, finishDate)
         maxMatches = 1
         maxPoints = 1
         for team in includedTeams:
 
 
             '''
-            sql = f"SELECT HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE (HOME_TEAM_ID = {team[0]} OR AWAY_TEAM_ID = {team[0]}) AND (THE_DATE >= '{startDate}' AND THE_DATE <= '{finishDate}') ORDER BY THE_DATE;"
-            cursor = cndb.execute(sql)
+            sql = "SELECT HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, THE_DATE FROM MATCHES WHERE HOME_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? UNION ALL "
+            sql += "SELECT HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, THE_DATE FROM MATCHES WHERE AWAY_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? ORDER BY THE_DATE;"
+            cursor = cndb.execute(sql, (team[0], startDate, finishDate, team[0], startDate, finishDate))
             listPts = []
             totalPts = 0
             for row in cursor:
@@ -1694,7 +1619,7 @@ class Render(walton.toolbar.IToolbar):
                 totalPts += pts
                 listPts.append(totalPts)
             '''
-            listPts = self.database.getArrayTeamPts(team[0], startDate, finishDate)
+            listPts = positionMatrix.getPoints(team[0])
             team.append(listPts)
 
             if len(listPts) > 0:
@@ -1783,9 +1708,6 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('<p>')
         self.html.addLine('</fieldset>')
 
-        # Close the database.
-        cndb.close()
-
 
 
     def showTeamSeason(self, parameters):
@@ -1815,15 +1737,16 @@ class Render(walton.toolbar.IToolbar):
         else:
             finishDate = season.finishDate
 
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Show the matches.
         lastTeamPlayedIdx = None
         self.html.addLine('<fieldset style="display: inline-block; vertical-align: top;"><legend>Matches</legend>')
         self.html.addLine('<table>')
-        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE (HOME_TEAM_ID = ? OR AWAY_TEAM_ID = ?) AND THE_DATE >= ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;"
-        params = (teamIndex, teamIndex, season.startDate, finishDate)
+        sql = "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? UNION ALL "
+        sql += "SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE AWAY_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;"
+        params = (teamIndex, season.startDate, finishDate, teamIndex, season.startDate, finishDate)
         cursor = cndb.execute(sql, params)
         for row in cursor:
             theMatchDate = datetime.date(*time.strptime(row[0], "%Y-%m-%d")[:3])
@@ -1867,17 +1790,19 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('</table>')
         self.html.addLine('</fieldset>')
 
+        # Get the points and league positions for every team in the league.
+        positionMatrix = self.database.standings.getPositionMatrix(season.startDate, finishDate)
+
         # Get the list of points for this team.
-        listPts = self.database.getArrayTeamPts(teamIndex, season.startDate, finishDate)
+        listPts = positionMatrix.getPoints(teamIndex)
 
         # Get the points for the other teams in the league.
-        listTeams = self.database.getListTeams(season.startDate, finishDate)
+        listTeams = positionMatrix.teams
 
         otherTeams = []
         for otherTeamIndex in listTeams:
             if otherTeamIndex != teamIndex:
-                otherTeamListPts = self.database.getArrayTeamPts(otherTeamIndex, season.startDate, finishDate)
-                otherTeams.append([otherTeamIndex, '', otherTeamListPts])
+                otherTeams.append([otherTeamIndex, '', positionMatrix.getPoints(otherTeamIndex)])
 
         numMatches = len(listPts)
         numPositions = len(listTeams)
@@ -1902,24 +1827,11 @@ class Render(walton.toolbar.IToolbar):
         height = svgHeight
         # self.html.addLine(f'<rect x="{0}" y="{0}" width="{width}" height="{height}" style="fill: white; stroke: black; stroke-width: 1;" />')
 
+        listPositions = positionMatrix.getPositions(teamIndex)
         count = 1
         for matchIndex in range(numMatches):
-            # Count the better positions.
-            count = 1
-            for otherTeam in otherTeams:
-                otherTeamListPts = otherTeam[2]
-                if len(otherTeamListPts) > matchIndex:
-                    otherTeamMatchIndex = matchIndex
-                else:
-                    otherTeamMatchIndex = len(otherTeamListPts) - 1
-                if otherTeamListPts[otherTeamMatchIndex] > listPts[matchIndex]:
-                    count += 1
-                    #otherTeam = self.database.getTeam(otherTeam[0])
-                    #print(f'{otherTeam.name} {otherTeamListPts[matchIndex]} > {listPts[matchIndex]}')
-                elif otherTeamListPts[otherTeamMatchIndex] == listPts[matchIndex]:
-                    count += 0.5
-                    #otherTeam = self.database.getTeam(otherTeam[0])
-                    #print(f'{otherTeam.name} {otherTeamListPts[matchIndex]} == {listPts[matchIndex]}')
+            # The position counting the better teams and half the level teams.
+            count = listPositions[matchIndex]
             # print (f'matchIndex = {matchIndex}, count = {count}')
             # Draw the box.
             x = matchIndex * boxWidth
@@ -2010,6 +1922,16 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('</select>')
         otherTeam = self.database.getTeam(otherTeams[opponentIndex][0])
         self.html.addLine(otherTeam.toHtml())
+
+        # Show the results against the opponent from the head to head matrix of the season.
+        headToHead = self.database.headToHead.getMatrix(seasonIndex)
+        results = []
+        for label, homeTeamIndex, awayTeamIndex in (('Home', teamIndex, otherTeam.index), ('Away', otherTeam.index, teamIndex)):
+            for matchIndex, theDate, homeFor, awayFor in headToHead.getMatches(homeTeamIndex, awayTeamIndex, finishDate.toordinal()):
+                if homeFor is not None and awayFor is not None:
+                    results.append(f'{label} {homeFor}-{awayFor}')
+        if len(results) > 0:
+            self.html.addLine(f'<br />{", ".join(results)}')
         self.html.addLine('</form>')
         self.html.addLine('</fieldset>')
         self.html.addLine('<br/>')
@@ -2180,6 +2102,10 @@ class Render(walton.toolbar.IToolbar):
 
         self.html.addLine(f'<svg width="{svgWidth}" height="{svgHeight}" style="vertical-align: top; border: 1px solid black;" xmlns="http://www.w3.org/2000/svg" version="1.1">')
 
+        # The results against each team are in the head to head matrix of the season.
+        headToHead = self.database.headToHead.getMatrix(seasonIndex)
+        finishOrdinal = finishDate.toordinal()
+
         # Label the rows.
         for index in range(len(otherTeams)):
             otherTeam = self.database.getTeam(otherTeams[index][0])
@@ -2192,33 +2118,25 @@ class Render(walton.toolbar.IToolbar):
             badPts = 0
 
             # Get the home results.
-            sql = f"SELECT HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE HOME_TEAM_ID = {team.index} AND AWAY_TEAM_ID = {otherTeam.index} AND THE_DATE >= '{season.startDate}' AND THE_DATE <= '{finishDate}';"
-            cursor = cndb.execute(sql)
-            row = cursor.fetchone()
-            cursor.close()
-
-            if row is None:
+            matches = headToHead.getMatches(team.index, otherTeam.index, finishOrdinal)
+            if len(matches) == 0 or matches[0][2] is None or matches[0][3] is None:
                 availablePts += 3
-            elif row[0] == row[1]:
+            elif matches[0][2] == matches[0][3]:
                 goodPts += 1
                 badPts += 1
-            elif row[0] > row[1]:
+            elif matches[0][2] > matches[0][3]:
                 goodPts += 3
             else:
                 badPts += 3
 
             # Get the away results.
-            sql = f"SELECT HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE HOME_TEAM_ID = {otherTeam.index} AND AWAY_TEAM_ID = {team.index} AND THE_DATE >= '{season.startDate}' AND THE_DATE <= '{finishDate}';"
-            cursor = cndb.execute(sql)
-            row = cursor.fetchone()
-            cursor.close()
-
-            if row is None:
+            matches = headToHead.getMatches(otherTeam.index, team.index, finishOrdinal)
+            if len(matches) == 0 or matches[0][2] is None or matches[0][3] is None:
                 availablePts += 3
-            elif row[0] == row[1]:
+            elif matches[0][2] == matches[0][3]:
                 goodPts += 1
                 badPts += 1
-            elif row[0] > row[1]:
+            elif matches[0][2] > matches[0][3]:
                 badPts += 3
             else:
                 goodPts += 3
@@ -2253,7 +2171,7 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('</fieldset>')
 
         # Get the list of points for this team without bonus points.
-        listPts = self.database.getArrayTeamPts(teamIndex, season.startDate, finishDate, False)
+        listPts = self.database.standings.getPositionMatrix(season.startDate, finishDate, False).getPoints(teamIndex)
 
         # Draw a graph of the points prediction.
         self.html.addLine(f'<fieldset style="display: inline-block; vertical-align: top;"><legend>Points Prediction</legend>')
@@ -2279,6 +2197,36 @@ class Render(walton.toolbar.IToolbar):
         self.html.addLine('</table>')
         self.html.addLine('</fieldset>')
 
+        # Draw a graph of the probable finishing positions from the remaining fixtures.
+        # The season seeds the simulation so that the page is the same each time it is shown or exported.
+        simulation = self.database.simulator.simulate(season, finishDate, seed=season.index)
+        if simulation.numFixtures > 0 and teamIndex in simulation.positions:
+            self.html.addLine(f'<fieldset style="display: inline-block; vertical-align: top;"><legend>Finishing Position</legend>')
+            self.html.addLine('<table>')
+            for position, probability in enumerate(simulation.positions[teamIndex]):
+                if probability < 0.0005:
+                    continue
+                colour = 'yellow'
+                if season.goodPos is not None and position < season.goodPos:
+                    colour = 'green'
+                elif season.positivePos is not None and position < season.positivePos:
+                    colour = '#CCFFCC'
+                elif season.badPos is not None and position >= season.badPos:
+                    colour = 'red'
+                self.html.add(f'<tr><td style="text-align: right;">{position + 1}</td><td>')
+                self.html.add(f'<svg width="200" height="{boxHeight}" style="vertical-align: top;" xmlns="http://www.w3.org/2000/svg" version="1.1">')
+                self.html.add(f'<rect x="0" y="0" width="{200 * probability:.1f}" height="{boxHeight}" style="fill: {colour};" />')
+                self.html.add('</svg>')
+                self.html.addLine(f'</td><td style="text-align: right;">{100 * probability:.1f}%</td></tr>')
+            self.html.addLine('</table>')
+            zones = simulation.zones[teamIndex]
+            self.html.addLine(f'<p>Expected position {simulation.getExpectedPosition(teamIndex):.1f}.<br />')
+            self.html.addLine(f'Good {100 * zones["good"]:.1f}%, positive {100 * zones["positive"]:.1f}%, bad {100 * zones["bad"]:.1f}%.<br />')
+            self.html.addLine(f'<span style="font-size: 8pt;">{simulation.numSimulations:,} simulations of {simulation.numFixtures} matches.</span></p>')
+            if self.application.debug:
+                print(f'{simulation.numSimulations:,} simulations of {simulation.numFixtures} matches at {simulation.simulationsPerSecond:,.0f} per second with {simulation.numProcesses} processes.')
+            self.html.addLine('</fieldset>')
+
         # Draw a graph of the type of results.
         self.html.addLine(f'<fieldset style="display: inline-block; vertical-align: top;"><legend>Result Distribution</legend>')
         self.displayGraphTypeResults(cndb, teamIndex, season.startDate, finishDate, -4, +4, 5)
@@ -2286,13 +2234,15 @@ class Render(walton.toolbar.IToolbar):
 
         self.html.addLine('</div>')
 
-        # Close the database.
-        cndb.close()
-
 
 
     def getTypeResultsData(self, cndb, teamIndex, startDate, finishDate, minScore, maxScore, maxCount):
         ''' Get the data for a type results graph. '''
+        if self.database.matchStore.isEnabled:
+            # Count the results in the match columns.
+            resultTypes = self.database.matchStore.getResultTypes(teamIndex, startDate, finishDate, minScore, maxScore)
+            return resultTypes, max(maxCount, max(resultTypes.values()))
+
         resultTypes = {}
         for resultType in range(minScore, maxScore + 1):
             resultTypes[resultType] = 0
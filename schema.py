@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to manage the indexes of the table database.
+This module implements the :py:class:`SchemaManager` class.
+'''
+
+
+
+class SchemaManager:
+    '''
+    Class to make sure that the table database has the indexes for the frequent queries.
+    The indexes cover the columns of the queries so that the matches are read from the index alone.
+
+    :ivar Database database: The :py:class:`~database.Database` that owns the connections.
+    :ivar list created: The names of the indexes created or rebuilt by :py:func:`ensureIndexes`.
+    '''
+    # The covering indexes on the MATCHES table.
+    INDEXES = {
+        'IX_MATCHES_SEASON_DATE'    : ('SEASON_ID', 'THE_DATE', 'THE_DATE_GUESS', 'HOME_TEAM_ID', 'AWAY_TEAM_ID', 'HOME_TEAM_FOR', 'AWAY_TEAM_FOR', 'REAL_HOME_TEAM_FOR', 'REAL_AWAY_TEAM_FOR'),
+        'IX_MATCHES_HOME_DATE'      : ('HOME_TEAM_ID', 'THE_DATE', 'AWAY_TEAM_ID', 'HOME_TEAM_FOR', 'AWAY_TEAM_FOR', 'HOME_BONUS_PTS', 'THE_DATE_GUESS', 'SEASON_ID'),
+        'IX_MATCHES_AWAY_DATE'      : ('AWAY_TEAM_ID', 'THE_DATE', 'HOME_TEAM_ID', 'HOME_TEAM_FOR', 'AWAY_TEAM_FOR', 'AWAY_BONUS_PTS', 'THE_DATE_GUESS', 'SEASON_ID'),
+        'IX_MATCHES_PAIR_DATE'      : ('HOME_TEAM_ID', 'AWAY_TEAM_ID', 'THE_DATE', 'HOME_TEAM_FOR', 'AWAY_TEAM_FOR', 'THE_DATE_GUESS', 'SEASON_ID'),
+    }
+
+    # The frequent queries and example parameters.  None of these should scan the MATCHES table.
+    HOT_QUERIES = (
+        ("SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC, ID LIMIT 20;", (1, '2000-01-01')),
+        ("SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, REAL_HOME_TEAM_FOR, REAL_AWAY_TEAM_FOR FROM MATCHES WHERE SEASON_ID = ? AND THE_DATE > ? ORDER BY THE_DATE, ID LIMIT 20;", (1, '2000-01-01')),
+        ("SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? UNION ALL SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE AWAY_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;", (1, '2000-01-01', '2000-01-01', 1, '2000-01-01', '2000-01-01')),
+        ("SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE <= ? UNION ALL SELECT THE_DATE, THE_DATE_GUESS, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, SEASON_ID FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE <= ? ORDER BY THE_DATE DESC;", (1, 2, '2000-01-01', 2, 1, '2000-01-01')),
+        ("SELECT HOME_TEAM_FOR, AWAY_TEAM_FOR FROM MATCHES WHERE HOME_TEAM_ID = ? AND AWAY_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ?;", (1, 2, '2000-01-01', '2000-01-01')),
+        ("SELECT HOME_TEAM_ID, SUM(HOME_TEAM_FOR > AWAY_TEAM_FOR), SUM(HOME_BONUS_PTS), SEASON_ID, MAX(THE_DATE) FROM MATCHES WHERE HOME_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? GROUP BY SEASON_ID;", (1, '2000-01-01', '2000-01-01')),
+        ("SELECT AWAY_TEAM_ID, SUM(HOME_TEAM_FOR < AWAY_TEAM_FOR), SUM(AWAY_BONUS_PTS), SEASON_ID, MAX(THE_DATE) FROM MATCHES WHERE AWAY_TEAM_ID = ? AND THE_DATE >= ? AND THE_DATE <= ? GROUP BY SEASON_ID;", (1, '2000-01-01', '2000-01-01')),
+    )
+
+
+
+    def __init__(self, database):
+        '''
+        Class constructor for the :py:class:`SchemaManager` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` that owns the connections.
+        '''
+        self.database = database
+        self.created = []
+
+
+
+    def ensureIndexes(self):
+        '''
+        Create any missing indexes and rebuild any indexes with the wrong columns.
+        ANALYZE is run when an index changes or the database has never been analysed.
+        Returns True if the database was changed.
+        '''
+        cndb = self.database.getConnection()
+        columns = set(row[1] for row in cndb.execute('PRAGMA table_info(MATCHES);'))
+        if len(columns) == 0:
+            return False
+
+        # Find the indexes that are missing or different.
+        changes = {}
+        for name, indexColumns in SchemaManager.INDEXES.items():
+            indexColumns = tuple(column for column in indexColumns if column in columns)
+            existing = tuple(row[2] for row in cndb.execute(f'PRAGMA index_info({name});'))
+            if existing != indexColumns:
+                changes[name] = indexColumns
+        isAnalysed = cndb.execute("SELECT COUNT(*) FROM sqlite_master WHERE NAME = 'sqlite_stat1';").fetchone()[0] > 0
+        if len(changes) == 0 and isAnalysed:
+            return False
+
+        with self.database.writer() as cndbWriter:
+            for name, indexColumns in changes.items():
+                cndbWriter.execute(f'DROP INDEX IF EXISTS {name};')
+                cndbWriter.execute(f'CREATE INDEX {name} ON MATCHES ({", ".join(indexColumns)});')
+                self.created.append(name)
+            cndbWriter.execute('ANALYZE;')
+
+        # The reader connection has already loaded the old statistics and would still plan scans of the MATCHES table.  This reloads them.
+        cndb.execute('ANALYZE sqlite_master;')
+        return True
+
+
+
+    def getFullScans(self):
+        '''
+        Returns the list of the :py:attr:`HOT_QUERIES` that scan the MATCHES table rather than search an index.
+        Each item is the query and the query plan.
+        '''
+        cndb = self.database.getConnection()
+        scans = []
+        for sql, params in SchemaManager.HOT_QUERIES:
+            plan = [row[-1] for row in cndb.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+            # 'SEARCH' is an index lookup.  'SCAN' reads the whole table or the whole index.
+            if any(detail.startswith('SCAN MATCHES') for detail in plan):
+                scans.append((sql, plan))
+        return scans
@@ -5,14 +5,6 @@ Module to support seasons in the table program.
 Each team is a row from the SEASONS table in the table database.
 '''
 
-# Require the Sqlite3 library
-try:
-    import sqlite3
-except:
-    print("pysqlite is not available");
-    print("Try package python-sqlite2");
-    sys.exit(1)
-
 import datetime
 import time
 
@@ -32,6 +24,11 @@ class Season:
     :ivar datetime.date finishDate: The finish date for this season.
     :ivar string comments: Optional additional text description of the team.
     '''
+    # The seasons are held by the :py:class:`~registry.Registry` so keep them small.
+    __slots__ = ('database', 'index', 'name', 'comments', 'startDate', 'finishDate', 'numMatches', 'goodPos', 'badPos', 'positivePos', 'winPts', 'drawPts', '_html')
+
+    # The columns of the SEASONS table in the order of :py:func:`setRow`.
+    COLUMNS = 'ID, LABEL, START_DATE, FINISH_DATE, COMMENTS, NUM_MATCHES, GOOD_POS, BAD_POS, POSITIVE_POS, WIN_PTS, DRAW_PTS'
 
 
 
@@ -53,10 +50,6 @@ class Season:
         self.startDate = None
         # The finish date of the season.
         self.finishDate = None
-        # The index of the next season.
-        self._nextSeasonIndex = None
-        # The index of the previous season.
-        self._previousSeasonIndex = None
         # Number of matches this season.
         self.numMatches = None
         # A good finish position.
@@ -65,11 +58,20 @@ class Season:
         self.badPos = None
         # A not quite as good finish position.
         self.positivePos = None
+        # The points for a win.
+        self.winPts = None
+        # The points for a draw.
+        self.drawPts = None
+        # The html from :py:func:`toHtml`.
+        self._html = None
 
 
 
     def toHtml(self):
         ''' Returns the season name in html format. '''
+        if self._html is not None:
+            return self._html
+
         # Add a link.
         html = '<a href="app:home?season={}">'.format(self.index)
 
@@ -79,6 +81,7 @@ class Season:
         html += '</a>'
 
         # Return the construction
+        self._html = html
         return html
 
 
@@ -88,8 +91,8 @@ class Season:
         # Default to an empty dictionary.
         links = {}
 
-        # Open the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Fetch the links.
         sql = 'SELECT LABEL, URL FROM LINKS WHERE TYPE_ID = 2 AND KEY_ID = ?;'
@@ -99,9 +102,6 @@ class Season:
             links[row[0]] = row[1]
         cursor.close()
 
-        # Close the database.
-        cndb.close()
-
         # Return the links found.
         return links
 
@@ -113,11 +113,11 @@ class Season:
 
         :param int seasonIndex: Specifies the index of the season to read.
         '''
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # sql = 'SELECT Name, CountryID, DoB, DoD, FirstYear, LastYear, Comments, InternetURL FROM Teams WHERE ID = ?;'
-        sql = 'SELECT LABEL, START_DATE, FINISH_DATE, COMMENTS, NUM_MATCHES, GOOD_POS, BAD_POS, POSITIVE_POS FROM SEASONS WHERE ID = ?;'
+        sql = f'SELECT {Season.COLUMNS} FROM SEASONS WHERE ID = ?;'
         params = (seasonIndex, )
         cursor = cndb.execute(sql, params)
         row = cursor.fetchone()
@@ -128,42 +128,28 @@ class Season:
             print(params)
             return None
 
-        self.index = seasonIndex
-        self.name = row[0]
-        self.startDate = datetime.date(*time.strptime(row[1], "%Y-%m-%d")[:3]) if row[1] is not None else None
-        self.finishDate = datetime.date(*time.strptime(row[2], "%Y-%m-%d")[:3]) if row[2] is not None else None
-        self.comments = row[3]
-        self.numMatches = 0 if row[4] is None else int(row[4])
-        self.goodPos = 0 if row[5] is None else int(row[5])
-        self.badPos = 0 if row[6] is None else int(row[6])
-        self.positivePos = 0 if row[7] is None else int(row[7])
-
-        # For debugging.
-        # TODO: Calculate this.
-        if self.index == 1:
-            self._previousSeasonIndex = 2
-            self._nextSeasonIndex = 4
-        elif self.index == 2:
-            self._nextSeasonIndex = 1
-            self._previousSeasonIndex = 3
-        elif self.index == 3:
-            self._nextSeasonIndex = 2
-            self._previousSeasonIndex = 5
-        elif self.index == 4:
-            self._previousSeasonIndex = 1
-            self._nextSeasonIndex = 6
-        elif self.index == 5:
-            self._previousSeasonIndex = None
-            self._nextSeasonIndex = 3
-        elif self.index == 6:
-            self._previousSeasonIndex = 4
-            self._nextSeasonIndex = 7
-        elif self.index == 7:
-            self._previousSeasonIndex = 6
-            self._nextSeasonIndex = None
-
-        # Close the database.
-        cndb.close()
+        self.setRow(row)
+
+
+
+    def setRow(self, row):
+        '''
+        Set this season from a row of the SEASONS table.
+
+        :param tuple row: Specifies the row with the :py:attr:`COLUMNS` of the SEASONS table.
+        '''
+        self.index = row[0]
+        self.name = row[1]
+        self.startDate = datetime.date(*time.strptime(row[2], "%Y-%m-%d")[:3]) if row[2] is not None else None
+        self.finishDate = datetime.date(*time.strptime(row[3], "%Y-%m-%d")[:3]) if row[3] is not None else None
+        self.comments = row[4]
+        self.numMatches = 0 if row[5] is None else int(row[5])
+        self.goodPos = 0 if row[6] is None else int(row[6])
+        self.badPos = 0 if row[7] is None else int(row[7])
+        self.positivePos = 0 if row[8] is None else int(row[8])
+        self.winPts = row[9]
+        self.drawPts = row[10]
+        self._html = None
 
 
 
@@ -171,6 +157,9 @@ class Season:
         ''' Write this season into the database. '''
         if self.database.application.debug:
             print('Season::write()')
+
+        # The name may have changed.
+        self._html = None
         if self.index == -1:
             # Write a new record.
             sql = 'INSERT INTO SEASONS (Name, SportID, CountryID, FirstYear, LastYear, DoB, DoD, Comments, InternetURL) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);'
@@ -184,23 +173,21 @@ class Season:
             print(sql)
             print(params)
 
-        # Open the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the writer connection to the database.
+        with self.database.writer() as cndb:
+            # Execute the command.
+            cursor = cndb.execute(sql, params)
 
-        # Execute the command.
-        cursor = cndb.execute(sql, params)
-        cndb.commit()
-
-        # Load the index if it not known.
-        if self.index == -1:
-            sql = "SELECT MAX(ID) FROM SEASONS;"
-            cursor = cndb.execute(sql)
-            row = cursor.fetchone()
-            cursor.close()
-            self.index = row[0]
+            # Load the index if it not known.
+            if self.index == -1:
+                sql = "SELECT MAX(ID) FROM SEASONS;"
+                cursor = cndb.execute(sql)
+                row = cursor.fetchone()
+                cursor.close()
+                self.index = row[0]
 
-        # Close the database.
-        cndb.close()
+        # The dates may have changed.
+        self.database.timeline.invalidate()
 
         # Return success.
         return True
@@ -208,15 +195,11 @@ class Season:
 
 
     def getNextSeasonIndex(self):
-        ''' Returns the index of the next season or none. '''
-        if self._nextSeasonIndex is not None:
-            return self._nextSeasonIndex
-        return None
+        ''' Returns the index of the next season or none.  The seasons are ordered by the :py:class:`~timeline.SeasonTimeline`. '''
+        return self.database.timeline.getNextSeasonIndex(self.index)
 
 
 
     def getPreviousSeasonIndex(self):
-        '''  Returns the index of the previous season or none. '''
-        if self._previousSeasonIndex is not None:
-            return self._previousSeasonIndex
-        return None
+        '''  Returns the index of the previous season or none.  The seasons are ordered by the :py:class:`~timeline.SeasonTimeline`. '''
+        return self.database.timeline.getPreviousSeasonIndex(self.index)
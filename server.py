@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to serve the pages of the table program over http.
+This module implements the :py:class:`PageServer` class.
+
+The connections are handled by asyncio and the pages are built by a pool of worker threads.
+Each worker thread has its own :py:class:`~render.Render` object and its own read only connection,
+so concurrent requests do not share an html buffer.
+'''
+
+# System libraries.
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+# Application libraries.
+from render import Render
+
+
+
+# The requests that can be served.
+SERVED_REQUESTS = ('home', 'index', 'show_team', 'head', 'table_teams', 'table_last', 'table_subset', 'show_team_season')
+
+# The parameters that change the database.  These are removed because the server is read only.
+WRITE_PARAMETERS = ('include', 'exclude')
+
+# Pattern to find the local links in a page.
+APP_LINK = re.compile(r'(href|action)="app:')
+
+# The patterns for the values of the parameters.
+INTEGER = re.compile(r'\d{1,9}')
+DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+# The parameters that the served pages read and the pattern for their values.  None allows any value.
+PARAMETERS = {
+    'season'        : INTEGER,
+    'id'            : INTEGER,
+    'team'          : INTEGER,
+    'team1'         : INTEGER,
+    'team2'         : INTEGER,
+    'opponent'      : INTEGER,
+    'level'         : INTEGER,
+    'last'          : INTEGER,
+    'date_type'     : INTEGER,
+    'tournamentid'  : INTEGER,
+    'flags'         : INTEGER,
+    'firstyear'     : INTEGER,
+    'lastyear'      : INTEGER,
+    'date'          : DATE,
+    'start_date'    : DATE,
+    'finish_date'   : DATE,
+    'show_date'     : None,
+    'age'           : None,
+    'update'        : None,
+}
+
+# The parameters that each request must have.
+REQUIRED_PARAMETERS = {'head': ('team1', 'team2')}
+
+# The status text for each response code.
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+
+def checkParameters(request, parameters):
+    '''
+    Returns a message that describes the first problem with the parameters or None if the parameters are valid for the request.
+
+    :param string request: Specifies the request that will use the parameters.
+    :param dict parameters: Specifies the parameters from the url.
+    '''
+    for key, value in parameters.items():
+        if key not in PARAMETERS:
+            return f'Unknown parameter \'{key}\'.'
+        pattern = PARAMETERS[key]
+        if pattern is None:
+            continue
+        if pattern.fullmatch(value) is None:
+            return f'Bad value \'{value}\' for \'{key}\'.'
+        if pattern is DATE:
+            # The pattern allows dates that are not on the calendar.
+            try:
+                datetime.date.fromisoformat(value)
+            except ValueError:
+                return f'Bad date \'{value}\' for \'{key}\'.'
+
+    for key in REQUIRED_PARAMETERS.get(request, ()):
+        if key not in parameters:
+            return f'Missing parameter \'{key}\'.'
+    return None
+
+
+
+class PageServer:
+    '''
+    Class to serve the :py:attr:`~render.Render.actions` pages as html and the table data as json.
+    The url '/home?season=2' is the same page as the link 'app:home?season=2'.
+    The urls '/home.json' and '/table_last.json' return the table data with the same parameters.
+    The style sheets are served from '/styles/'.
+
+    :ivar Application application: The :py:class:`~application.Application` object that owns the database.
+    :ivar string host: The address to listen on.
+    :ivar int port: The port to listen on.
+    :ivar int numWorkers: The number of worker threads that build the pages.
+    :ivar int requestCount: The number of requests served.
+    '''
+
+
+
+    def __init__(self, application, host, port, numWorkers=None):
+        '''
+        Class constructor for the :py:class:`PageServer` class.
+
+        :param Application application: Specifies the :py:class:`~application.Application` object that owns the database.
+        :param string host: Specifies the address to listen on.
+        :param int port: Specifies the port to listen on.
+        :param int numWorkers: Optionally specify the number of worker threads.  The default is the number of processors.
+        '''
+        self.application = application
+        self.host = host
+        self.port = port
+        self.numWorkers = numWorkers if numWorkers is not None else (os.cpu_count() or 1)
+        self.requestCount = 0
+
+        # The worker threads are already in parallel so the simulator should not fork processes from them.
+        application.database.simulator.numProcesses = 1
+
+        # The style sheets by their served name.
+        self._styles = {}
+        for stylesheet in application.render.html.stylesheets:
+            filename = stylesheet[5:] if stylesheet.startswith('file:') else stylesheet
+            self._styles[os.path.basename(filename)] = filename
+
+        # The render object for each worker thread.
+        self._local = threading.local()
+        # The pool of worker threads.
+        self._pool = None
+
+
+
+    def run(self):
+        ''' Serve requests until the program is interrupted. '''
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+
+
+
+    async def _serve(self):
+        ''' Listen for connections until cancelled. '''
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.numWorkers, thread_name_prefix='render')
+        server = await asyncio.start_server(self._handleConnection, self.host, self.port)
+        print(f'Serving on http://{self.host or "localhost"}:{self.port}/ with {self.numWorkers} workers.')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._pool.shutdown()
+
+
+
+    async def _handleConnection(self, reader, writer):
+        ''' Handle the requests on a single connection. '''
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                parts = requestLine.decode('latin-1').split()
+                if len(parts) != 3:
+                    status, contentType, body = 400, 'text/plain', b'Bad request.'
+                elif parts[0] not in ('GET', 'HEAD'):
+                    status, contentType, body = 405, 'text/plain', b'Only GET is supported.'
+                else:
+                    loop = asyncio.get_running_loop()
+                    status, contentType, body = await loop.run_in_executor(self._pool, self.getResponse, parts[1])
+                    if parts[0] == 'HEAD':
+                        body = b''
+
+                isKeepAlive = len(parts) == 3 and parts[2] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\nContent-Type: {contentType}\r\nContent-Length: {len(body)}\r\nConnection: {"keep-alive" if isKeepAlive else "close"}\r\n\r\n'.encode('latin-1'))
+                writer.write(body)
+                await writer.drain()
+                self.requestCount += 1
+                if not isKeepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+
+    def getResponse(self, target):
+        '''
+        Returns the status, content type and body for the specified url.
+        This runs on a worker thread.
+
+        :param string target: Specifies the url path and query.
+        '''
+        startTime = time.time()
+        url = urllib.parse.urlsplit(target)
+        path = urllib.parse.unquote(url.path).strip('/')
+        parameters = dict(urllib.parse.parse_qsl(url.query))
+        for key in WRITE_PARAMETERS:
+            parameters.pop(key, None)
+        try:
+            if path.startswith('styles/') and path[7:] in self._styles:
+                with open(self._styles[path[7:]], 'rb') as inputFile:
+                    return 200, 'text/css', inputFile.read()
+            if path.endswith('.json'):
+                message = checkParameters(path[:-5], parameters)
+                if message is not None:
+                    return 400, 'text/plain', f'Bad request {target}.  {message}'.encode()
+                data = self.getData(path[:-5], parameters)
+                if data is None:
+                    return 404, 'text/plain', f'No data for {path}.'.encode()
+                return 200, 'application/json', json.dumps(data).encode()
+
+            request = path or 'home'
+            if request not in SERVED_REQUESTS:
+                return 404, 'text/plain', f'No page for {path}.'.encode()
+            message = checkParameters(request, parameters)
+            if message is not None:
+                return 400, 'text/plain', f'Bad request {target}.  {message}'.encode()
+            render = self._getRender()
+            render.showPage(request, parameters)
+            # Replace the local links and style sheets while the page is encoded.
+            body = render.html.toBytes(self._rewriteLinks)
+        except Exception as error:
+            return 500, 'text/plain', f'Error building {target}.  {error}'.encode()
+        finally:
+            if self.application.debug:
+                print(f'{threading.current_thread().name} {target} {1000 * (time.time() - startTime):.1f}ms')
+
+        return 200, 'text/html; charset=utf-8', body
+
+
+
+    def _rewriteLinks(self, html):
+        ''' Returns the specified html with the local links and style sheets replaced by urls on this server. '''
+        html = APP_LINK.sub(lambda match: f'{match.group(1)}="/', html)
+        for name, filename in self._styles.items():
+            html = html.replace(f'file:{filename}', f'/styles/{name}')
+        return html
+
+
+
+    def getData(self, request, parameters):
+        '''
+        Returns the table data for the specified request as a json compatible object or None if there is no data for the request.
+
+        :param string request: Specifies the request 'home' or 'table_last'.
+        :param dict parameters: Specifies the parameters as for the html page.
+        '''
+        database = self.application.database
+        seasonIndex = int(parameters['season']) if 'season' in parameters else self.application.render.lastSeasonIndex
+        season = database.getSeason(seasonIndex)
+        theDate = datetime.date(*time.strptime(parameters['date'], "%Y-%m-%d")[:3]) if 'date' in parameters else datetime.date.today()
+
+        # Match the date rules of the html pages.
+        if request == 'home':
+            if theDate > season.finishDate:
+                theDate = None
+            rows = database.standings.getTable(seasonIndex, None, theDate, True)
+        elif request == 'table_last':
+            lastResults = int(parameters['last']) if 'last' in parameters else 5
+            if theDate > season.finishDate:
+                theDate = season.finishDate
+            rows = database.form.getLastResultsTable(seasonIndex, theDate, lastResults)
+        else:
+            return None
+
+        table = []
+        for position, row in enumerate(rows):
+            table.append({
+                'position'  : position + 1,
+                'team_id'   : row[0],
+                'team'      : database.getTeam(row[0]).name,
+                'played'    : row[1] + row[2] + row[3] + row[6] + row[7] + row[8],
+                'won'       : row[1] + row[6],
+                'drawn'     : row[2] + row[7],
+                'lost'      : row[3] + row[8],
+                'for'       : row[4] + row[9],
+                'against'   : row[5] + row[10],
+                'home'      : {'won': row[1], 'drawn': row[2], 'lost': row[3], 'for': row[4], 'against': row[5]},
+                'away'      : {'won': row[6], 'drawn': row[7], 'lost': row[8], 'for': row[9], 'against': row[10]},
+                'points'    : row[11],
+                'difference': row[12],
+                'bonus'     : row[14],
+            })
+        return {
+            'season_id' : seasonIndex,
+            'season'    : season.name,
+            'date'      : None if theDate is None else str(theDate),
+            'table'     : table,
+        }
+
+
+
+    def _getRender(self):
+        ''' Returns the render object for the current worker thread. '''
+        render = getattr(self._local, 'render', None)
+        if render is None:
+            render = Render(self.application)
+            render.html.stylesheets = list(self.application.render.html.stylesheets)
+            self._local.render = render
+        return render
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to simulate the remaining fixtures of a season for the table program.
+This module implements the :py:class:`SeasonSimulator` class.
+
+The goals in each remaining match are sampled from Poisson distributions whose rates come from the home and away scoring records of the two teams.
+The simulations are split into chunks with their own seeds so that a seeded run gives the same result with any number of processes.
+The pages use a seeded run so that the same matches always give the same page.
+'''
+
+# System libraries.
+import concurrent.futures
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+# Application libraries.
+from instrumentation import timed
+
+# Optionally use the numpy library.
+try:
+    import numpy
+except:
+    numpy = None
+    print('numpy is not available, using the slower python season simulator ({})'.format(__name__))
+
+
+
+# The number of simulations in each chunk of work.
+CHUNK_SIMULATIONS = 2000
+
+# The default number of simulations.  This is a single chunk so that a page does not need the pool of processes.
+DEFAULT_SIMULATIONS = CHUNK_SIMULATIONS
+
+# The number of average matches added to each team's scoring record.  This pulls teams with few matches towards the league average.
+PRIOR_MATCHES = 5
+
+# The average goals per match used when no matches have been played.
+DEFAULT_HOME_GOALS = 1.5
+DEFAULT_AWAY_GOALS = 1.2
+
+
+
+class SimulationResult:
+    '''
+    Class to hold the result of a season simulation.
+
+    :ivar list teams: The indexes of the teams in the season in ascending order.
+    :ivar int numSimulations: The number of simulations.
+    :ivar int numFixtures: The number of fixtures that were simulated.
+    :ivar int numProcesses: The number of processes that ran the simulations.
+    :ivar float elapsed: The time taken in seconds.
+    :ivar float simulationsPerSecond: The throughput of the simulations.
+    :ivar dict positions: The probability of each finishing position for each team.  The lists start at position 1.
+    :ivar dict zones: The probability of finishing in the 'good', 'positive' and 'bad' zones of the season for each team.
+    '''
+
+
+
+    def __init__(self, season, teams, counts, numSimulations, numFixtures, numProcesses, elapsed):
+        '''
+        Class constructor for the :py:class:`SimulationResult` class.
+
+        :param Season season: Specifies the season that was simulated.
+        :param list teams: Specifies the teams in ascending order.
+        :param list counts: Specifies the number of times each team (row) finished in each position (column).
+        :param int numSimulations: Specifies the number of simulations.
+        :param int numFixtures: Specifies the number of fixtures that were simulated.
+        :param int numProcesses: Specifies the number of processes that ran the simulations.
+        :param float elapsed: Specifies the time taken in seconds.
+        '''
+        self.teams = teams
+        self.numSimulations = numSimulations
+        self.numFixtures = numFixtures
+        self.numProcesses = numProcesses
+        self.elapsed = elapsed
+        self.simulationsPerSecond = numSimulations / elapsed if elapsed > 0 else 0.0
+
+        self.positions = {}
+        self.zones = {}
+        for row, teamIndex in enumerate(teams):
+            probabilities = [count / numSimulations for count in counts[row]]
+            self.positions[teamIndex] = probabilities
+            # The zones match the colours in the league table.  The positive zone excludes the good zone.
+            goodPos = season.goodPos or 0
+            positivePos = max(season.positivePos or 0, goodPos)
+            badPos = season.badPos if season.badPos is not None and season.badPos > 0 else len(teams)
+            self.zones[teamIndex] = {
+                'good'      : sum(probabilities[:goodPos]),
+                'positive'  : sum(probabilities[goodPos:positivePos]),
+                'bad'       : sum(probabilities[badPos:]),
+            }
+
+
+
+    def getExpectedPosition(self, teamIndex):
+        '''
+        Returns the mean finishing position of the specified team.
+
+        :param int teamIndex: Specifies the team.
+        '''
+        return sum((position + 1) * probability for position, probability in enumerate(self.positions.get(teamIndex, [])))
+
+
+
+class SeasonSimulator:
+    '''
+    Class to play out the remaining fixtures of a season many times and count the finishing positions.
+    The fixtures are the matches without a result and the matches after the date.
+    Teams level on points are separated by goal difference, goals scored and then at random.
+    Bonus points in the remaining matches are not included.
+    The results are cached for each season, date and seed until the season is invalidated.
+    The pool of processes is started with the 'spawn' method because the simulator is used from the threads of the GTK program and the page server.
+
+    :ivar StandingsEngine standings: The :py:class:`~standings.StandingsEngine` that holds the matches.
+    :ivar int numProcesses: The number of processes to share the simulations.
+    '''
+
+
+
+    def __init__(self, standings, numProcesses=None):
+        '''
+        Class constructor for the :py:class:`SeasonSimulator` class.
+
+        :param StandingsEngine standings: Specifies the :py:class:`~standings.StandingsEngine` that holds the matches.
+        :param int numProcesses: Optionally specify the number of processes.  The default is the number of processors.
+        '''
+        # The engine that holds the matches.
+        self.standings = standings
+        # The number of processes to share the simulations.
+        self.numProcesses = numProcesses if numProcesses is not None else (os.cpu_count() or 1)
+
+        # The pool of processes.  This is created when first needed.
+        self._pool = None
+        # The results for each season, date and seed.
+        self._results = {}
+        # Lock to protect the cache and the pool.
+        self._lock = threading.Lock()
+
+
+
+    def invalidate(self, seasonIndex=None):
+        '''
+        Remove the simulations of the specified season from the cache.
+
+        :param int seasonIndex: Optionally specify the season that has changed.  Specify None to remove every season.
+        '''
+        with self._lock:
+            if seasonIndex is None:
+                self._results = {}
+            else:
+                for key in [key for key in self._results if key[0] == seasonIndex]:
+                    del self._results[key]
+
+
+
+    def close(self):
+        ''' Shutdown the pool of processes. '''
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+
+    @timed('simulation')
+    def simulate(self, season, theDate=None, numSimulations=DEFAULT_SIMULATIONS, seed=None, numProcesses=None):
+        '''
+        Returns a :py:class:`SimulationResult` for the remaining fixtures of the season after the specified date.
+
+        :param Season season: Specifies the season.
+        :param object theDate: Optionally specify the date of the table as a date or 'YYYY-MM-DD' string.  Specify None for the final table.
+        :param int numSimulations: Optionally specify the number of simulations.
+        :param int seed: Optionally specify a seed for a deterministic result.  A seeded result does not depend on the number of processes.
+        :param int numProcesses: Optionally specify the number of processes for this run.
+        '''
+        cutoff = None if theDate is None else self.standings._toOrdinal(theDate)
+        key = (season.index, cutoff, numSimulations, seed)
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+
+        startTime = time.perf_counter()
+        teams, model = self._buildModel(season.index, cutoff)
+
+        # Split the simulations into chunks with independent seeds.
+        numChunks = max(1, math.ceil(numSimulations / CHUNK_SIMULATIONS))
+        sizes = [CHUNK_SIMULATIONS] * (numChunks - 1) + [numSimulations - CHUNK_SIMULATIONS * (numChunks - 1)]
+        if numpy is None:
+            generator = random.Random(seed)
+            seeds = [generator.getrandbits(64) for chunk in range(numChunks)]
+        else:
+            seeds = numpy.random.SeedSequence(seed).spawn(numChunks)
+
+        # Run the chunks.
+        numProcesses = min(numProcesses or self.numProcesses, numChunks)
+        if numProcesses > 1 and len(model['homeTeams']) > 0:
+            pool = self._getPool()
+            chunks = list(pool.map(_simulateChunk, [model] * numChunks, sizes, seeds))
+        else:
+            numProcesses = 1
+            chunks = [_simulateChunk(model, size, chunkSeed) for size, chunkSeed in zip(sizes, seeds)]
+
+        # Add the counts from each chunk.
+        counts = [[0] * len(teams) for teamIndex in teams]
+        for chunk in chunks:
+            for row in range(len(teams)):
+                for position in range(len(teams)):
+                    counts[row][position] += int(chunk[row][position])
+
+        result = SimulationResult(season, teams, counts, numSimulations, len(model['homeTeams']), numProcesses, time.perf_counter() - startTime)
+        with self._lock:
+            self._results[key] = result
+        return result
+
+
+
+    def _getPool(self):
+        ''' Returns the pool of processes.  The processes are spawned rather than forked from a program with threads. '''
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.numProcesses, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+
+
+    def _buildModel(self, seasonIndex, cutoff):
+        ''' Returns the teams and a dictionary of the current standings, fixtures and scoring rates for the season. '''
+        columns = self.standings.getColumns(seasonIndex)
+        records = self.standings.getSnapshots(seasonIndex).getRecords(cutoff)
+        teams = sorted(set(columns.homeTeams) | set(columns.awayTeams))
+        rows = {teamIndex: row for row, teamIndex in enumerate(teams)}
+
+        # The current points, goal difference and goals scored for each team.
+        basePoints = []
+        baseDifference = []
+        baseFor = []
+        # The home and away scoring records for each team.
+        homePlayed = []
+        homeFor = []
+        homeAgainst = []
+        awayPlayed = []
+        awayFor = []
+        awayAgainst = []
+        for teamIndex in teams:
+            record = records.get(teamIndex, [0] * 11)
+            basePoints.append(3 * (record[0] + record[5]) + record[1] + record[6] + record[10])
+            baseDifference.append(record[3] + record[8] - record[4] - record[9])
+            baseFor.append(record[3] + record[8])
+            homePlayed.append(record[0] + record[1] + record[2])
+            homeFor.append(record[3])
+            homeAgainst.append(record[4])
+            awayPlayed.append(record[5] + record[6] + record[7])
+            awayFor.append(record[8])
+            awayAgainst.append(record[9])
+
+        # The league average goals for the home and away teams.
+        numPlayed = sum(homePlayed)
+        homeMean = sum(homeFor) / numPlayed if numPlayed > 0 and sum(homeFor) > 0 else DEFAULT_HOME_GOALS
+        awayMean = sum(awayFor) / numPlayed if numPlayed > 0 and sum(awayFor) > 0 else DEFAULT_AWAY_GOALS
+
+        # The fixtures that are not in the table and their expected goals.
+        fixtureHome = []
+        fixtureAway = []
+        homeRates = []
+        awayRates = []
+        for theDate, homeTeam, awayTeam, matchHomeFor, matchAwayFor in zip(columns.dates, columns.homeTeams, columns.awayTeams, columns.homeFor, columns.awayFor):
+            if matchHomeFor >= 0 and matchAwayFor >= 0 and (cutoff is None or (theDate != columns.NO_DATE and theDate <= cutoff)):
+                continue
+            home = rows[homeTeam]
+            away = rows[awayTeam]
+            homeAttack = (homeFor[home] + PRIOR_MATCHES * homeMean) / (homePlayed[home] + PRIOR_MATCHES) / homeMean
+            awayDefence = (awayAgainst[away] + PRIOR_MATCHES * homeMean) / (awayPlayed[away] + PRIOR_MATCHES) / homeMean
+            awayAttack = (awayFor[away] + PRIOR_MATCHES * awayMean) / (awayPlayed[away] + PRIOR_MATCHES) / awayMean
+            homeDefence = (homeAgainst[home] + PRIOR_MATCHES * awayMean) / (homePlayed[home] + PRIOR_MATCHES) / awayMean
+            fixtureHome.append(home)
+            fixtureAway.append(away)
+            homeRates.append(homeMean * homeAttack * awayDefence)
+            awayRates.append(awayMean * awayAttack * homeDefence)
+
+        model = {
+            'basePoints'        : basePoints,
+            'baseDifference'    : baseDifference,
+            'baseFor'           : baseFor,
+            'homeTeams'         : fixtureHome,
+            'awayTeams'         : fixtureAway,
+            'homeRates'         : homeRates,
+            'awayRates'         : awayRates,
+        }
+        return teams, model
+
+
+
+def _simulateChunk(model, numSimulations, seed):
+    '''
+    Returns the number of times each team finished in each position over a chunk of simulations.
+    This is a module function so that it can run in a separate process.
+
+    :param dict model: Specifies the current standings, fixtures and scoring rates.
+    :param int numSimulations: Specifies the number of simulations in the chunk.
+    :param object seed: Specifies the seed for the chunk.
+    '''
+    numTeams = len(model['basePoints'])
+    if numpy is None:
+        return _simulateChunkPython(model, numSimulations, seed)
+
+    generator = numpy.random.default_rng(seed)
+    numFixtures = len(model['homeTeams'])
+
+    # Sample the goals in every fixture of every simulation at once.
+    homeGoals = generator.poisson(numpy.array(model['homeRates'], dtype=numpy.float64), size=(numSimulations, numFixtures))
+    awayGoals = generator.poisson(numpy.array(model['awayRates'], dtype=numpy.float64), size=(numSimulations, numFixtures))
+    homePoints = 3 * (homeGoals > awayGoals) + (homeGoals == awayGoals)
+    awayPoints = 3 * (awayGoals > homeGoals) + (homeGoals == awayGoals)
+
+    # Matrices that add the fixtures to the teams.
+    homeMatrix = numpy.zeros((numFixtures, numTeams), dtype=numpy.int64)
+    awayMatrix = numpy.zeros((numFixtures, numTeams), dtype=numpy.int64)
+    homeMatrix[numpy.arange(numFixtures), model['homeTeams']] = 1
+    awayMatrix[numpy.arange(numFixtures), model['awayTeams']] = 1
+
+    points = numpy.array(model['basePoints'], dtype=numpy.int64) + homePoints @ homeMatrix + awayPoints @ awayMatrix
+    difference = numpy.array(model['baseDifference'], dtype=numpy.int64) + (homeGoals - awayGoals) @ homeMatrix + (awayGoals - homeGoals) @ awayMatrix
+    goalsFor = numpy.array(model['baseFor'], dtype=numpy.int64) + homeGoals @ homeMatrix + awayGoals @ awayMatrix
+
+    # Sort each simulation.  The last key is the primary key.
+    order = numpy.lexsort((generator.random((numSimulations, numTeams)), -goalsFor, -difference, -points), axis=-1)
+
+    # Count the teams in each position.
+    counts = numpy.bincount((order * numTeams + numpy.arange(numTeams)).ravel(), minlength=numTeams * numTeams)
+    return counts.reshape(numTeams, numTeams).tolist()
+
+
+
+def _simulateChunkPython(model, numSimulations, seed):
+    ''' Returns the number of times each team finished in each position over a chunk of simulations without numpy. '''
+    generator = random.Random(seed)
+    numTeams = len(model['basePoints'])
+    fixtures = list(zip(model['homeTeams'], model['awayTeams'], [math.exp(-rate) for rate in model['homeRates']], [math.exp(-rate) for rate in model['awayRates']]))
+    counts = [[0] * numTeams for row in range(numTeams)]
+    for simulation in range(numSimulations):
+        points = list(model['basePoints'])
+        difference = list(model['baseDifference'])
+        goalsFor = list(model['baseFor'])
+        for home, away, homeLimit, awayLimit in fixtures:
+            homeGoals = _poisson(generator, homeLimit)
+            awayGoals = _poisson(generator, awayLimit)
+            if homeGoals > awayGoals:
+                points[home] += 3
+            elif homeGoals < awayGoals:
+                points[away] += 3
+            else:
+                points[home] += 1
+                points[away] += 1
+            difference[home] += homeGoals - awayGoals
+            difference[away] += awayGoals - homeGoals
+            goalsFor[home] += homeGoals
+            goalsFor[away] += awayGoals
+        order = sorted(range(numTeams), key=lambda row: (-points[row], -difference[row], -goalsFor[row], generator.random()))
+        for position, row in enumerate(order):
+            counts[row][position] += 1
+    return counts
+
+
+
+def _poisson(generator, limit):
+    ''' Returns a sample from a Poisson distribution where limit is exp(-rate). '''
+    count = 0
+    product = generator.random()
+    while product > limit:
+        count += 1
+        product *= generator.random()
+    return count
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to calculate league tables in memory for the table program.
+This module implements the :py:class:`StandingsEngine` class.
+'''
+
+# System libraries.
+import array
+import bisect
+import datetime
+import threading
+
+# Application libraries.
+from instrumentation import timed
+from positions import PositionMatrix
+
+
+
+class MatchColumns:
+    '''
+    Class to hold a block of matches as compact column arrays.
+    Missing dates are stored as :py:attr:`NO_DATE` and missing goals as -1.
+
+    :ivar array seasons: The season index of each match.
+    :ivar array dates: The date of each match as a day ordinal.
+    :ivar array homeTeams: The index of the home team in each match.
+    :ivar array awayTeams: The index of the away team in each match.
+    :ivar array homeFor: The goals scored by the home team in each match.
+    :ivar array awayFor: The goals scored by the away team in each match.
+    :ivar array homeBonus: The bonus points for the home team in each match.
+    :ivar array awayBonus: The bonus points for the away team in each match.
+    '''
+    # The value stored for a match without a date.
+    NO_DATE = 0
+
+
+
+    def __init__(self):
+        ''' Class constructor for the :py:class:`MatchColumns` class. '''
+        self.seasons = array.array('i')
+        self.dates = array.array('l')
+        self.homeTeams = array.array('i')
+        self.awayTeams = array.array('i')
+        self.homeFor = array.array('i')
+        self.awayFor = array.array('i')
+        self.homeBonus = array.array('i')
+        self.awayBonus = array.array('i')
+
+
+
+    def __len__(self):
+        ''' Returns the number of matches in the columns. '''
+        return len(self.dates)
+
+
+
+    def append(self, row):
+        '''
+        Add a match to the columns.
+
+        :param tuple row: Specifies the SEASON_ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS and AWAY_BONUS_PTS of the match.
+        '''
+        self.seasons.append(row[0])
+        self.dates.append(MatchColumns.NO_DATE if row[1] is None else datetime.date.fromisoformat(row[1][:10]).toordinal())
+        self.homeTeams.append(row[2])
+        self.awayTeams.append(row[3])
+        self.homeFor.append(-1 if row[4] is None else row[4])
+        self.awayFor.append(-1 if row[5] is None else row[5])
+        self.homeBonus.append(0 if row[6] is None else row[6])
+        self.awayBonus.append(0 if row[7] is None else row[7])
+
+
+
+class SeasonSnapshots:
+    '''
+    Class to hold the cumulative table of a season after each match date.
+    The totals are prefix sums so the table to any date is a lookup rather than a scan of the matches.
+    Matches without a date are held in a final block which is only used for the final table.
+
+    :ivar array dates: The distinct match dates in the season as day ordinals in ascending order.
+    :ivar list teams: The indexes of the teams in the season in ascending order.
+    :ivar array firstBlock: The block where each team first appears in the table.
+    :ivar array totals: The cumulative home W D L F A, away W D L F A and bonus points for each team at the end of each block.
+    '''
+    # The number of totals for each team.
+    NUM_TOTALS = 11
+
+
+
+    def __init__(self, columns):
+        '''
+        Class constructor for the :py:class:`SeasonSnapshots` class.
+
+        :param MatchColumns columns: Specifies the matches in the season.
+        '''
+        # Order the matches by date.  Matches without a date go last.
+        lastDate = datetime.date.max.toordinal()
+        order = sorted(range(len(columns)), key=lambda index: lastDate if columns.dates[index] == MatchColumns.NO_DATE else columns.dates[index])
+        self.dates = array.array('l', sorted(set(lastDate if theDate == MatchColumns.NO_DATE else theDate for theDate in columns.dates)))
+        self.teams = sorted(set(columns.homeTeams) | set(columns.awayTeams))
+        teamPosition = {teamIndex: position for position, teamIndex in enumerate(self.teams)}
+
+        # Block 0 is the empty table before the first date.
+        numBlocks = len(self.dates) + 1
+        blockSize = len(self.teams) * SeasonSnapshots.NUM_TOTALS
+        self.firstBlock = array.array('i', [numBlocks] * len(self.teams))
+        self.totals = array.array('l', bytes(numBlocks * blockSize * array.array('l').itemsize))
+
+        # Accumulate the matches.
+        running = [0] * blockSize
+        block = 0
+        for index in order:
+            theDate = lastDate if columns.dates[index] == MatchColumns.NO_DATE else columns.dates[index]
+            while block == 0 or self.dates[block - 1] != theDate:
+                # Store the totals at the end of the previous block.
+                self.totals[block * blockSize:(block + 1) * blockSize] = array.array('l', running)
+                block += 1
+            home = teamPosition[columns.homeTeams[index]]
+            away = teamPosition[columns.awayTeams[index]]
+            if self.firstBlock[home] > block:
+                self.firstBlock[home] = block
+            if self.firstBlock[away] > block:
+                self.firstBlock[away] = block
+            homeFor = columns.homeFor[index]
+            awayFor = columns.awayFor[index]
+            if homeFor < 0 or awayFor < 0:
+                # The match has not been played.
+                continue
+            homeOffset = home * SeasonSnapshots.NUM_TOTALS
+            awayOffset = away * SeasonSnapshots.NUM_TOTALS
+            if homeFor > awayFor:
+                running[homeOffset] += 1
+                running[awayOffset + 7] += 1
+            elif homeFor == awayFor:
+                running[homeOffset + 1] += 1
+                running[awayOffset + 6] += 1
+            else:
+                running[homeOffset + 2] += 1
+                running[awayOffset + 5] += 1
+            running[homeOffset + 3] += homeFor
+            running[homeOffset + 4] += awayFor
+            running[awayOffset + 8] += awayFor
+            running[awayOffset + 9] += homeFor
+            running[homeOffset + 10] += columns.homeBonus[index]
+            running[awayOffset + 10] += columns.awayBonus[index]
+        while block < numBlocks:
+            self.totals[block * blockSize:(block + 1) * blockSize] = array.array('l', running)
+            block += 1
+
+
+
+    def getRecords(self, finishDate=None):
+        '''
+        Returns a dictionary of the totals for each team that has a match up to the specified date.
+
+        :param int finishDate: Optionally specify the last date to include as a day ordinal.  Specify None for the final table.
+        '''
+        if finishDate is None:
+            block = len(self.dates)
+        else:
+            # The matches without a date are always after the finish date.
+            block = bisect.bisect_right(self.dates, finishDate)
+        blockSize = len(self.teams) * SeasonSnapshots.NUM_TOTALS
+        records = {}
+        for position, teamIndex in enumerate(self.teams):
+            if self.firstBlock[position] <= block:
+                offset = block * blockSize + position * SeasonSnapshots.NUM_TOTALS
+                records[teamIndex] = self.totals[offset:offset + SeasonSnapshots.NUM_TOTALS]
+        return records
+
+
+
+class StandingsEngine:
+    '''
+    Class to calculate league tables in memory.
+    The matches are read from the database once and held as :py:class:`MatchColumns` until invalidated.
+    The tables are returned as rows in the layout expected by :py:func:`~render.Render.displayTable`.
+
+    :ivar Database database: The :py:class:`~database.Database` object to read the matches from.
+    '''
+    # The key for the columns that hold the matches from every season.
+    ALL_SEASONS = None
+
+
+
+    def __init__(self, database):
+        '''
+        Class constructor for the :py:class:`StandingsEngine` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` object to read the matches from.
+        '''
+        # The database to read the matches from.
+        self.database = database
+
+        # The columns of matches for each season.  The key ALL_SEASONS holds every match.
+        self._columns = {}
+        # The cumulative tables for each season.
+        self._snapshots = {}
+        # The league positions for each period.
+        self._positionMatrices = {}
+        # Lock to protect the caches.
+        self._lock = threading.Lock()
+
+
+
+    def getColumns(self, seasonIndex=None):
+        '''
+        Returns the :py:class:`MatchColumns` for the specified season.
+        The matches are read from the database on the first request.
+
+        :param int seasonIndex: Optionally specify the season.  Specify None for the matches from every season.
+        '''
+        with self._lock:
+            if seasonIndex in self._columns:
+                return self._columns[seasonIndex]
+
+        if self.database.matchStore.isEnabled:
+            # A slice of the match store.
+            columns = self.database.matchStore.getColumns(seasonIndex)
+            with self._lock:
+                self._columns[seasonIndex] = columns
+            return columns
+
+        # Read the matches from the database.
+        columns = MatchColumns()
+        cndb = self.database.getConnection()
+        sql = "SELECT SEASON_ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS FROM MATCHES WHERE SEASON_ID IS NOT NULL AND HOME_TEAM_ID IS NOT NULL AND AWAY_TEAM_ID IS NOT NULL"
+        if seasonIndex is None:
+            cursor = cndb.execute(sql + ";")
+        else:
+            cursor = cndb.execute(sql + " AND SEASON_ID = ?;", (seasonIndex, ))
+        for row in cursor:
+            columns.append(row)
+        cursor.close()
+
+        with self._lock:
+            self._columns[seasonIndex] = columns
+        return columns
+
+
+
+    def getSnapshots(self, seasonIndex):
+        '''
+        Returns the :py:class:`SeasonSnapshots` for the specified season.
+        The snapshots are built from the season columns on the first request.
+
+        :param int seasonIndex: Specifies the season.
+        '''
+        with self._lock:
+            if seasonIndex in self._snapshots:
+                return self._snapshots[seasonIndex]
+
+        snapshots = SeasonSnapshots(self.getColumns(seasonIndex))
+
+        with self._lock:
+            self._snapshots[seasonIndex] = snapshots
+        return snapshots
+
+
+
+    def invalidate(self, seasonIndex=None):
+        '''
+        Remove the matches and snapshots for the specified season from the cache.
+
+        :param int seasonIndex: Optionally specify the season that has changed.  Specify None to remove every season.
+        '''
+        with self._lock:
+            if seasonIndex is None:
+                self._columns = {}
+                self._snapshots = {}
+            else:
+                self._columns.pop(seasonIndex, None)
+                self._columns.pop(StandingsEngine.ALL_SEASONS, None)
+                self._snapshots.pop(seasonIndex, None)
+            self._positionMatrices = {}
+
+
+
+    @timed('standings')
+    def getTable(self, seasonIndex=None, startDate=None, finishDate=None, isBonusPoints=False, teams=None):
+        '''
+        Returns the league table as a list of rows sorted by points, goal difference and goals scored.
+        Each row is TEAM_ID, home W D L F A, away W D L F A, PTS, DIFF, FOR, BONUS_PTS, SEASON_ID.
+        Only teams that have a match in the range are included.
+
+        :param int seasonIndex: Optionally specify the season.  Specify None for the matches from every season.
+        :param object startDate: Optionally specify the first date to include as a date or 'YYYY-MM-DD' string.
+        :param object finishDate: Optionally specify the last date to include as a date or 'YYYY-MM-DD' string.
+        :param bool isBonusPoints: Optionally specify True to add the bonus points to the points.
+        :param set teams: Optionally specify the teams to include.  Only matches between two of these teams are used.
+        '''
+        if seasonIndex is not None and startDate is None and teams is None:
+            # The table to a date in a season is a lookup in the snapshots.
+            records = self.getSnapshots(seasonIndex).getRecords(None if finishDate is None else self._toOrdinal(finishDate))
+        else:
+            records = self._accumulate(self.getColumns(seasonIndex), startDate, finishDate, teams)
+        rows = self._buildRows(records, isBonusPoints, seasonIndex)
+
+        # Sort by points, goal difference and goals scored.
+        rows.sort(key=lambda row: (row[11], row[12], row[13]), reverse=True)
+        return rows
+
+
+
+    @timed('standings')
+    def getPositionMatrix(self, startDate, finishDate, isBonusPoints=True):
+        '''
+        Returns the :py:class:`~positions.PositionMatrix` of the points and league positions of every team between the specified dates.
+        The matrix is shared by the pages of every team in the period.
+
+        :param object startDate: Specifies the first date to include as a date or 'YYYY-MM-DD' string.
+        :param object finishDate: Specifies the last date to include as a date or 'YYYY-MM-DD' string.
+        :param bool isBonusPoints: Optionally specify False to ignore the bonus points.
+        '''
+        key = (self._toOrdinal(startDate), self._toOrdinal(finishDate), isBonusPoints)
+        with self._lock:
+            if key in self._positionMatrices:
+                return self._positionMatrices[key]
+
+        positionMatrix = PositionMatrix(self.getColumns(StandingsEngine.ALL_SEASONS), *key)
+
+        with self._lock:
+            self._positionMatrices[key] = positionMatrix
+        return positionMatrix
+
+
+
+    def _accumulate(self, columns, startDate, finishDate, teams):
+        ''' Returns a dictionary of the totals for each team from the matches in the columns that match the filters. '''
+
+        # Matches without a date are only included when there are no date limits.
+        if startDate is None and finishDate is None:
+            lowerDate = MatchColumns.NO_DATE
+        else:
+            lowerDate = MatchColumns.NO_DATE + 1 if startDate is None else max(MatchColumns.NO_DATE + 1, self._toOrdinal(startDate))
+        upperDate = datetime.date.max.toordinal() if finishDate is None else self._toOrdinal(finishDate)
+
+        # Home W D L F A, Away W D L F A, Bonus.
+        records = {}
+        for theDate, homeTeam, awayTeam, homeFor, awayFor, homeBonus, awayBonus in zip(columns.dates, columns.homeTeams, columns.awayTeams, columns.homeFor, columns.awayFor, columns.homeBonus, columns.awayBonus):
+            if theDate < lowerDate or theDate > upperDate:
+                continue
+            if teams is not None and (homeTeam not in teams or awayTeam not in teams):
+                continue
+            homeRecord = records.get(homeTeam)
+            if homeRecord is None:
+                homeRecord = records[homeTeam] = [0] * SeasonSnapshots.NUM_TOTALS
+            awayRecord = records.get(awayTeam)
+            if awayRecord is None:
+                awayRecord = records[awayTeam] = [0] * SeasonSnapshots.NUM_TOTALS
+            if homeFor < 0 or awayFor < 0:
+                # The match has not been played.
+                continue
+
+            if homeFor > awayFor:
+                homeRecord[0] += 1
+                awayRecord[7] += 1
+            elif homeFor == awayFor:
+                homeRecord[1] += 1
+                awayRecord[6] += 1
+            else:
+                homeRecord[2] += 1
+                awayRecord[5] += 1
+            homeRecord[3] += homeFor
+            homeRecord[4] += awayFor
+            awayRecord[8] += awayFor
+            awayRecord[9] += homeFor
+            homeRecord[10] += homeBonus
+            awayRecord[10] += awayBonus
+        return records
+
+
+
+    def _buildRows(self, records, isBonusPoints, seasonIndex):
+        ''' Returns the table rows from the dictionary of totals in team order. '''
+        rows = []
+        for teamIndex in sorted(records):
+            record = records[teamIndex]
+            bonusPoints = record[10] if isBonusPoints else 0
+            points = 3 * (record[0] + record[5]) + record[1] + record[6] + bonusPoints
+            goalsFor = record[3] + record[8]
+            goalDifference = goalsFor - record[4] - record[9]
+            rows.append((teamIndex, *record[0:10], points, goalDifference, goalsFor, bonusPoints, seasonIndex))
+        return rows
+
+
+
+    def _toOrdinal(self, theDate):
+        ''' Returns the day ordinal of the specified date or 'YYYY-MM-DD' string. '''
+        if isinstance(theDate, datetime.date):
+            return theDate.toordinal()
+        return datetime.date.fromisoformat(str(theDate)[:10]).toordinal()
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to keep the league tables of each season in the database for the table program.
+This module implements the :py:class:`StandingsTable` class.
+'''
+
+# Application libraries.
+from instrumentation import timed
+from standings import SeasonSnapshots
+
+
+
+class StandingsTable:
+    '''
+    Class to look after the STANDINGS table.
+    The table holds the home and away totals of every team in every season, the same totals as :py:class:`~standings.SeasonSnapshots`.
+    The write path updates the totals with the change from each match inside the same transaction as the match.
+    :py:func:`check` rebuilds the totals from scratch and reports any differences.
+
+    Other programs can change the MATCHES table without updating the totals.
+    Triggers on the MATCHES table count the changes in the STANDINGS_STATE table and the table also records the count that the totals match.
+    The totals are rebuilt before they are used when the counts are different.
+
+    :ivar Database database: The :py:class:`~database.Database` that owns the connections.
+    :ivar bool isAvailable: True if the STANDINGS and STANDINGS_STATE tables and the triggers exist in the database.
+    :ivar int rebuildCount: The number of times that stale totals have been rebuilt.
+    '''
+    # The totals in the same order as the :py:class:`~standings.SeasonSnapshots` records.
+    COLUMNS = ('HOME_WINS', 'HOME_DRAWS', 'HOME_LOSSES', 'HOME_FOR', 'HOME_AGAINST', 'AWAY_WINS', 'AWAY_DRAWS', 'AWAY_LOSSES', 'AWAY_FOR', 'AWAY_AGAINST', 'BONUS_PTS')
+
+    # The totals of every team in every season calculated from the MATCHES table.  A team is in a season when it has a match, played or not.
+    TOTALS_SQL = '''
+        SELECT SEASON_ID, TEAM_ID, COUNT(*), SUM(HW), SUM(HD), SUM(HL), SUM(HF), SUM(HA), SUM(AW), SUM(AD), SUM(AL), SUM(AF), SUM(AA), SUM(BONUS) FROM
+        (
+            SELECT SEASON_ID, HOME_TEAM_ID AS TEAM_ID, IS_PLAYED AND HOME_TEAM_FOR > AWAY_TEAM_FOR AS HW, IS_PLAYED AND HOME_TEAM_FOR = AWAY_TEAM_FOR AS HD, IS_PLAYED AND HOME_TEAM_FOR < AWAY_TEAM_FOR AS HL, IIF(IS_PLAYED, HOME_TEAM_FOR, 0) AS HF, IIF(IS_PLAYED, AWAY_TEAM_FOR, 0) AS HA, 0 AS AW, 0 AS AD, 0 AS AL, 0 AS AF, 0 AS AA, IIF(IS_PLAYED, IFNULL(HOME_BONUS_PTS, 0), 0) AS BONUS FROM PLAYED
+            UNION ALL
+            SELECT SEASON_ID, AWAY_TEAM_ID AS TEAM_ID, 0, 0, 0, 0, 0, IS_PLAYED AND AWAY_TEAM_FOR > HOME_TEAM_FOR, IS_PLAYED AND AWAY_TEAM_FOR = HOME_TEAM_FOR, IS_PLAYED AND AWAY_TEAM_FOR < HOME_TEAM_FOR, IIF(IS_PLAYED, AWAY_TEAM_FOR, 0), IIF(IS_PLAYED, HOME_TEAM_FOR, 0), IIF(IS_PLAYED, IFNULL(AWAY_BONUS_PTS, 0), 0) FROM PLAYED
+        )
+        GROUP BY SEASON_ID, TEAM_ID
+    '''
+
+    # The triggers that count the changes to the matches.  Changes to the dates do not change the totals.
+    TRIGGERS = {
+        'STANDINGS_MATCHES_INSERT'  : 'AFTER INSERT ON MATCHES',
+        'STANDINGS_MATCHES_UPDATE'  : 'AFTER UPDATE OF SEASON_ID, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS ON MATCHES',
+        'STANDINGS_MATCHES_DELETE'  : 'AFTER DELETE ON MATCHES',
+    }
+
+    # The matches with a flag for played matches.
+    PLAYED_SQL = "WITH PLAYED AS (SELECT SEASON_ID, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS, HOME_TEAM_FOR IS NOT NULL AND AWAY_TEAM_FOR IS NOT NULL AS IS_PLAYED FROM MATCHES WHERE SEASON_ID IS NOT NULL AND HOME_TEAM_ID IS NOT NULL AND AWAY_TEAM_ID IS NOT NULL{}) "
+
+
+
+    def __init__(self, database):
+        '''
+        Class constructor for the :py:class:`StandingsTable` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` that owns the connections.
+        '''
+        self.database = database
+        self.rebuildCount = 0
+        cndb = self.database.getConnection()
+        sql = f"SELECT COUNT(*) FROM sqlite_master WHERE (TYPE = 'table' AND NAME IN ('STANDINGS', 'STANDINGS_STATE')) OR (TYPE = 'trigger' AND NAME IN ({', '.join('?' * len(StandingsTable.TRIGGERS))}));"
+        self.isAvailable = cndb.execute(sql, tuple(StandingsTable.TRIGGERS)).fetchone()[0] == 2 + len(StandingsTable.TRIGGERS)
+
+
+
+    def ensureTable(self):
+        '''
+        Create the STANDINGS and STANDINGS_STATE tables and the triggers on the MATCHES table if they do not exist and fill the totals from the matches.
+        Returns True if the tables were created.
+        '''
+        if self.isAvailable:
+            return False
+        cndb = self.database.getConnection()
+        if cndb.execute("SELECT COUNT(*) FROM sqlite_master WHERE TYPE = 'table' AND NAME = 'MATCHES';").fetchone()[0] == 0:
+            return False
+
+        with self.database.writer() as cndbWriter:
+            cndbWriter.execute(f'CREATE TABLE IF NOT EXISTS STANDINGS (SEASON_ID INTEGER NOT NULL, TEAM_ID INTEGER NOT NULL, NUM_MATCHES INTEGER NOT NULL, {", ".join(column + " INTEGER NOT NULL" for column in StandingsTable.COLUMNS)}, PRIMARY KEY (SEASON_ID, TEAM_ID)) WITHOUT ROWID;')
+            cndbWriter.execute('CREATE TABLE IF NOT EXISTS STANDINGS_STATE (ID INTEGER PRIMARY KEY CHECK (ID = 1), MATCHES_VERSION INTEGER NOT NULL, STANDINGS_VERSION INTEGER NOT NULL);')
+            for name, event in StandingsTable.TRIGGERS.items():
+                cndbWriter.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN UPDATE STANDINGS_STATE SET MATCHES_VERSION = MATCHES_VERSION + 1; END;')
+            # An older STANDINGS table was not protected by the triggers so rebuild it.
+            cndbWriter.execute('DELETE FROM STANDINGS;')
+            self._fill(cndbWriter, None)
+            self.setCurrent(cndbWriter)
+        self.isAvailable = True
+        return True
+
+
+
+    def isCurrent(self, cndb=None):
+        '''
+        Returns True if the totals match the MATCHES table.
+
+        :param Connection cndb: Optionally specify the connection.  Use the writer connection inside a transaction.  The default is the reader connection.
+        '''
+        if not self.isAvailable:
+            return False
+        if cndb is None:
+            cndb = self.database.getConnection()
+        row = cndb.execute('SELECT MATCHES_VERSION = STANDINGS_VERSION FROM STANDINGS_STATE WHERE ID = 1;').fetchone()
+        return row is not None and row[0] == 1
+
+
+
+    def setCurrent(self, cndb):
+        '''
+        Record that the totals match the MATCHES table.
+        Call this with the writer connection at the end of a transaction that has kept the totals up to date.
+
+        :param Connection cndb: Specifies the writer connection of the transaction.
+        '''
+        cndb.execute('INSERT INTO STANDINGS_STATE (ID, MATCHES_VERSION, STANDINGS_VERSION) VALUES (1, 0, 0) ON CONFLICT (ID) DO UPDATE SET STANDINGS_VERSION = MATCHES_VERSION;')
+
+
+
+    def ensureCurrent(self):
+        '''
+        Rebuild the totals if another program has changed the MATCHES table.
+        Returns True if the totals can be used.  A read only database with stale totals can not be rebuilt.
+        '''
+        if not self.isAvailable:
+            return False
+        if self.isCurrent():
+            return True
+        if self.database.connections.isReadOnly:
+            return False
+        with self.database.writer() as cndb:
+            if not self.isCurrent(cndb):
+                self.rebuild(cndb)
+                self.rebuildCount += 1
+        return True
+
+
+
+    @timed('standings')
+    def getTable(self, seasonIndex, isBonusPoints=False):
+        '''
+        Returns the final league table of the specified season as a list of rows sorted by points, goal difference and goals scored.
+        The rows have the same layout as :py:func:`~standings.StandingsEngine.getTable`.
+        The table is calculated in memory if the STANDINGS table is not available or is stale and can not be rebuilt.
+
+        :param int seasonIndex: Specifies the season.
+        :param bool isBonusPoints: Optionally specify True to add the bonus points to the points.
+        '''
+        if not self.ensureCurrent():
+            return self.database.standings.getTable(seasonIndex, None, None, isBonusPoints)
+
+        cndb = self.database.getConnection()
+        records = {}
+        for row in cndb.execute(f'SELECT TEAM_ID, {", ".join(StandingsTable.COLUMNS)} FROM STANDINGS WHERE SEASON_ID = ?;', (seasonIndex, )):
+            records[row[0]] = list(row[1:])
+        rows = self.database.standings._buildRows(records, isBonusPoints, seasonIndex)
+
+        # Sort by points, goal difference and goals scored.
+        rows.sort(key=lambda row: (row[11], row[12], row[13]), reverse=True)
+        return rows
+
+
+
+    def removeMatches(self, cndb, matches):
+        '''
+        Subtract the specified matches from the totals.
+        Call this with the writer connection before the matches are changed or deleted.
+        Stale totals are rebuilt first so that the changes are applied to the correct totals.
+
+        :param Connection cndb: Specifies the writer connection of the transaction.
+        :param list matches: Specifies the IDs of the matches.
+        '''
+        if self.isAvailable and not self.isCurrent(cndb):
+            self.rebuild(cndb)
+            self.rebuildCount += 1
+        self._applyMatches(cndb, matches, -1)
+
+
+
+    def addMatches(self, cndb, matches):
+        '''
+        Add the specified matches to the totals.
+        Call this with the writer connection after the matches are inserted or changed.
+        The totals are recorded as current so :py:func:`removeMatches` must be called earlier in the same transaction.
+
+        :param Connection cndb: Specifies the writer connection of the transaction.
+        :param list matches: Specifies the IDs of the matches.
+        '''
+        self._applyMatches(cndb, matches, 1)
+        if self.isAvailable:
+            self.setCurrent(cndb)
+
+
+
+    def rebuild(self, cndb, seasonIndex=None):
+        '''
+        Replace the totals of the specified season with totals calculated from scratch.
+        Use this after a change that does not know which matches have changed.
+        Rebuilding every season records the totals as current.  After rebuilding some seasons call :py:func:`setCurrent` if the other seasons are known to be current.
+
+        :param Connection cndb: Specifies the writer connection of the transaction.
+        :param int seasonIndex: Optionally specify the season.  Specify None for every season.
+        '''
+        if not self.isAvailable:
+            return
+        if seasonIndex is None:
+            cndb.execute('DELETE FROM STANDINGS;')
+        else:
+            cndb.execute('DELETE FROM STANDINGS WHERE SEASON_ID = ?;', (seasonIndex, ))
+        self._fill(cndb, seasonIndex)
+        if seasonIndex is None:
+            self.setCurrent(cndb)
+
+
+
+    def check(self, seasonIndex=None):
+        '''
+        Returns the list of differences between the stored totals and totals calculated from scratch.
+        Each difference is SEASON_ID, TEAM_ID, the calculated totals and the stored totals.  The totals are None when the team is missing.
+
+        :param int seasonIndex: Optionally specify the season.  Specify None for every season.
+        '''
+        if not self.isAvailable:
+            return []
+        cndb = self.database.getConnection()
+        params = () if seasonIndex is None else (seasonIndex, )
+        expected = {(row[0], row[1]): tuple(row[2:]) for row in cndb.execute(self._getTotalsSql(seasonIndex), params)}
+        sql = f'SELECT SEASON_ID, TEAM_ID, NUM_MATCHES, {", ".join(StandingsTable.COLUMNS)} FROM STANDINGS' + ('' if seasonIndex is None else ' WHERE SEASON_ID = ?') + ';'
+        stored = {(row[0], row[1]): tuple(row[2:]) for row in cndb.execute(sql, params)}
+
+        differences = []
+        for key in sorted(set(expected) | set(stored)):
+            if expected.get(key) != stored.get(key):
+                differences.append((*key, expected.get(key), stored.get(key)))
+        return differences
+
+
+
+    def _getTotalsSql(self, seasonIndex):
+        ''' Returns the query for the totals of the specified season or every season calculated from scratch. '''
+        return StandingsTable.PLAYED_SQL.format('' if seasonIndex is None else ' AND SEASON_ID = ?') + StandingsTable.TOTALS_SQL + ';'
+
+
+
+    def _fill(self, cndb, seasonIndex):
+        ''' Insert the totals of the specified season or every season calculated from scratch. '''
+        sql = f'INSERT INTO STANDINGS (SEASON_ID, TEAM_ID, NUM_MATCHES, {", ".join(StandingsTable.COLUMNS)}) ' + self._getTotalsSql(seasonIndex)
+        cndb.execute(sql, () if seasonIndex is None else (seasonIndex, ))
+
+
+
+    def _applyMatches(self, cndb, matches, sign):
+        ''' Add or subtract the current values of the specified matches to the totals. '''
+        if not self.isAvailable or len(matches) == 0:
+            return
+
+        # Calculate the change for each team.  The first item is the number of matches.
+        deltas = {}
+        sql = f"SELECT SEASON_ID, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR, HOME_BONUS_PTS, AWAY_BONUS_PTS FROM MATCHES WHERE ID IN ({', '.join('?' * len(matches))});"
+        for seasonIndex, homeTeam, awayTeam, homeFor, awayFor, homeBonus, awayBonus in cndb.execute(sql, tuple(matches)).fetchall():
+            if seasonIndex is None or homeTeam is None or awayTeam is None:
+                continue
+            homeDelta = deltas.setdefault((seasonIndex, homeTeam), [0] * (1 + SeasonSnapshots.NUM_TOTALS))
+            awayDelta = deltas.setdefault((seasonIndex, awayTeam), [0] * (1 + SeasonSnapshots.NUM_TOTALS))
+            homeDelta[0] += sign
+            awayDelta[0] += sign
+            if homeFor is None or awayFor is None:
+                # The match has not been played.
+                continue
+            homeDelta[1 if homeFor > awayFor else 2 if homeFor == awayFor else 3] += sign
+            homeDelta[4] += sign * homeFor
+            homeDelta[5] += sign * awayFor
+            awayDelta[6 if awayFor > homeFor else 7 if homeFor == awayFor else 8] += sign
+            awayDelta[9] += sign * awayFor
+            awayDelta[10] += sign * homeFor
+            homeDelta[11] += sign * (homeBonus or 0)
+            awayDelta[11] += sign * (awayBonus or 0)
+
+        # Apply the changes.  Teams without any matches leave the season.
+        columns = ('NUM_MATCHES', ) + StandingsTable.COLUMNS
+        sql = f'INSERT INTO STANDINGS (SEASON_ID, TEAM_ID, {", ".join(columns)}) VALUES ({", ".join("?" * (2 + len(columns)))}) ON CONFLICT (SEASON_ID, TEAM_ID) DO UPDATE SET {", ".join(f"{column} = {column} + excluded.{column}" for column in columns)};'
+        cndb.executemany(sql, [(*key, *delta) for key, delta in deltas.items()])
+        cndb.execute('DELETE FROM STANDINGS WHERE NUM_MATCHES <= 0;')
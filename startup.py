@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to measure the start up of the table program.
+This module implements the :py:class:`StartupProfile` class.
+
+This module only uses the standard library so that it can be imported before the application libraries and time their imports.
+The shared :py:data:`profile` object does nothing until it is enabled with the --profile-startup argument.
+'''
+
+# System libraries.
+import sys
+import time
+
+
+
+class StartupProfile:
+    '''
+    Class to hold the time of each step in the start up of the program.
+
+    :ivar bool isEnabled: True to record the steps.
+    :ivar float startTime: The time that the profile started.
+    :ivar list steps: The name and time of each step in order.
+    :ivar bool isReported: True once the report has been shown.
+    '''
+
+
+
+    def __init__(self):
+        ''' Class constructor for the :py:class:`StartupProfile` class. '''
+        self.isEnabled = False
+        self.startTime = time.perf_counter()
+        self.steps = []
+        self.isReported = False
+
+        # The time of the last step.
+        self._lastTime = self.startTime
+
+
+
+    def enable(self):
+        ''' Start recording the steps.  The time since this module was imported is the first step. '''
+        self.isEnabled = True
+        self.mark('arguments')
+
+
+
+    def mark(self, name):
+        '''
+        Record the time since the previous step as the specified step.
+
+        :param string name: Specifies the name of the step that has just finished.
+        '''
+        if not self.isEnabled:
+            return
+        now = time.perf_counter()
+        self.steps.append((name, now - self._lastTime))
+        self._lastTime = now
+
+
+
+    def getTotalSeconds(self):
+        ''' Returns the time from the start of the profile to the last step. '''
+        return self._lastTime - self.startTime
+
+
+
+    def report(self, stream=None):
+        '''
+        Show the steps once.  Later calls do nothing.
+
+        :param file stream: Optionally specify the stream for the report.  The default is stdout.
+        '''
+        if not self.isEnabled or self.isReported:
+            return
+        self.isReported = True
+        if stream is None:
+            stream = sys.stdout
+        stream.write('Start up\n')
+        for name, seconds in self.steps:
+            stream.write(f'{1000 * seconds:9.1f}ms {name}\n')
+        stream.write(f'{1000 * self.getTotalSeconds():9.1f}ms total\n')
+        stream.write(f'{len(sys.modules)} modules loaded.\n')
+
+
+
+# The start up profile of the program.
+profile = StartupProfile()
@@ -5,14 +5,6 @@ Module to support teams in the table program.
 Each team is a row from the TEAMS table in the table database.
 '''
 
-# Require the Sqlite3 library.
-try:
-    import sqlite3
-except:
-    print("pysqlite is not available");
-    print("Try package python-sqlite2");
-    sys.exit(1)
-
 import datetime
 import time
 
@@ -30,6 +22,14 @@ class Team:
     :ivar int lastYear: The last season with results for this team.
     :ivar string comments: Optional additional text description of the team.
     '''
+    # The teams are held by the :py:class:`~registry.Registry` so keep them small.
+    __slots__ = ('database', 'index', 'name', 'firstYear', 'lastYear', 'comments', '_htmlCache')
+
+    # The maximum number of html variants to keep for each team.
+    MAX_HTML_VARIANTS = 16
+
+    # The columns of the TEAMS table in the order of :py:func:`setRow`.
+    COLUMNS = 'ID, LABEL, COMMENTS'
 
 
 
@@ -51,6 +51,8 @@ class Team:
         self.lastYear = -1
         # Optional additional text description of the team.
         self.comments = None
+        # The html of each variant of :py:func:`toHtml`.
+        self._htmlCache = {}
 
 
 
@@ -63,6 +65,20 @@ class Team:
         :param date ageDate: Optionally specify the date to display the teams age on.
         :param int headLinkID: Optionally specify the ID of a team to link to the head to head results from.
         '''
+        # The same variants are requested for every cell of the tables and match lists.
+        key = (addLink, showYears, ageDate, headLinkID)
+        html = self._htmlCache.get(key)
+        if html is None:
+            if len(self._htmlCache) >= Team.MAX_HTML_VARIANTS:
+                self._htmlCache.clear()
+            html = self._buildHtml(addLink, showYears, ageDate, headLinkID)
+            self._htmlCache[key] = html
+        return html
+
+
+
+    def _buildHtml(self, addLink, showYears, ageDate, headLinkID):
+        ''' Returns the team name in html format without the cache.  See :py:func:`toHtml`. '''
         # Add a link ( if requested )
         if addLink:
             if headLinkID == None:
@@ -126,8 +142,8 @@ class Team:
         # Default to an empty dictionary.
         links = {}
 
-        # Open the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # Fetch the links.
         sql = 'SELECT LABEL, URL FROM LINKS WHERE TYPE_ID = 1 AND KEY_ID = ?;'
@@ -137,9 +153,6 @@ class Team:
             links[row[0]] = row[1]
         cursor.close()
 
-        # Close the database.
-        cndb.close()
-
         # Return the links found.
         return links
 
@@ -151,11 +164,11 @@ class Team:
 
         :param int teamIdx: Specifies the index of the team to read.
         '''
-        # Connect to the database.
-        cndb = sqlite3.connect(self.database.filename)
+        # Borrow the shared connection to the database.
+        cndb = self.database.getConnection()
 
         # sql = 'SELECT Name, CountryID, DoB, DoD, FirstYear, LastYear, Comments, InternetURL FROM Teams WHERE ID = ?;'
-        sql = 'SELECT LABEL, COMMENTS FROM TEAMS WHERE ID = ?;'
+        sql = f'SELECT {Team.COLUMNS} FROM TEAMS WHERE ID = ?;'
         params = (teamIdx, )
         cursor = cndb.execute(sql, params)
         row = cursor.fetchone()
@@ -166,17 +179,28 @@ class Team:
             print(params)
             return None
 
-        self.index = teamIdx
-        self.name = row[0]
-        self.comments = row[1]
+        self.setRow(row)
+
 
-        # Close the database.
-        cndb.close()
+
+    def setRow(self, row):
+        '''
+        Set this team from a row of the TEAMS table.
+
+        :param tuple row: Specifies the row with the :py:attr:`COLUMNS` of the TEAMS table.
+        '''
+        self.index = row[0]
+        self.name = row[1]
+        self.comments = row[2]
+        self._htmlCache.clear()
 
 
 
     def write(self):
         ''' Write this team into the database. '''
+        # The name may have changed.
+        self._htmlCache.clear()
+
         if self.index == -1:
             # Write a new record.
             sql = 'INSERT INTO Teams(Name, SportID, CountryID, FirstYear, LastYear, DoB, DoD, Comments, InternetURL) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);'
@@ -190,23 +214,21 @@ class Team:
             print(sql)
             print(params)
 
-        # Open the database.
-        cndb = sqlite3.connect(self.database.filename)
-
-        # Execute the command.
-        cursor = cndb.execute(sql, params)
-        cndb.commit()
-
-        # Load the index if it not known.
-        if self.index == -1:
-            sql = "SELECT MAX(ID) FROM TEAMS;"
-            cursor = cndb.execute(sql)
-            row = cursor.fetchone()
-            cursor.close()
-            self.index = row[0]
-
-        # Close the database.
-        cndb.close()
+        # Borrow the writer connection to the database.
+        with self.database.writer() as cndb:
+            # Execute the command.
+            cursor = cndb.execute(sql, params)
+
+            # Load the index if it not known.
+            if self.index == -1:
+                sql = "SELECT MAX(ID) FROM TEAMS;"
+                cursor = cndb.execute(sql)
+                row = cursor.fetchone()
+                cursor.close()
+                self.index = row[0]
+
+        # The team name is on pages from every season.
+        self.database.pageCache.invalidate()
 
         # Return success.
         return True
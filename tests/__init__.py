@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+'''
+The tests of the table program.
+Run as ``python3 -m unittest discover tests`` from the program folder.
+'''
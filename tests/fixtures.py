@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to build small table databases for the tests.
+This module implements the :py:class:`FixtureDatabase` class.
+
+The :py:class:`~database.Database` class needs the walton library so the tests use this smaller object with the same connections.
+'''
+
+# System libraries.
+import os
+import tempfile
+
+# Application libraries.
+from benchmarks.synthetic import SyntheticDatabase
+from connections import ConnectionManager
+from match_store import MatchStore
+from standings import StandingsEngine
+
+
+
+class FixtureDatabase:
+    '''
+    Class to hold a synthetic table database in a temporary folder.
+    This has the connections of the :py:class:`~database.Database` class without the rest of the program.
+
+    :ivar string filename: The filename of the database file.
+    :ivar ConnectionManager connections: The :py:class:`~connections.ConnectionManager` for the database file.
+    :ivar MatchStore matchStore: The :py:class:`~match_store.MatchStore`.  This is disabled so that the matches are read with SQL.
+    :ivar StandingsEngine standings: The :py:class:`~standings.StandingsEngine` that calculates the league tables in memory.
+    '''
+
+
+
+    def __init__(self, numSeasons=2, teamsPerSeason=6, seed=1):
+        '''
+        Class constructor for the :py:class:`FixtureDatabase` class.
+
+        :param int numSeasons: Optionally specify the number of seasons.  The last season is in progress.
+        :param int teamsPerSeason: Optionally specify the number of teams in each season.
+        :param int seed: Optionally specify the seed for the synthetic results.
+        '''
+        self._folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self._folder.name, 'table.sqlite')
+        SyntheticDatabase(numSeasons, teamsPerSeason, seed=seed).write(self.filename)
+        self.connections = ConnectionManager(self.filename)
+        self.matchStore = MatchStore(self, False)
+        self.standings = StandingsEngine(self)
+
+
+
+    def getConnection(self):
+        ''' Returns the reader connection for the current thread. '''
+        return self.connections.getReader()
+
+
+
+    def writer(self):
+        ''' Returns a context manager that borrows the writer connection for a single transaction. '''
+        return self.connections.writer()
+
+
+
+    def close(self):
+        ''' Close the connections and remove the database file. '''
+        self.connections.close()
+        self._folder.cleanup()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~connections.ConnectionManager` class.
+'''
+
+# System libraries.
+import sqlite3
+import unittest
+
+# Application libraries.
+from tests.fixtures import FixtureDatabase
+
+
+
+class TestConnectionManager(unittest.TestCase):
+    ''' Tests of the :py:class:`~connections.ConnectionManager` class. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database. '''
+        self.database = FixtureDatabase()
+        self.connections = self.database.connections
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def testDataVersion(self):
+        ''' The data version changes when another program writes but not when the writer commits. '''
+        dataVersion = self.connections.getDataVersion()
+        with self.connections.writer() as cndb:
+            cndb.execute('UPDATE MATCHES SET HOME_TEAM_FOR = HOME_TEAM_FOR + 1 WHERE ID = 1;')
+        self.assertEqual(self.connections.getDataVersion(), dataVersion)
+
+        cndb = sqlite3.connect(self.database.filename)
+        cndb.execute('UPDATE MATCHES SET HOME_TEAM_FOR = HOME_TEAM_FOR + 1 WHERE ID = 1;')
+        cndb.commit()
+        cndb.close()
+        self.assertNotEqual(self.connections.getDataVersion(), dataVersion)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
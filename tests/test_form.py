@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~form.FormGuide` class.
+'''
+
+# System libraries.
+import datetime
+import unittest
+
+# Application libraries.
+from form import FormGuide
+from tests.fixtures import FixtureDatabase
+
+
+
+class TestFormGuide(unittest.TestCase):
+    ''' Tests of the :py:class:`~form.FormGuide` class. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database. '''
+        self.database = FixtureDatabase()
+        self.form = FormGuide(self.database.standings, 4)
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def testBounded(self):
+        ''' The cache keeps the most recently used forms up to the limit. '''
+        firstDate = datetime.date(2000, 1, 1)
+        first = self.form.getForm(firstDate, 5, [1, 2])
+        for day in range(1, 10):
+            self.form.getForm(firstDate + datetime.timedelta(days=day), 5, [1, 2])
+            # Keep using the first form so that it is not removed.
+            self.assertIs(self.form.getForm(firstDate, 5, [1, 2]), first)
+        self.assertEqual(len(self.form._forms), 4)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~schema.SchemaManager` class.
+'''
+
+# System libraries.
+import unittest
+
+# Application libraries.
+from schema import SchemaManager
+from tests.fixtures import FixtureDatabase
+
+
+
+class TestSchemaManager(unittest.TestCase):
+    ''' Tests of the :py:class:`~schema.SchemaManager` class on a database without the indexes. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database with only the tables. '''
+        self.database = FixtureDatabase()
+        self.schema = SchemaManager(self.database)
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def testNoFullScans(self):
+        ''' None of the frequent queries scan the MATCHES table once the indexes exist. '''
+        self.assertTrue(self.schema.ensureIndexes())
+        self.assertEqual(sorted(self.schema.created), sorted(SchemaManager.INDEXES))
+        self.assertEqual(self.schema.getFullScans(), [])
+
+
+
+    def testUnchanged(self):
+        ''' The indexes are only created once. '''
+        self.schema.ensureIndexes()
+        self.assertFalse(SchemaManager(self.database).ensureIndexes())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~simulation.SeasonSimulator` class.
+'''
+
+# System libraries.
+import datetime
+import types
+import unittest
+
+# Application libraries.
+from simulation import SeasonSimulator, CHUNK_SIMULATIONS
+from standings import StandingsEngine
+from tests.fixtures import FixtureDatabase
+
+
+
+class TestSeasonSimulator(unittest.TestCase):
+    ''' Tests of the :py:class:`~simulation.SeasonSimulator` class on the second half of a season. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database and simulate the second half of the first season. '''
+        self.database = FixtureDatabase()
+        self.season = types.SimpleNamespace(index=1, goodPos=1, positivePos=2, badPos=5)
+        startDate = self.database.getConnection().execute('SELECT START_DATE FROM SEASONS WHERE ID = 1;').fetchone()[0]
+        self.theDate = datetime.date.fromisoformat(startDate) + datetime.timedelta(days=35)
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def _simulate(self, seed, numSimulations=500, numProcesses=1):
+        ''' Returns the result of a new simulator so that the cached results are not used. '''
+        simulator = SeasonSimulator(StandingsEngine(self.database), numProcesses)
+        try:
+            return simulator.simulate(self.season, self.theDate, numSimulations, seed)
+        finally:
+            simulator.close()
+
+
+
+    def testSeededIsRepeatable(self):
+        ''' A seeded simulation gives the same probabilities every time. '''
+        first = self._simulate(7)
+        self.assertGreater(first.numFixtures, 0)
+        second = self._simulate(7)
+        self.assertEqual(first.positions, second.positions)
+        self.assertEqual(first.zones, second.zones)
+
+
+
+    def testSeededProcesses(self):
+        ''' A seeded simulation gives the same probabilities with a pool of processes. '''
+        numSimulations = 2 * CHUNK_SIMULATIONS
+        result = self._simulate(7, numSimulations, 2)
+        self.assertEqual(result.numProcesses, 2)
+        self.assertEqual(result.positions, self._simulate(7, numSimulations).positions)
+
+
+
+    def testProbabilities(self):
+        ''' Each team finishes in exactly one position in each simulation. '''
+        result = self._simulate(7)
+        self.assertEqual(len(result.positions), 6)
+        for probabilities in result.positions.values():
+            self.assertAlmostEqual(sum(probabilities), 1.0)
+
+
+
+    def testCachedBySeed(self):
+        ''' The results are cached for each seed. '''
+        simulator = SeasonSimulator(StandingsEngine(self.database), 1)
+        first = simulator.simulate(self.season, self.theDate, numSimulations=500, seed=7)
+        self.assertIs(simulator.simulate(self.season, self.theDate, numSimulations=500, seed=7), first)
+        self.assertIsNot(simulator.simulate(self.season, self.theDate, numSimulations=500, seed=8), first)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~standings.StandingsEngine` class.
+'''
+
+# System libraries.
+import unittest
+
+# Application libraries.
+from tests.fixtures import FixtureDatabase
+
+
+
+class TestStandingsEngine(unittest.TestCase):
+    ''' Tests of the :py:class:`~standings.StandingsEngine` class. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database. '''
+        self.database = FixtureDatabase()
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def testMatchWithoutSeason(self):
+        ''' A match without a season is ignored. '''
+        numMatches = len(self.database.standings.getColumns())
+        with self.database.writer() as cndb:
+            cndb.execute("INSERT INTO MATCHES (SEASON_ID, THE_DATE, HOME_TEAM_ID, AWAY_TEAM_ID, HOME_TEAM_FOR, AWAY_TEAM_FOR) VALUES (NULL, '2000-01-01', 1, 2, 1, 0);")
+        self.database.standings.invalidate()
+        self.assertEqual(len(self.database.standings.getColumns()), numMatches)
+
+        # The home matches played in every season are the home matches played in each season.
+        homePlayed = lambda rows: sum(row[1] + row[2] + row[3] for row in rows)
+        self.assertEqual(homePlayed(self.database.standings.getTable()), homePlayed(self.database.standings.getTable(1)) + homePlayed(self.database.standings.getTable(2)))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
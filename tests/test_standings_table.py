@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~standings_table.StandingsTable` class.
+'''
+
+# System libraries.
+import sqlite3
+import unittest
+
+# Application libraries.
+from standings_table import StandingsTable
+from tests.fixtures import FixtureDatabase
+
+
+
+class TestStandingsTable(unittest.TestCase):
+    ''' Tests of the :py:class:`~standings_table.StandingsTable` class when another program changes the matches. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database with the STANDINGS table. '''
+        self.database = FixtureDatabase()
+        self.standingsTable = StandingsTable(self.database)
+        self.assertTrue(self.standingsTable.ensureTable())
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def _changeOutside(self, sql):
+        ''' Change the matches with a separate connection like another program. '''
+        cndb = sqlite3.connect(self.database.filename)
+        cndb.execute(sql)
+        cndb.commit()
+        cndb.close()
+
+
+
+    def testCreated(self):
+        ''' The new table matches the matches. '''
+        self.assertTrue(self.standingsTable.isCurrent())
+        self.assertEqual(self.standingsTable.check(), [])
+        self.assertTrue(StandingsTable(self.database).isAvailable)
+
+
+
+    def testStaleRebuilt(self):
+        ''' A change by another program is found and the table is rebuilt before it is used. '''
+        self._changeOutside('UPDATE MATCHES SET HOME_TEAM_FOR = HOME_TEAM_FOR + 3 WHERE SEASON_ID = 1 AND ID % 4 = 0;')
+        self.assertFalse(self.standingsTable.isCurrent())
+        self.assertNotEqual(self.standingsTable.check(), [])
+
+        rows = self.standingsTable.getTable(1)
+        self.assertEqual(self.standingsTable.rebuildCount, 1)
+        self.assertTrue(self.standingsTable.isCurrent())
+        self.assertEqual(self.standingsTable.check(), [])
+        self.assertEqual(rows, self.database.standings.getTable(1))
+
+
+
+    def testDateChange(self):
+        ''' Changing the date of a match does not change the totals. '''
+        self._changeOutside("UPDATE MATCHES SET THE_DATE = '2000-01-01' WHERE ID = 1;")
+        self.assertTrue(self.standingsTable.isCurrent())
+
+
+
+    def testStaleBeforeChanges(self):
+        ''' Stale totals are rebuilt before the changes of the program are applied. '''
+        self._changeOutside('DELETE FROM MATCHES WHERE ID = 1;')
+        with self.database.writer() as cndb:
+            self.standingsTable.removeMatches(cndb, [2])
+            cndb.execute('UPDATE MATCHES SET HOME_TEAM_FOR = HOME_TEAM_FOR + 1 WHERE ID = 2;')
+            self.standingsTable.addMatches(cndb, [2])
+        self.assertEqual(self.standingsTable.rebuildCount, 1)
+        self.assertTrue(self.standingsTable.isCurrent())
+        self.assertEqual(self.standingsTable.check(), [])
+
+
+
+    def testOlderTable(self):
+        ''' A STANDINGS table without the state table is rebuilt. '''
+        self._changeOutside('DROP TABLE STANDINGS_STATE;')
+        self._changeOutside('DELETE FROM STANDINGS WHERE SEASON_ID = 1;')
+        standingsTable = StandingsTable(self.database)
+        self.assertFalse(standingsTable.isAvailable)
+        self.assertTrue(standingsTable.ensureTable())
+        self.assertTrue(standingsTable.isCurrent())
+        self.assertEqual(standingsTable.check(), [])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to test the :py:class:`~timeline.SeasonTimeline` class.
+'''
+
+# System libraries.
+import datetime
+import unittest
+
+# Application libraries.
+from tests.fixtures import FixtureDatabase
+from timeline import SeasonTimeline
+
+
+
+class TestSeasonTimeline(unittest.TestCase):
+    ''' Tests of the :py:class:`~timeline.SeasonTimeline` class with overlapping seasons. '''
+
+
+
+    def setUp(self):
+        ''' Build a small database where the seasons overlap and the first season never finishes. '''
+        self.database = FixtureDatabase(numSeasons=4)
+        with self.database.writer() as cndb:
+            cndb.execute("UPDATE SEASONS SET FINISH_DATE = NULL WHERE ID = 1;")
+            cndb.execute("UPDATE SEASONS SET FINISH_DATE = '2028-01-01' WHERE ID = 2;")
+            cndb.execute("UPDATE SEASONS SET START_DATE = '2025-09-01', FINISH_DATE = '2025-10-01' WHERE ID = 4;")
+        self.seasons = self.database.getConnection().execute('SELECT ID, START_DATE, FINISH_DATE FROM SEASONS;').fetchall()
+        self.timeline = SeasonTimeline(self.database)
+
+
+
+    def tearDown(self):
+        ''' Remove the database. '''
+        self.database.close()
+
+
+
+    def _getSeasonIndex(self, theDate):
+        ''' Returns the season that started last of the seasons that contain the specified date by checking every season. '''
+        theDate = str(theDate)
+        latest = None
+        for seasonIndex, startDate, finishDate in self.seasons:
+            if startDate <= theDate and (finishDate is None or theDate <= finishDate):
+                if latest is None or (startDate, seasonIndex) > latest:
+                    latest = (startDate, seasonIndex)
+        return None if latest is None else latest[1]
+
+
+
+    def testSeasonIndex(self):
+        ''' The season on each date is the season that started last of the seasons that contain the date. '''
+        theDate = datetime.date(2024, 7, 1)
+        while theDate < datetime.date(2028, 3, 1):
+            self.assertEqual(self.timeline.getSeasonIndex(theDate), self._getSeasonIndex(theDate), theDate)
+            theDate += datetime.timedelta(days=1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
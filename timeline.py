@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+'''
+Module to order the seasons of the table program by date.
+This module implements the :py:class:`SeasonTimeline` class.
+'''
+
+# System libraries.
+import array
+import bisect
+import datetime
+import heapq
+import threading
+import time
+
+
+
+class SeasonTimeline:
+    '''
+    Class to hold the seasons sorted by their start dates.
+    The previous and next seasons are the neighbours in the sorted order.
+    The dates are split into intervals where the same season is current, so the season on a date is found with a binary search of the intervals and every lookup is O(log n) in the number of seasons.
+    The timeline is built from the SEASONS table on the first lookup and again after :py:func:`invalidate`.
+
+    :ivar Database database: The :py:class:`~database.Database` that owns the connections.
+    :ivar int buildCount: The number of times the timeline has been built.
+    '''
+
+
+
+    def __init__(self, database):
+        '''
+        Class constructor for the :py:class:`SeasonTimeline` class.
+
+        :param Database database: Specifies the :py:class:`~database.Database` that owns the connections.
+        '''
+        self.database = database
+        self.buildCount = 0
+
+        # The season IDs in date order.
+        self._seasons = array.array('i')
+        # The start date ordinals in date order.
+        self._starts = array.array('i')
+        # The first date ordinal of each interval and the season on the dates in the interval or None.
+        self._boundaries = array.array('i')
+        self._intervalSeasons = []
+        # The position of each season.
+        self._positions = {}
+        # The season with the latest finish date.
+        self._lastSeasonIndex = None
+        # True when the timeline needs to be built.
+        self._isStale = True
+        # Lock to protect the build.
+        self._lock = threading.Lock()
+
+
+
+    def invalidate(self):
+        ''' Build the timeline again on the next lookup.  Call this when the SEASONS table changes. '''
+        self._isStale = True
+
+
+
+    def getSeasons(self):
+        ''' Returns the list of season IDs in date order. '''
+        self._ensureBuilt()
+        return self._seasons.tolist()
+
+
+
+    def getPreviousSeasonIndex(self, seasonIndex):
+        '''
+        Returns the ID of the season before the specified season or None for the first season.
+
+        :param int seasonIndex: Specifies the ID of the season.
+        '''
+        self._ensureBuilt()
+        position = self._positions.get(seasonIndex)
+        if position is None or position == 0:
+            return None
+        return self._seasons[position - 1]
+
+
+
+    def getNextSeasonIndex(self, seasonIndex):
+        '''
+        Returns the ID of the season after the specified season or None for the last season.
+
+        :param int seasonIndex: Specifies the ID of the season.
+        '''
+        self._ensureBuilt()
+        position = self._positions.get(seasonIndex)
+        if position is None or position + 1 >= len(self._seasons):
+            return None
+        return self._seasons[position + 1]
+
+
+
+    def getLastSeasonIndex(self):
+        ''' Returns the ID of the season with the latest finish date. '''
+        self._ensureBuilt()
+        return self._lastSeasonIndex
+
+
+
+    def getSeasonIndex(self, theDate):
+        '''
+        Returns the ID of the season that contains the specified date or None if no season contains the date.
+        When seasons overlap the season that started last is returned.
+
+        :param date theDate: Specifies the date.
+        '''
+        self._ensureBuilt()
+        position = bisect.bisect_right(self._boundaries, theDate.toordinal()) - 1
+        if position < 0:
+            return None
+        return self._intervalSeasons[position]
+
+
+
+    def getCurrentSeasonIndex(self, theDate=None):
+        '''
+        Returns the ID of the season that contains the specified date.
+        Between seasons this is the season that started most recently.  Before the first season this is the first season.
+
+        :param date theDate: Optionally specify the date.  The default is today.
+        '''
+        if theDate is None:
+            theDate = datetime.date.today()
+        seasonIndex = self.getSeasonIndex(theDate)
+        if seasonIndex is not None:
+            return seasonIndex
+        if len(self._seasons) == 0:
+            return None
+        position = max(0, bisect.bisect_right(self._starts, theDate.toordinal()) - 1)
+        return self._seasons[position]
+
+
+
+    def _ensureBuilt(self):
+        ''' Build the timeline if it is stale. '''
+        if self._isStale:
+            with self._lock:
+                if self._isStale:
+                    self._build()
+
+
+
+    def _build(self):
+        ''' Build the timeline from the SEASONS table. '''
+        cndb = self.database.getConnection()
+        rows = []
+        lastSeasonIndex = None
+        lastFinish = None
+        for seasonIndex, startDate, finishDate in cndb.execute('SELECT ID, START_DATE, FINISH_DATE FROM SEASONS ORDER BY ID;'):
+            start = self._toOrdinal(startDate)
+            finish = self._toOrdinal(finishDate)
+            rows.append((start if start is not None else 0, seasonIndex, finish))
+            if finish is not None and (lastFinish is None or finish > lastFinish):
+                lastFinish = finish
+                lastSeasonIndex = seasonIndex
+            elif lastSeasonIndex is None and lastFinish is None:
+                lastSeasonIndex = seasonIndex
+        rows.sort()
+
+        # Seasons without a finish date never finish.
+        seasons = array.array('i', [row[1] for row in rows])
+        starts = array.array('i', [row[0] for row in rows])
+        finishes = [row[2] if row[2] is not None else datetime.date.max.toordinal() for row in rows]
+
+        # Sweep the start dates and the days after the finish dates.  The season that started last of the seasons that have not finished is current until the next boundary.
+        boundaries = array.array('i')
+        intervalSeasons = []
+        current = []
+        position = 0
+        for boundary in sorted(set(starts) | {finish + 1 for finish in finishes}):
+            while position < len(starts) and starts[position] == boundary:
+                heapq.heappush(current, -position)
+                position += 1
+            while len(current) > 0 and finishes[-current[0]] < boundary:
+                heapq.heappop(current)
+            seasonIndex = seasons[-current[0]] if len(current) > 0 else None
+            if len(intervalSeasons) == 0 or intervalSeasons[-1] != seasonIndex:
+                boundaries.append(boundary)
+                intervalSeasons.append(seasonIndex)
+
+        self._seasons, self._starts, self._boundaries, self._intervalSeasons = seasons, starts, boundaries, intervalSeasons
+        self._positions = {seasonIndex: position for position, seasonIndex in enumerate(seasons)}
+        self._lastSeasonIndex = lastSeasonIndex
+        self.buildCount += 1
+        self._isStale = False
+
+
+
+    def _toOrdinal(self, text):
+        ''' Returns the ordinal of a date from the database or None. '''
+        if text is None:
+            return None
+        return datetime.date(*time.strptime(text, "%Y-%m-%d")[:3]).toordinal()